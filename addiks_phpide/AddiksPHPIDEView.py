@@ -30,9 +30,11 @@ from .AddiksPhpGladeHandler import AddiksPhpGladeHandler
 
 from .PHP.functions import get_namespace_by_classname
 from .PHP.PhpFileAnalyzer import PhpFileAnalyzer
+from .PHP.AnalyzerCache import AnalyzerCache
 from .PHP.PhpIndex import PhpIndex
 from .PHP.IndexPathManager import IndexPathManager
 from .PHP.phplexer import token_num
+from .PHP.phplexer import code_window
 from .PHP.sqlite3 import Sqlite3Storage
 
 from .update_gtk import update_gtk, build_gtk
@@ -47,8 +49,17 @@ class AddiksPHPIDEView(GObject.Object, Gedit.ViewActivatable):
     def __init__(self):
         GObject.Object.__init__(self)
         self.__completion_provider = None
-        self.__phpfiles = {}
+        self.__phpfiles = {}      # analyzer of the document of this view
+        self.__phpfile_edits = {}
+        self.__phpfile_window = None    # [beginOffset, endOffset, windowCode, analyzer] for huge documents
+        self.__phpfile_cache = AnalyzerCache(lambda code: PhpFileAnalyzer(code, self, self.get_index_storage()))
         self.__is_outline_active = False
+        self.__document_version = 0     # counts the edits of the document
+        self.__analysis_trigger = None  # [mark in front of the inserted text, insertedText, indention]
+        self.__analysis_timeout = None
+        self.__is_analyzing = False
+        self.__is_analysis_pending = False
+        self.__preresolution_timeout = None
         self._storage = None
         self._glade_builder = None
         self._glade_handler = None
@@ -68,8 +79,11 @@ class AddiksPHPIDEView(GObject.Object, Gedit.ViewActivatable):
         document = self.view.get_buffer()
         document.connect("changed", self.__on_document_changed)
         document.connect("insert-text", self.__on_document_insert)
+        document.connect("delete-range", self.__on_document_delete)
         document.connect("saved", self.__on_document_saved)
 
+        self.__schedule_preresolution()
+
     def do_deactivate(self):
         AddiksPHPIDEApp.get().unregister_view(self)
 
@@ -77,6 +91,8 @@ class AddiksPHPIDEView(GObject.Object, Gedit.ViewActivatable):
         pass
 
     def __on_document_insert(self, document, textIter, insertedText, length, userData=None):
+        self.__record_document_edit(document, textIter.get_offset(), 0, len(insertedText))
+
         if document.get_location() != None and insertedText in ['\n', ';', '=', '}']:
 
             line = textIter.get_line()
@@ -90,48 +106,12 @@ class AddiksPHPIDEView(GObject.Object, Gedit.ViewActivatable):
                 indention += codeLine[len(indention)]
 
             if insertedText in [';', '=', '}']:
-                code = document.get_text(document.get_start_iter(), document.get_end_iter(), True)
-                analyzer = PhpFileAnalyzer(code, self, self.get_index_storage())
-                tokens = analyzer.get_tokens()
-                tokenIndex = analyzer.get_token_index_by_position(textIter.get_line()+1, textIter.get_line_offset()+1)
-                isInMethod = analyzer.is_in_method(tokenIndex)
-
-                if insertedText == ';' and tokenIndex != None:
-                    # finished writing a statement?
-                    declarationType, declaredName, className = analyzer.get_declaration_by_token_index(tokenIndex, line, column)
-
-                    if declarationType == 'member' and tokens[tokenIndex][1] == declaredName and not isInMethod:
-                        # finished a member, add a doc-comment for that
-                        tokenIndexComment = analyzer.get_token_index_by_position(line+1, 0)
-                        if tokens[tokenIndexComment][0] not in [T_COMMENT, T_DOC_COMMENT]:
-                            commentCode  = indention + "/**\n"
-                            commentCode += indention + " * @var mixed\n"
-                            commentCode += indention + " */\n"
-                            GLib.idle_add(self.do_textbuffer_insert, document, line, 0, commentCode)
-
-                if insertedText == '=' and tokenIndex != None:
-                    # writing a new variable?
-                    if tokens[tokenIndex][0] == T_VARIABLE and tokens[tokenIndex-1][1] in [';', '{']:
-                        methodBlock = analyzer.get_method_block_is_in(tokenIndex)
-                        if methodBlock != None:
-                            variableName = tokens[tokenIndex][1]
-
-                            isFirstUsage = True
-                            for token in tokens[methodBlock[0]:tokenIndex]:
-                                if token[0] == T_VARIABLE and token[1] == variableName:
-                                    isFirstUsage = False
-                                    break
-
-                            if isFirstUsage:
-                                # added a new variable, add a doc-comment for that
-                                commentCode = indention + "/** @var mixed " + variableName + " */\n"
-                                GLib.idle_add(self.do_textbuffer_insert, document, line, 0, commentCode)
-
-                if insertedText in [';', '}']:
-                    # finished writing a method, class or function?
-                    # print(code)
-                    # TODO
-                    pass
+                # the statement gets looked at once the typing paused and the analysis is done (see __on_analysis_done),
+                # the mark keeps the position of the trigger through the edits made in the meantime
+                self.__forget_analysis_trigger(document)
+                mark = document.create_mark(None, textIter, True)
+                self.__analysis_trigger = [mark, insertedText, indention]
+                self.__schedule_analysis()
 
             if insertedText == '\n':
                 # new line, add indention
@@ -139,12 +119,173 @@ class AddiksPHPIDEView(GObject.Object, Gedit.ViewActivatable):
 
             AddiksPHPIDEApp.get().update_info_window(self)
 
+    ### BACKGROUND ANALYSIS
+
+    def __schedule_analysis(self):
+        if self.__analysis_timeout != None:
+            GLib.source_remove(self.__analysis_timeout)
+        self.__analysis_timeout = GLib.timeout_add(250, self.__start_analysis)
+
+    def __forget_analysis_trigger(self, document):
+        if self.__analysis_trigger != None:
+            document.delete_mark(self.__analysis_trigger[0])
+            self.__analysis_trigger = None
+
+    def __start_analysis(self):
+        self.__analysis_timeout = None
+        if self.__is_analyzing:
+            self.__is_analysis_pending = True
+        else:
+            document = self.view.get_buffer()
+            code = document.get_text(document.get_start_iter(), document.get_end_iter(), True)
+            offset = document.get_iter_at_mark(document.get_insert()).get_offset()
+            windowSize = self.__get_analysis_window_size(document)
+            self.__is_analyzing = True
+            start_new_thread(self.__do_analysis, (code, offset, windowSize, self.__document_version, self.get_index_storage()))
+        return False
+
+    def __do_analysis(self, code, offset, windowSize, documentVersion, storage):
+        analyzer = None
+        window = None
+        try:
+            if windowSize == None:
+                analyzer = PhpFileAnalyzer(code, self, storage)
+            else:
+                window = self.__analyze_window(code, offset, windowSize, storage)
+                analyzer = window[3]
+        finally:
+            GLib.idle_add(self.__on_analysis_done, analyzer, window, documentVersion)
+
+    def __on_analysis_done(self, analyzer, window, documentVersion):
+        self.__is_analyzing = False
+        document = self.view.get_buffer()
+
+        if self.__is_analysis_pending:
+            # another analysis got requested while this one was running
+            self.__is_analysis_pending = False
+            self.__start_analysis()
+
+        elif documentVersion != self.__document_version:
+            # the positions of the analysis are outdated, analyze again once the typing paused
+            if self.__analysis_trigger != None and self.__analysis_timeout == None:
+                self.__schedule_analysis()
+
+        elif analyzer != None and document.get_location() != None:
+            # the analysis is of the current code, the view continues with it instead of parsing again
+            filePath = os.path.abspath(document.get_location().get_path())
+            if window != None:
+                self.__phpfile_window = window
+            else:
+                self.__phpfiles[filePath] = analyzer
+            self.__phpfile_edits.pop(filePath, None)
+
+            if self.__analysis_trigger != None:
+                mark, insertedText, indention = self.__analysis_trigger
+                textIter = document.get_iter_at_mark(mark)
+                self.__forget_analysis_trigger(document) # (the iter stays valid, the mark does not)
+                nextIter = textIter.copy()
+                nextIter.forward_char()
+                isInWindow = window == None or window[0] <= textIter.get_offset() < window[1]
+                # (unless the trigger itself got removed in the meantime)
+                if isInWindow and document.get_text(textIter, nextIter, True) == insertedText:
+                    line = textIter.get_line()
+                    column = textIter.get_line_offset()
+                    self.__on_statement_typed(analyzer, insertedText, line, column, indention)
+        return False
+
+    ### PRE-RESOLUTION
+
+    def __schedule_preresolution(self):
+        # once the document was left alone for a second, the types completion will ask for get inferred in advance
+        if self.__preresolution_timeout != None:
+            GLib.source_remove(self.__preresolution_timeout)
+        self.__preresolution_timeout = GLib.timeout_add(1000, self.__start_preresolution)
+
+    def __start_preresolution(self):
+        self.__preresolution_timeout = None
+        document = self.view.get_buffer()
+        if document.get_location() != None and self.get_index_filepath() != None and self.is_index_built():
+            analyzer = self.get_php_fileindex()
+            line, column = self.get_current_cursor_position()
+            receivers = analyzer.get_receiver_token_indexes(analyzer.get_token_index_by_position(line, column))
+            GLib.idle_add(self.__do_preresolution, analyzer, receivers, [0], self.__document_version)
+        return False
+
+    def __do_preresolution(self, analyzer, receivers, position, documentVersion):
+        # resolves a few receivers per call to stay responsive, stops when the document changed
+        if documentVersion != self.__document_version:
+            return False
+        endTime = time.time() + 0.01
+        while position[0] < len(receivers) and time.time() < endTime:
+            analyzer.get_type_by_token_index(receivers[position[0]])
+            position[0] += 1
+        return position[0] < len(receivers)
+
+    def __on_statement_typed(self, analyzer, insertedText, line, column, indention):
+        document = self.view.get_buffer()
+        tokens = analyzer.get_tokens()
+        tokenIndex = analyzer.get_token_index_by_position(line+1, column+1)
+        isInMethod = analyzer.is_in_method(tokenIndex)
+
+        if insertedText == ';' and tokenIndex != None:
+            # finished writing a statement?
+            declarationType, declaredName, className = analyzer.get_declaration_by_token_index(tokenIndex, line, column)
+
+            if declarationType == 'member' and tokens[tokenIndex][1] == declaredName and not isInMethod:
+                # finished a member, add a doc-comment for that
+                tokenIndexComment = analyzer.get_token_index_by_position(line+1, 0)
+                if tokens[tokenIndexComment][0] not in [T_COMMENT, T_DOC_COMMENT]:
+                    commentCode  = indention + "/**\n"
+                    commentCode += indention + " * @var mixed\n"
+                    commentCode += indention + " */\n"
+                    GLib.idle_add(self.do_textbuffer_insert, document, line, 0, commentCode)
+
+        if insertedText == '=' and tokenIndex != None:
+            # writing a new variable?
+            if tokens[tokenIndex][0] == T_VARIABLE and tokens[tokenIndex-1][1] in [';', '{']:
+                methodBlock = analyzer.get_method_block_is_in(tokenIndex)
+                if methodBlock != None:
+                    variableName = tokens[tokenIndex][1]
+
+                    isFirstUsage = True
+                    for token in tokens[methodBlock.begin:tokenIndex]:
+                        if token[0] == T_VARIABLE and token[1] == variableName:
+                            isFirstUsage = False
+                            break
+
+                    if isFirstUsage:
+                        # added a new variable, add a doc-comment for that
+                        commentCode = indention + "/** @var mixed " + variableName + " */\n"
+                        GLib.idle_add(self.do_textbuffer_insert, document, line, 0, commentCode)
+
+    def __on_document_delete(self, document, startIter, endIter, userData=None):
+        self.__record_document_edit(document, startIter.get_offset(), endIter.get_offset() - startIter.get_offset(), 0)
+
+    def __record_document_edit(self, document, offset, removedLength, insertedLength):
+        # collect the edits since the last analysis as one changed region, the php-file-index
+        # then only gets relexed in that region when it is needed the next time.
+        self.__document_version += 1
+        if document.get_location() != None:
+            filepath = os.path.abspath(document.get_location().get_path())
+            if filepath in self.__phpfiles or self.__phpfile_window != None:
+                beginOffset = offset
+                endOffset   = offset + removedLength
+                delta       = 0
+                if filepath in self.__phpfile_edits:
+                    editBegin, editOldEnd, editNewEnd = self.__phpfile_edits[filepath]
+                    beginOffset = min(beginOffset, editBegin)
+                    endOffset   = max(endOffset, editNewEnd)
+                    delta       = editNewEnd - editOldEnd
+                self.__phpfile_edits[filepath] = [
+                    beginOffset,
+                    endOffset - delta,
+                    endOffset - removedLength + insertedLength
+                ]
+
     def __on_document_changed(self, document, userData=None):
-        # make sure the php-file-index gets updated when the text get changed
         if document.get_location() != None:
             AddiksPHPIDEApp.get().update_info_window(self)
-            filepath = document.get_location().get_path()
-            self.invalidate_php_fileindex(filepath)
+            self.__schedule_preresolution()
         return False
 
     def do_textbuffer_insert(self, document, line, column, text):
@@ -332,13 +473,12 @@ class AddiksPHPIDEView(GObject.Object, Gedit.ViewActivatable):
 
                 outlineLines = []
                 for block in index.get_blocks():
-                    if len(block)>3:
-                        outlineLines.append(tokens[block[3]][2])
-                        if block[2] == 'class':
-                            for memberIndex in block[10]:
-                                outlineLines.append(tokens[memberIndex][2])
-                            for constIndex in block[11]:
-                                outlineLines.append(tokens[constIndex][2])
+                    outlineLines.append(tokens[block.nameIndex][2])
+                    if block.blockType == 'class':
+                        for memberIndex in block.members:
+                            outlineLines.append(tokens[memberIndex][2])
+                        for constIndex in block.constants:
+                            outlineLines.append(tokens[constIndex][2])
                 outlineLines = list(set(outlineLines))
                 outlineLines.sort()
                 outlineLines.append(0)
@@ -405,12 +545,22 @@ class AddiksPHPIDEView(GObject.Object, Gedit.ViewActivatable):
 
             listStore = builder.get_object('liststoreCallers')
 
+            usesByFile = {}
+            for use in uses:
+                if use[0] not in usesByFile:
+                    usesByFile[use[0]] = []
+                usesByFile[use[0]].append(use)
+
             filteredUses = {}
-            for filePath, line, column, className, functionName in uses:
+            for filePath, fileUses in usesByFile.items():
                 phpFileIndex = self.get_php_fileindex(filePath)
-                declaredPosition = phpFileIndex.get_declared_position_by_position(line, column+1)
-                if declaredPosition[0] == None or declaredPosition == declaredPositionExpected:
-                    filteredUses[filePath + ":" + str(line)] = [filePath, line, column, className, functionName]
+                tokenIndexes = phpFileIndex.get_token_indexes_by_positions([[use[1], use[2]+1] for use in fileUses])
+                for tokenIndex, use in zip(tokenIndexes, fileUses):
+                    filePath, line, column, className, functionName = use
+                    declaration = phpFileIndex.get_declaration_by_token_index(tokenIndex, line, column+1)
+                    declaredPosition = phpFileIndex.get_declared_position_by_declaration(*declaration)
+                    if declaredPosition[0] == None or declaredPosition == declaredPositionExpected:
+                        filteredUses[filePath + ":" + str(line)] = [filePath, line, column, className, functionName]
             filteredUses = list(filteredUses.values())
             filteredUses.sort(key=self.__filteredUsesKey)
 
@@ -546,23 +696,67 @@ class AddiksPHPIDEView(GObject.Object, Gedit.ViewActivatable):
         return storage
 
     def get_php_fileindex(self, filePath=None):
-        isLocalFile = False
+        documentPath = None
+        document = self.view.get_buffer()
+        if document != None and document.get_location() != None:
+            documentPath = os.path.abspath(document.get_location().get_path())
         if filePath == None:
-            document = self.view.get_buffer()
-            if document != None and document.get_location() != None:
-                filePath = document.get_location().get_path()
-                filePath = os.path.abspath(filePath)
-                isLocalFile = True
+            filePath = documentPath
+        if filePath != documentPath or documentPath == None:
+            # other files are read from disk, only a limited number of them is kept
+            return self.__phpfile_cache.get(filePath)
+        windowSize = self.__get_analysis_window_size(document)
+        if windowSize != None:
+            return self.__get_windowed_fileindex(document, filePath, windowSize)
+        if filePath in self.__phpfile_edits:
+            # only relex the region of the document that changed since the last analysis
+            analyzer = self.__phpfiles.pop(filePath)
+            editBegin, editOldEnd, editNewEnd = self.__phpfile_edits.pop(filePath)
+            start, end = document.get_bounds()
+            code = document.get_text(start, end, True)
+            analyzer.update_edited(code, editBegin, editOldEnd - editBegin, code[editBegin:editNewEnd])
+            self.__phpfiles[filePath] = analyzer
         if filePath not in self.__phpfiles:
-            if isLocalFile:
-                start, end = document.get_bounds()
-                code = document.get_text(start, end, False)
-            else:
-                with open(filePath, "r", encoding = "ISO-8859-1") as f:
-                    code = f.read()
+            start, end = document.get_bounds()
+            code = document.get_text(start, end, True)
             self.__phpfiles[filePath] = PhpFileAnalyzer(code, self, self.get_index_storage())
         return self.__phpfiles[filePath]
 
+    def __get_analysis_window_size(self, document):
+        # the size of the analyzed region around the cursor, None if the document gets analyzed as a whole
+        settings = self.get_settings()
+        windowSize = None
+        maxSize = settings.get_int("windowed-analysis-size")
+        if maxSize > 0 and document.get_char_count() > maxSize:
+            windowSize = settings.get_int("windowed-analysis-window-size")
+        return windowSize
+
+    def __analyze_window(self, code, offset, windowSize, storage):
+        windowCode, beginOffset, endOffset = code_window(code, offset, windowSize)
+        return [beginOffset, endOffset, windowCode, PhpFileAnalyzer(windowCode, self, storage)]
+
+    def __get_windowed_fileindex(self, document, filePath, windowSize):
+        # huge document: only analyze the region around the cursor (blanked out code keeps all positions),
+        # edits within the region update the analyzer of it, other edits need a new region
+        self.__phpfiles.pop(filePath, None)
+        window = self.__phpfile_window
+        if window != None and filePath in self.__phpfile_edits:
+            beginOffset, endOffset, windowCode, analyzer = window
+            editBegin, editOldEnd, editNewEnd = self.__phpfile_edits.pop(filePath)
+            window = None
+            if beginOffset <= editBegin and editOldEnd < endOffset: # (the closing brace is the last character)
+                insertedText = document.get_text(document.get_iter_at_offset(editBegin), document.get_iter_at_offset(editNewEnd), True)
+                windowCode = windowCode[:editBegin] + insertedText + windowCode[editOldEnd:]
+                analyzer.update_edited(windowCode, editBegin, editOldEnd - editBegin, insertedText)
+                window = [beginOffset, endOffset + editNewEnd - editOldEnd, windowCode, analyzer]
+        offset = document.get_iter_at_mark(document.get_insert()).get_offset()
+        if window == None or offset < window[0] or offset >= window[1]:
+            start, end = document.get_bounds()
+            code = document.get_text(start, end, True)
+            window = self.__analyze_window(code, offset, windowSize, self.get_index_storage())
+        self.__phpfile_window = window
+        return window[3]
+
     def invalidate_php_fileindex(self, filePath=None):
         if filePath == None:
             document = self.view.get_buffer()
@@ -571,6 +765,10 @@ class AddiksPHPIDEView(GObject.Object, Gedit.ViewActivatable):
                 filePath = os.path.abspath(filePath)
         if filePath in self.__phpfiles:
             del self.__phpfiles[filePath]
+        if filePath in self.__phpfile_edits:
+            del self.__phpfile_edits[filePath]
+        self.__phpfile_cache.remove(filePath)
+        self.__phpfile_window = None
 
     def get_current_cursor_position(self):
         line = None
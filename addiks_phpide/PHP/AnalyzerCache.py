@@ -0,0 +1,56 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-phpide
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+import os
+
+class AnalyzerCache:
+    # The analyzers of files that are not open in the editor and therefore get read from disk.
+    # An analyzer is only reused while the mtime and size of its file are unchanged; the least recently used
+    # ones get dropped as soon as all analyzers together hold more than 'maxTokens' tokens.
+
+    def __init__(self, createAnalyzer, maxTokens=250000):
+        self.__create_analyzer = createAnalyzer # code => analyzer
+        self.__max_tokens      = maxTokens
+        self.__token_count     = 0
+        self.__entries         = OrderedDict()  # filePath => [mtime, size, tokenCount, analyzer]
+
+    def get(self, filePath):
+        stat = os.stat(filePath)
+        entry = self.__entries.pop(filePath, None)
+        if entry != None:
+            self.__token_count -= entry[2]
+            if entry[0] != stat.st_mtime_ns or entry[1] != stat.st_size:
+                entry = None
+
+        if entry == None:
+            with open(filePath, "r", encoding = "ISO-8859-1") as f:
+                code = f.read()
+            analyzer = self.__create_analyzer(code)
+            entry = [stat.st_mtime_ns, stat.st_size, len(analyzer.get_tokens()), analyzer]
+
+        self.__entries[filePath] = entry
+        self.__token_count += entry[2]
+        while self.__token_count > self.__max_tokens and len(self.__entries) > 1:
+            evictedPath, evictedEntry = self.__entries.popitem(last=False)
+            self.__token_count -= evictedEntry[2]
+        return entry[3]
+
+    def remove(self, filePath):
+        entry = self.__entries.pop(filePath, None)
+        if entry != None:
+            self.__token_count -= entry[2]
+
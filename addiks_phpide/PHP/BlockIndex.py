@@ -0,0 +1,50 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-phpide
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import bisect
+
+class BlockIndex:
+    # Finds the blocks (see Declarations) around a token-index without scanning all blocks: the blocks are
+    # sorted by their begin and know the innermost block they are nested in, so a lookup is a bisect for the
+    # last block beginning in front of the token followed by a walk up through the enclosing blocks.
+
+    def __init__(self, blocks):
+        self.__blocks  = sorted(blocks, key=lambda block: block.begin)
+        self.__begins  = [block.begin for block in self.__blocks]
+        self.__parents = [] # position of the innermost enclosing block in self.__blocks (or None)
+
+        stack = []
+        for position in range(len(self.__blocks)):
+            block = self.__blocks[position]
+            while len(stack) > 0 and self.__blocks[stack[-1]].end <= block.begin:
+                stack.pop()
+            if len(stack) > 0:
+                self.__parents.append(stack[-1])
+            else:
+                self.__parents.append(None)
+            stack.append(position)
+
+    def get_block_is_in(self, tokenIndex, blockTypes):
+        # the innermost block of one of the given types with its '{' in front of and '}' behind the token
+        blocks  = self.__blocks
+        parents = self.__parents
+        position = bisect.bisect_left(self.__begins, tokenIndex) - 1
+        while position != None and position >= 0:
+            block = blocks[position]
+            if block.end > tokenIndex and block.blockType in blockTypes:
+                return block
+            position = parents[position]
+        return None
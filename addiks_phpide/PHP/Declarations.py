@@ -0,0 +1,113 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-phpide
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# The blocks returned by phptokenparser.parse_php_tokens.
+# 'begin' and 'end' are the token-indexes of the '{' and '}' (or both of the ';' for abstract methods),
+# 'nameIndex' is the token-index of the declared name and 'uses' holds [line, column, name, typeRef]
+# of every usage inside the declaration.
+
+class Declaration:
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return type(self) == type(other) and self.__values() == other.__values()
+
+    def __repr__(self):
+        return type(self).__name__ + repr(self.__values())
+
+    def __values(self):
+        # (the slots of the variants below extend those of the class they derive from)
+        return tuple(getattr(self, slot) for cls in reversed(type(self).__mro__) for slot in cls.__dict__.get('__slots__', ()))
+
+class ClassDecl(Declaration):
+    __slots__ = (
+        'begin', 'end', 'nameIndex', 'name', 'parentName', 'interfaces', 'isAbstract', 'isFinal',
+        'classType', 'members', 'constants', 'docComment', 'traits', 'uses'
+    )
+    blockType = 'class'
+
+    def __init__(self, begin, end, nameIndex, name, parentName, interfaces, isAbstract, isFinal, classType, docComment):
+        self.begin      = begin
+        self.end        = end
+        self.nameIndex  = nameIndex
+        self.name       = name
+        self.parentName = parentName
+        self.interfaces = interfaces
+        self.isAbstract = isAbstract
+        self.isFinal    = isFinal
+        self.classType  = classType  # 'class', 'interface' or 'trait'
+        self.members    = []         # token-indexes of the member-variables
+        self.constants  = []         # token-indexes of the const-keywords
+        self.docComment = docComment
+        self.traits     = []         # names of the used traits
+        self.uses       = []
+
+class MethodDecl(Declaration):
+    __slots__ = ('begin', 'end', 'nameIndex', 'className', 'name', 'keywords', 'docComment', 'arguments', 'uses')
+    blockType = 'method'
+
+    def __init__(self, begin, end, nameIndex, className, name, keywords, docComment, arguments, uses):
+        self.begin      = begin
+        self.end        = end
+        self.nameIndex  = nameIndex
+        self.className  = className
+        self.name       = name
+        self.keywords   = keywords
+        self.docComment = docComment
+        self.arguments  = arguments
+        self.uses       = uses
+
+class FunctionDecl(Declaration):
+    __slots__ = ('begin', 'end', 'nameIndex', 'name', 'docComment', 'arguments', 'uses')
+    blockType = 'function'
+
+    def __init__(self, begin, end, nameIndex, name, docComment, arguments, uses):
+        self.begin      = begin
+        self.end        = end
+        self.nameIndex  = nameIndex
+        self.name       = name
+        self.docComment = docComment
+        self.arguments  = arguments
+        self.uses       = uses
+
+# The declarations returned by phptokenparser.parse_php_declarations, which keeps no token-indexes:
+# 'line' and 'column' are the position of the declared name instead ('begin', 'end' and 'nameIndex' are None),
+# the members of a class are [name, line, column, keywords, docComment] and its constants
+# [name, value, line, column, docComment]. Their 'uses' stay empty.
+
+class PositionedClassDecl(ClassDecl):
+    __slots__ = ('line', 'column')
+
+    def __init__(self, line, column, name, parentName, interfaces, isAbstract, isFinal, classType, docComment):
+        ClassDecl.__init__(self, None, None, None, name, parentName, interfaces, isAbstract, isFinal, classType, docComment)
+        self.line   = line
+        self.column = column
+
+class PositionedMethodDecl(MethodDecl):
+    __slots__ = ('line', 'column')
+
+    def __init__(self, line, column, className, name, keywords, docComment, arguments):
+        MethodDecl.__init__(self, None, None, None, className, name, keywords, docComment, arguments, [])
+        self.line   = line
+        self.column = column
+
+class PositionedFunctionDecl(FunctionDecl):
+    __slots__ = ('line', 'column')
+
+    def __init__(self, line, column, name, docComment, arguments):
+        FunctionDecl.__init__(self, None, None, None, name, docComment, arguments, [])
+        self.line   = line
+        self.column = column
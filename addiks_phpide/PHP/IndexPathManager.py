@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from .IndexPathRules import IndexPathRules
 import os
 import csv
 
@@ -23,6 +24,20 @@ class IndexPathManager:
 
     def __init__(self, filepath):
         self.__filepath = filepath
+        self.__rules = None
+        self.__rules_stat = None
+
+    def getRules(self):
+        # the paths compiled into IndexPathRules, only read again when the csv-file changed
+        try:
+            fileStat = os.stat(self.__filepath)
+            rulesStat = (fileStat.st_mtime_ns, fileStat.st_size)
+        except OSError:
+            rulesStat = None
+        if self.__rules == None or rulesStat != self.__rules_stat:
+            self.__rules = IndexPathRules(self.getPaths())
+            self.__rules_stat = rulesStat
+        return self.__rules
 
     def getPaths(self):
         result = []
@@ -38,11 +53,13 @@ class IndexPathManager:
         entryType = "include"
         if isExclude:
             entryType = "exclude"
+        self.__rules = None
         with open(self.__filepath, 'a') as handle:
             csvwriter = csv.writer(handle, delimiter=',')
             csvwriter.writerow([path, entryType])
 
     def clearPaths(self):
+        self.__rules = None
         with open(self.__filepath, 'w') as handle:
             pass
 
@@ -72,9 +89,5 @@ class IndexPathManager:
             self.addPath(entryPath, isExclude)
 
     def shouldIncludePathInIndex(self, filePath):
-        shouldInclude = True
-        for entryPath, isExclude in self.getPaths():
-            if filePath[0:len(entryPath)] == entryPath:
-                shouldInclude = not isExclude
-        return shouldInclude
+        return self.getRules().shouldIncludePath(filePath)
 
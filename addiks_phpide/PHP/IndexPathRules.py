@@ -0,0 +1,64 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-phpide
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+class IndexPathRules:
+    # The include/exclude paths of an IndexPathManager in a prefix-trie (one node per character).
+    # Same rules as before: a path is matched by every entry that is a (string-)prefix of it and the last
+    # matching entry decides, paths matched by no entry are included.
+
+    def __init__(self, paths):
+        # paths: [[entryPath, isExclude], ...] in the order of the entries
+        self.__root = self.__create_node()
+        for order, (entryPath, isExclude) in enumerate(paths):
+            node = self.__root
+            nodes = [node]
+            for character in entryPath:
+                if character not in node[0]:
+                    node[0][character] = self.__create_node()
+                node = node[0][character]
+                nodes.append(node)
+            node[1] = [order, isExclude]
+            if not isExclude:
+                for parentNode in nodes:
+                    parentNode[2] = max(parentNode[2], order)
+
+    def shouldIncludePath(self, filePath):
+        node, rule = self.__match(filePath)
+        return rule == None or not rule[1]
+
+    def isExcludedDirectory(self, directory):
+        # True if everything below the directory is excluded, so it does not need to be walked at all
+        node, rule = self.__match(directory + "/")
+        if rule == None or not rule[1]:
+            return False
+        # (no entry further down the trie includes something again)
+        return node == None or node[2] < rule[0]
+
+    def __match(self, path):
+        # the trie-node of the whole path (None if no entry starts with it) and the last matching [order, isExclude]
+        node = self.__root
+        rule = node[1]
+        for character in path:
+            node = node[0].get(character)
+            if node == None:
+                break
+            if node[1] != None and (rule == None or node[1][0] > rule[0]):
+                rule = node[1]
+        return (node, rule)
+
+    def __create_node(self):
+        # [children, [order, isExclude] of the entry ending here, highest order of an include-entry in the subtree]
+        return [{}, None, -1]
@@ -0,0 +1,167 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-phpide
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import queue
+import threading
+import time
+
+class IndexPipeline:
+    # Runs the indexing of files in stages connected by bounded queues, so reading, parsing and writing
+    # overlap: 'discover' and 'read' and 'parse' run in threads of their own, 'write' runs in the calling
+    # thread (the only one writing into the index) and gets many files at once.
+    #
+    #  discover()             => iterable of items (file-paths)
+    #  read(item)             => item for the parse-stage or None to skip it
+    #  parseMap(iterable)     => iterable of parsed items in the same order (like map, may use a process-pool)
+    #  write(list of items)   => writes a batch of parsed items
+
+    def __init__(self, queueSize=64, batchSize=256):
+        self.__queue_size = queueSize
+        self.__batch_size = batchSize
+        self.__error      = None
+        self.__stats      = [] # [stageName, itemCount, busySeconds, inputQueue] per stage
+        self.__depths     = {} # inputQueue => [samples, depthSum, maxDepth]
+        self.__seconds    = 0
+
+    def run(self, discover, read, parseMap, write):
+        self.__error = None
+        self.__depths = {}
+        beginTime = time.time()
+
+        pathQueue   = queue.Queue(self.__queue_size)
+        readQueue   = queue.Queue(self.__queue_size)
+        parsedQueue = queue.Queue(self.__queue_size)
+
+        discoverStats = ["discover", 0, 0.0, None]
+        readStats     = ["read",     0, 0.0, pathQueue]
+        parseStats    = ["parse",    0, 0.0, readQueue]
+        writeStats    = ["write",    0, 0.0, parsedQueue]
+        self.__stats = [discoverStats, readStats, parseStats, writeStats]
+
+        threads = [
+            threading.Thread(target=self.__run_stage, args=(discover, None, pathQueue, discoverStats)),
+            threading.Thread(target=self.__run_stage, args=(lambda items: map(read, items), pathQueue, readQueue, readStats)),
+            threading.Thread(target=self.__run_stage, args=(parseMap, readQueue, parsedQueue, parseStats)),
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        batch = []
+        for item in self.__drain(parsedQueue, writeStats):
+            batch.append(item)
+            if len(batch) >= self.__batch_size or parsedQueue.empty():
+                self.__write(write, batch, writeStats)
+                batch = []
+        if len(batch) > 0:
+            self.__write(write, batch, writeStats)
+
+        for thread in threads:
+            thread.join()
+        self.__seconds = time.time() - beginTime
+
+        if self.__error != None:
+            raise self.__error
+
+    def get_stats(self):
+        # [stageName, itemCount, busySeconds, maxInputQueueDepth, averageInputQueueDepth] per stage,
+        # busySeconds is the time the stage did not spend waiting on its queues.
+        result = []
+        for stageName, itemCount, busySeconds, inputQueue in self.__stats:
+            maxDepth, averageDepth = (None, None)
+            if inputQueue in self.__depths:
+                samples, depthSum, maxDepth = self.__depths[inputQueue]
+                averageDepth = depthSum / max(samples, 1)
+            result.append([stageName, itemCount, busySeconds, maxDepth, averageDepth])
+        return result
+
+    def describe_stats(self):
+        lines = ["indexed in %.2fs (queue-size %d)" % (self.__seconds, self.__queue_size)]
+        for stageName, itemCount, busySeconds, maxDepth, averageDepth in self.get_stats():
+            line = "%-8s %7d files  %7.2fs busy" % (stageName, itemCount, busySeconds)
+            if busySeconds > 0:
+                line += "  %9.1f files/s" % (itemCount / busySeconds)
+            if maxDepth != None:
+                line += "  input-queue max %d avg %.1f" % (maxDepth, averageDepth)
+            lines.append(line)
+        return "\n".join(lines)
+
+    ### STAGES
+
+    def __run_stage(self, process, inputQueue, outputQueue, stats):
+        # process: None => iterable (discover) or iterable => iterable (read, parse)
+        beginTime = time.time()
+        try:
+            if inputQueue == None:
+                items = process()
+            else:
+                items = process(self.__drain(inputQueue, stats))
+            for item in items:
+                if self.__error != None:
+                    break
+                if item != None:
+                    stats[1] += 1
+                    self.__put(outputQueue, item, stats)
+        except Exception as exception:
+            self.__error = exception
+        stats[2] += time.time() - beginTime
+        self.__put(outputQueue, None, stats)
+
+    def __write(self, write, batch, stats):
+        if self.__error == None:
+            beginTime = time.time()
+            try:
+                write(batch)
+            except Exception as exception:
+                self.__error = exception
+            stats[2] += time.time() - beginTime
+            stats[1] += len(batch)
+
+    def __put(self, outputQueue, item, stats):
+        # gives up when another stage failed, nobody might be taking items from the queue anymore
+        waitBegin = time.time()
+        while True:
+            try:
+                outputQueue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                if self.__error != None:
+                    break
+        stats[2] -= time.time() - waitBegin
+
+    def __drain(self, inputQueue, stats):
+        # the items of a queue up to the terminating None, sampling how full the queue is
+        if inputQueue not in self.__depths:
+            self.__depths[inputQueue] = [0, 0, 0]
+        depths = self.__depths[inputQueue]
+        while self.__error == None:
+            depth = inputQueue.qsize()
+            depths[0] += 1
+            depths[1] += depth
+            depths[2] = max(depths[2], depth)
+            waitBegin = time.time()
+            item = None
+            while self.__error == None:
+                try:
+                    item = inputQueue.get(timeout=0.1)
+                    break
+                except queue.Empty:
+                    pass
+            if stats[0] != "write":
+                stats[2] -= time.time() - waitBegin
+            if item is None:
+                break
+            yield item
@@ -14,12 +14,32 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from .phplexer import token_get_all
+from .phplexer import token_lex
+from .phplexer import token_relex
+from .phplexer import line_starts
 from .phplexer import token_name
 from .phplexer import token_num
 from .functions import get_namespace_by_classname
 from .functions import get_annotations_by_doccomment
 from .phptokenparser import parse_php_tokens
+from .phptokenparser import reparse_php_block
+from .phptokenparser import is_reparsable_block
+from .phpsyntaxparser import parse_php_syntax
+from .phpsyntaxparser import parse_php_syntax_statement
+from .TokenList import TokenList
+from .BlockIndex import BlockIndex
+from .SymbolTable import SymbolTable
+from .SyntaxTree import Expression
+from .SyntaxTree import BlockStatement
+from .SyntaxTree import ReturnStatement
+from .SyntaxTree import Variable
+from .SyntaxTree import Name
+from .SyntaxTree import Assignment
+from .SyntaxTree import Call
+from .SyntaxTree import MemberAccess
+from .SyntaxTree import New
+from .SyntaxTree import Parenthesis
+from .SyntaxTree import Operation
 import re
 
 T_STRING      = token_num("T_STRING")
@@ -30,24 +50,157 @@ T_DOC_COMMENT = token_num("T_DOC_COMMENT")
 
 class PhpFileAnalyzer:
 
+    # types of members, methods and functions looked up from the index, shared by all analyzers of an index:
+    # storage => [index-generation, {(namespace, use-statements, kind, className, name) => typeId}]
+    __shared_types = {}
+
     def __init__(self, code, plugin, storage):
         self.__plugin  = plugin
         self.__storage = storage
+        self.__tokens  = None
+        self.__lookup_shared_types = None # the shared types during the outermost running type-lookup
         self.update(code)
 
     def update(self, code):
+        lineStarts = line_starts(code)
+        tokens, comments = token_lex(code, TokenList(lineStarts), TokenList(lineStarts))
+        self.__update_tokens(tokens, comments)
+
+    def update_edited(self, code, offset, removedLength, insertedText):
+        # 'code' is the code after replacing 'removedLength' characters at 'offset' by 'insertedText'
+        block = self.__get_routine_block_around(offset, offset + removedLength)
+        oldEndPosition = None
+        if block != None:
+            oldEndPosition = self.__tokens[block.end][2:4]
+
+        tokens, comments, changedTokens = token_relex(code, self.__tokens, self.__comments, offset, removedLength, insertedText)
+
+        if block != None and self.__update_routine_block(block, changedTokens, oldEndPosition):
+            self.__comments = comments
+        else:
+            self.__update_tokens(tokens, comments)
+
+    def __get_routine_block_around(self, beginOffset, endOffset):
+        # the innermost function/method-block whose body contains the offsets and can be reparsed on its own
+        if not self.__is_balanced:
+            return None
+        offsets = self.__tokens.get_offsets()
+        routineBlock = None
+        for block in self.__blocks:
+            if block.blockType in ['function', 'method'] and block.begin < block.end:
+                if offsets[block.begin] < beginOffset and endOffset <= offsets[block.end]:
+                    if routineBlock == None or block.begin > routineBlock.begin:
+                        routineBlock = block
+        if routineBlock != None and not is_reparsable_block(self.__tokens, routineBlock):
+            routineBlock = None
+        return routineBlock
+
+    def __update_routine_block(self, block, changedTokens, oldEndPosition):
+        # only reparses the body of the block if all changed tokens are within it
+        tokens = self.__tokens
+        beginIndex, oldEndIndex, newEndIndex = changedTokens
+        tokenDelta = newEndIndex - oldEndIndex
+        oldEnd = block.end
+        if beginIndex < block.begin or oldEndIndex > oldEnd or tokens[block.begin][1] != '{':
+            return False
+
+        tree = self.__syntax_tree
+        blockNode = tree.get_node_by_token_index(block.begin)
+        if type(blockNode) is not BlockStatement or blockNode.begin != block.begin or blockNode.end != oldEnd:
+            return False
+
+        parsed = (self.__blocks, self.__namespace, self.__use_statements, self.__use_statement_index, self.__constants)
+        parsed = reparse_php_block(tokens, parsed, block, tokenDelta, oldEndPosition)
+        if parsed == None:
+            return False
+        blocks, namespace, use_statements, use_statement_index, constants = parsed
+
+        newBlockNode = parse_php_syntax_statement(tokens, block.begin)
+        if newBlockNode.end == oldEnd + tokenDelta:
+            tree.replace_node(blockNode, newBlockNode)
+        else:
+            tree = parse_php_syntax(tokens)
 
-        tokens, comments = token_get_all(code)
+        self.__syntax_tree         = tree
+        self.__blocks              = blocks
+        self.__block_index         = BlockIndex(blocks)
+        self.__symbol_tables       = {}
+        self.__use_statement_index = use_statement_index
+        self.__constants           = constants
+        self.__forget_types(True)
+        return True
 
-        blocks, namespace, use_statements, use_statement_index, constants = parse_php_tokens(tokens)
+    def __update_tokens(self, tokens, comments):
+        isBufferChanged = self.__tokens != None # (and not a new analyzer)
+
+        blocks, namespace, use_statements, use_statement_index, constants = parse_php_tokens(tokens, singlePass=True)
+
+        level = 0
+        for text in tokens.get_texts():
+            if text == '{':
+                level += 1
+            elif text == '}':
+                level -= 1
+                if level < 0:
+                    break
 
         self.__tokens              = tokens
         self.__comments            = comments
+        self.__is_balanced         = (level == 0) # blocks can only be reparsed separately in balanced files
+        self.__syntax_tree         = parse_php_syntax(tokens)
         self.__blocks              = blocks
+        self.__block_index         = BlockIndex(blocks)
+        self.__symbol_tables       = {} # begin of the scope => SymbolTable, built on demand
         self.__namespace           = namespace
         self.__use_statements      = use_statements
         self.__use_statement_index = use_statement_index
         self.__constants           = constants
+        self.__name_context        = (namespace, frozenset(use_statements.items()))
+        self.__forget_types(isBufferChanged)
+
+    def __forget_types(self, isBufferChanged):
+        # the inferred types of this file are outdated, when an already analyzed buffer changed
+        # the types of the routines declared in it (shared by all analyzers of the index) may be too
+        self.__generation  = None
+        self.__token_types = {}
+        self.__node_types  = {}
+        if isBufferChanged:
+            PhpFileAnalyzer.__shared_types.pop(self.__storage, None)
+
+    def __check_generation(self):
+        # forgets the inferred types when the index changed since they got inferred,
+        # returns the types shared with the other analyzers of the index
+        generation = self.__storage.get_generation()
+        if generation != self.__generation:
+            self.__generation  = generation
+            self.__token_types = {}
+            self.__node_types  = {}
+        sharedTypes = PhpFileAnalyzer.__shared_types.get(self.__storage)
+        if sharedTypes == None or sharedTypes[0] != generation:
+            sharedTypes = [generation, {}]
+            PhpFileAnalyzer.__shared_types[self.__storage] = sharedTypes
+        return sharedTypes[1]
+
+    def __lookup(self, lookup):
+        # the generation of the index only gets queried once per outermost type-lookup,
+        # the nested lookups happen within the same state of the index
+        if self.__lookup_shared_types != None:
+            return lookup()
+        self.__lookup_shared_types = self.__check_generation()
+        try:
+            return lookup()
+        finally:
+            self.__lookup_shared_types = None
+
+    def __get_memoized(self, types, key, infer):
+        if key not in types:
+            types[key] = infer()
+        return types[key]
+
+    def __get_shared_type(self, kind, className, name, infer):
+        # the result gets mapped by the use-statements of the asking file, so these are part of the key
+        key = self.__name_context + (kind, className, name)
+        return self.__lookup(lambda: self.__get_memoized(self.__lookup_shared_types, key, infer))
 
     def get_tokens(self):
         return self.__tokens
@@ -61,6 +214,9 @@ class PhpFileAnalyzer:
     def get_comments(self):
         return self.__comments
 
+    def get_syntax_tree(self):
+        return self.__syntax_tree
+
     def get_use_statements(self):
         return self.__use_statements
 
@@ -218,6 +374,9 @@ class PhpFileAnalyzer:
     ### TYPE DETERMINATION
 
     def get_member_type(self, memberName, className):
+        return self.__get_shared_type('member', className, memberName, lambda: self.__infer_member_type(memberName, className))
+
+    def __infer_member_type(self, memberName, className):
         typeId = None
         if memberName != None and len(memberName)>0 and memberName[0] == "$":
             memberName = memberName[1:]
@@ -226,7 +385,8 @@ class PhpFileAnalyzer:
         if typeHint != None and len(typeHint) > 0:
             typeId = typeHint
         elif docComment != None and len(docComment)>0:
-            typeId = self.__get_var_type_by_doccomment(docComment)
+            annotations = self.__get_stored_annotations('member', namespace, className, memberName, docComment)
+            typeId = self.__get_var_type_by_annotations(annotations)
         if typeId == None:
             for traitName in self.__storage.get_class_traits(namespace, className):
                 traitName = self.map_classname_by_use_statements(traitName)
@@ -237,16 +397,20 @@ class PhpFileAnalyzer:
         return typeId
 
     def get_method_return_type(self, methodName, className):
+        return self.__get_shared_type('method', className, methodName, lambda: self.__infer_method_return_type(methodName, className))
+
+    def __infer_method_return_type(self, methodName, className):
         typeId = None
         namespace, className = get_namespace_by_classname(className)
         visibility, is_static, filePath, line, column, docComment = self.__storage.get_method(namespace, className, methodName)
         if docComment != None and len(docComment)>0:
-            typeId = self.__get_return_type_by_doccomment(docComment)
+            annotations = self.__get_stored_annotations('method', namespace, className, methodName, docComment)
+            typeId = self.__get_return_type_by_annotations(annotations)
         if typeId == None:
             phpFileIndex = self.__plugin.get_php_fileindex(filePath)
             for block in phpFileIndex.__blocks:
-                if len(block)>2 and block[2] == 'method' and block[4] == className and block[5] == methodName:
-                    typeId = phpFileIndex.get_routine_return_type(block[0], block[1])
+                if block.blockType == 'method' and block.className == className and block.name == methodName:
+                    typeId = phpFileIndex.get_routine_return_type(block.begin, block.end)
         if typeId == None:
             for traitName in self.__storage.get_class_traits(namespace, className):
                 traitName = self.map_classname_by_use_statements(traitName)
@@ -257,16 +421,20 @@ class PhpFileAnalyzer:
         return typeId
 
     def get_function_return_type(self, functionName):
+        return self.__get_shared_type('function', None, functionName, lambda: self.__infer_function_return_type(functionName))
+
+    def __infer_function_return_type(self, functionName):
         namespace, functionName = get_namespace_by_classname(functionName)
         typeId = None
         filePath, line, column, docComment = self.__storage.get_function(namespace, functionName)
         if docComment!=None and len(docComment)>0:
-            typeId = self.__get_return_type_by_doccomment(docComment)
+            annotations = self.__get_stored_annotations('function', namespace, "", functionName, docComment)
+            typeId = self.__get_return_type_by_annotations(annotations)
         if typeId == None:# and filePath != None:
             phpFileIndex = self.__plugin.get_php_fileindex(filePath)
             for block in phpFileIndex.__blocks:
-                if block[2] == 'function' and block[4] == className and block[5] == methodName:
-                    typeId = phpFileIndex.get_routine_return_type(block[0], block[1])
+                if block.blockType == 'function' and block.name == functionName:
+                    typeId = phpFileIndex.get_routine_return_type(block.begin, block.end)
         typeId = self.map_classname_by_use_statements(typeId)
         return typeId
 
@@ -282,18 +450,11 @@ class PhpFileAnalyzer:
 
         else:
             returnTypes = []
-            tokenIndex = beginTokenIndex
-            for tokenNum, phpcode, line, column in tokens[beginTokenIndex:endTokenIndex]:
-                if phpcode == 'return':
-                    semicolonIndex = tokenIndex+1 # TODO: rework with syntax-tree (when we have a syntax-tree)
-                    for bTokenId, bPhpcode, bLine, bColumn in tokens[semicolonIndex:]:
-                        if bPhpcode == ";":
-                            break
-                        semicolonIndex+=1
-                    returnedTypeId = self.get_type_by_token_index(semicolonIndex-1)
+            for returnStatement in self.__syntax_tree.get_nodes(ReturnStatement, beginTokenIndex, endTokenIndex):
+                if returnStatement.expression != None:
+                    returnedTypeId = self.get_type_by_node(returnStatement.expression)
                     if returnedTypeId != None:
                         returnTypes.append(returnedTypeId)
-                tokenIndex+=1
             if len(returnTypes)>0:
                 typeId = returnTypes[0]
 
@@ -301,8 +462,20 @@ class PhpFileAnalyzer:
         return typeId
 
     def get_type_by_token_index(self, tokenIndex):
+        infer = lambda: self.__infer_type_by_token_index(tokenIndex)
+        return self.__lookup(lambda: self.__get_memoized(self.__token_types, tokenIndex, infer))
+
+    def __infer_type_by_token_index(self, tokenIndex):
         tokens = self.__tokens
         typeId = None
+
+        node = self.__syntax_tree.get_node_by_token_index(tokenIndex)
+        if isinstance(node, Expression) and node.end == tokenIndex:
+            if isinstance(node.parent, Call) and node.parent.callee is node:
+                node = node.parent
+            return self.get_type_by_node(node)
+
+        # not within an expression (declaration-headers and the like)
         if tokens[tokenIndex][0] in [T_STRING, T_STATIC]:
             if tokens[tokenIndex+1][1] == '(' and tokens[tokenIndex-1][1] != 'new':
                 if tokens[tokenIndex-1][1] in ['->', '::']: # method-call
@@ -356,6 +529,59 @@ class PhpFileAnalyzer:
             typeId = self.__namespace + "\\" + typeId
         return typeId
 
+    def get_type_by_node(self, node):
+        infer = lambda: self.__infer_type_by_node(node)
+        return self.__lookup(lambda: self.__get_memoized(self.__node_types, node, infer))
+
+    def __infer_type_by_node(self, node):
+        texts = self.__tokens.get_texts()
+        typeId = None
+
+        if type(node) is Variable:
+            typeId = self.get_type_by_variable(node.begin)
+
+        elif type(node) is Name:
+            parent = node.parent
+            if type(parent) is New or (type(parent) is MemberAccess and parent.object is node): # classname
+                typeId = "".join(texts[node.begin:node.end+1])
+
+        elif type(node) is New:
+            if type(node.className) is Name:
+                typeId = self.get_type_by_node(node.className)
+
+        elif type(node) is Call:
+            callee = node.callee
+            if type(callee) is Name: # function-call
+                typeId = self.get_function_return_type(texts[callee.end])
+
+            elif type(callee) is MemberAccess and callee.nameIndex != None: # method-call
+                className = self.get_type_by_node(callee.object)
+                if className != None:
+                    typeId = self.get_method_return_type(texts[callee.nameIndex], className)
+
+        elif type(node) is MemberAccess and node.nameIndex != None:
+            memberName = texts[node.nameIndex]
+            isStaticMember = texts[node.operatorIndex] == '::' and memberName[0] == '$'
+            if texts[node.operatorIndex] == '->' or isStaticMember: # (static) member-access
+                className = self.get_type_by_node(node.object)
+                if className != None:
+                    typeId = self.get_member_type(memberName, className)
+
+        elif type(node) is Parenthesis and node.expression != None:
+            typeId = self.get_type_by_node(node.expression)
+
+        elif type(node) is Assignment and node.value != None:
+            typeId = self.get_type_by_node(node.value)
+
+        elif type(node) is Operation and len(node.operands) > 0 and node.operands[-1].end == node.end:
+            # the last operand, for ternaries and '??'
+            typeId = self.get_type_by_node(node.operands[-1])
+
+        typeId = self.map_classname_by_use_statements(typeId, node.begin)
+        if typeId != None and typeId[0] != '\\':
+            typeId = self.__namespace + "\\" + typeId
+        return typeId
+
     def get_type_by_variable(self, tokenIndex):
         typeId = None
         tokens = self.__tokens
@@ -365,98 +591,56 @@ class PhpFileAnalyzer:
             typeId = self.get_class_is_in(tokenIndex)
 
         else:
-
-            # find scope to search in
-            scopeBeginIndex = 0
-            scopeEndIndex = len(tokens)-1
-            scopeBlock = None
-            for block in self.__blocks:
-                if len(block)>2 and block[0] < tokenIndex and block[1] > tokenIndex and block[2] in ['function', 'method']:
-                    scopeBeginIndex = block[0]
-                    scopeEndIndex   = block[1]
-                    scopeBlock      = block
+            symbolTable = self.get_symbol_table(tokenIndex)
 
             # try to find declaration in comments ( // @var $foo \Bar)
-            for tokenId, phpcode, line, column in self.__comments:
-                if( line >= tokens[scopeBeginIndex][2] and line <= tokens[scopeEndIndex][2] ):
-                    annotations = get_annotations_by_doccomment(phpcode)
-                    if "var" in annotations:
-                        for annotation in annotations['var']:
-                            if len(annotation) > 1:
-                                variable, varTypeId = annotation
-                                if varTypeId[0] == '$':
-                                    tempVar   = variable
-                                    variable  = varTypeId
-                                    varTypeId = tempVar
-                                if variable == needleVariableName:
-                                    typeId = varTypeId
-                        if typeId != None and len(typeId)>0 and typeId[0] == "?":
-                            typeId = typeId[1:]
+            typeId = symbolTable.get_var_type(needleVariableName)
 
             # try to resolve by assignment ($foo = new \Bar();)
             if typeId == None:
-                scopeTokenId = scopeBeginIndex
-                for tokenId, phpcode, line, column in tokens[scopeBeginIndex:scopeEndIndex]:
-                    if tokenId == T_VARIABLE and phpcode == needleVariableName and tokens[scopeTokenId+1][1]=='=':
-                        semicolonIndex = scopeTokenId+2 # TODO: rework with syntax-tree (when we have a syntax-tree)
-                        for bTokenId, bPhpcode, bLine, bColumn in tokens[semicolonIndex:]:
-                            if bPhpcode == ";":
-                                break
-                            semicolonIndex+=1
-                        typeId = self.get_type_by_token_index(semicolonIndex-1)
-                    scopeTokenId+=1
+                assignment = symbolTable.get_assignment(needleVariableName)
+                if assignment != None and assignment.value != None:
+                    typeId = self.get_type_by_node(assignment.value)
 
             # try to find in routine-arguments
             if typeId == None:
-                routineNameTokenIndex = scopeBlock[3]
-                if tokens[routineNameTokenIndex+1][1] == '(':
-                    tokenIndex = routineNameTokenIndex+2
-                    while True:
-                        argumentTypeId = None
-                        if tokens[tokenIndex][0] == T_STRING:
-                            argumentTypeId = tokens[tokenIndex][1]
-                            tokenIndex += 1
-                        if tokens[tokenIndex][0] == T_VARIABLE:
-                            if tokens[tokenIndex][1] == needleVariableName:
-                                typeId = argumentTypeId
-                                break
-                            tokenIndex += 1
-                        if tokens[tokenIndex][1] == ',':
-                            tokenIndex += 1
-                        else:
-                            break
+                typeId = symbolTable.get_argument_type(needleVariableName)
 
         typeId = self.map_classname_by_use_statements(typeId, tokenIndex)
         return typeId
 
+    def get_receiver_token_indexes(self, tokenIndex=None):
+        # the tokens in front of every '->' and '::' (whose types completion asks for), nearest to the token first
+        texts = self.__tokens.get_texts()
+        receivers = [index - 1 for index in range(1, len(texts)) if texts[index] in ['->', '::']]
+        if tokenIndex != None:
+            receivers.sort(key=lambda receiver: abs(receiver - tokenIndex))
+        return receivers
+
     def get_variables_in_scope(self, tokenIndex):
-        variables = []
-        tokens = self.__tokens
+        return self.get_symbol_table(tokenIndex).get_variables()
 
+    def get_symbol_table(self, tokenIndex):
+        # the symbol-table of the innermost function/method around the token (or of the code outside of them)
+        scopeBlock = self.__block_index.get_block_is_in(tokenIndex, ['function', 'method'])
         scopeBeginIndex = 0
-        scopeEndIndex = len(tokens)-1
-        scopeBlock = None
-        for block in self.__blocks:
-            if len(block)>2 and block[0] < tokenIndex:
-                if block[2] in ['function', 'method']:
-                    scopeBeginIndex = block[0]
-                    scopeEndIndex   = block[1]
-                    scopeBlock      = block
-
-        for token in tokens[scopeBeginIndex:scopeEndIndex]:
-            if token[0] == T_VARIABLE:
-                variables.append(token[1])
-
-        return variables
+        scopeEndIndex = len(self.__tokens)-1
+        if scopeBlock != None:
+            scopeBeginIndex = scopeBlock.begin
+            scopeEndIndex   = scopeBlock.end
+        if scopeBeginIndex not in self.__symbol_tables:
+            self.__symbol_tables[scopeBeginIndex] = SymbolTable(
+                self.__tokens, self.__comments, self.__syntax_tree, scopeBeginIndex, scopeEndIndex, scopeBlock
+            )
+        return self.__symbol_tables[scopeBeginIndex]
 
     ### HELPER
 
     def get_token_index_by_position(self, line, column):
-        tokenIndex = 0
-        for token in self.__tokens:
-            if token[2] > line or (token[2] == line and token[3] >= column):
-                return tokenIndex-1
-            tokenIndex += 1
+        return self.__tokens.get_index_by_position(line, column)
+
+    def get_token_indexes_by_positions(self, positions):
+        return self.__tokens.get_indexes_by_positions(positions)
 
     def map_classname_by_use_statements(self, className, tokenIndex=None):
 
@@ -483,18 +667,23 @@ class PhpFileAnalyzer:
 
         return className
 
-    def __get_return_type_by_doccomment(self, docComment):
+    def __get_stored_annotations(self, declarationType, namespace, className, name, docComment):
+        # the annotations got parsed when indexing, only indexes older than that need to parse the doc-comment
+        annotations = self.__storage.get_annotations(declarationType, namespace, className, name)
+        if len(annotations) <= 0:
+            annotations = get_annotations_by_doccomment(docComment)
+        return annotations
+
+    def __get_return_type_by_annotations(self, annotations):
         typeId = None
-        annotations = get_annotations_by_doccomment(docComment)
         if "return" in annotations and len(annotations["return"][0])>0:
             returnType = annotations["return"][0][0]
             if returnType not in ['void', 'bool', 'boolean', 'int', 'integer', 'float', 'double', 'string', 'array']:
                 typeId = self.map_classname_by_use_statements(returnType)
         return typeId
 
-    def __get_var_type_by_doccomment(self, docComment):
+    def __get_var_type_by_annotations(self, annotations):
         typeId = None
-        annotations = get_annotations_by_doccomment(docComment)
         if "var" in annotations and len(annotations["var"][0])>0:
             returnType = annotations["var"][0][0]
             if returnType not in ['void', 'bool', 'boolean', 'int', 'integer', 'float', 'double', 'string', 'array']:
@@ -502,34 +691,25 @@ class PhpFileAnalyzer:
         return typeId
 
     def is_in_method(self, tokenIndex):
-        for block in self.__blocks:
-            if len(block)>2 and block[2] == 'method' and block[0] < tokenIndex and block[1] > tokenIndex:
-                return True
-        return False
+        return self.get_method_block_is_in(tokenIndex) != None
 
     def get_method_is_in(self, tokenIndex):
-        for block in self.__blocks:
-            if len(block)>2 and block[2] == 'method' and block[0] < tokenIndex and block[1] > tokenIndex:
-                return block[4]
+        block = self.get_method_block_is_in(tokenIndex)
+        if block != None:
+            return block.className
         return None
 
     def get_method_block_is_in(self, tokenIndex):
-        for block in self.__blocks:
-            if len(block)>2 and block[2] == 'method' and block[0] < tokenIndex and block[1] > tokenIndex:
-                return block
-        return None
+        return self.__block_index.get_block_is_in(tokenIndex, ['method'])
 
     def is_in_class(self, tokenIndex):
-        for block in self.__blocks:
-            if len(block)>2 and block[2] == 'class' and block[0] < tokenIndex and block[1] > tokenIndex:
-                return True
-        return False
+        return self.__block_index.get_block_is_in(tokenIndex, ['class']) != None
 
     def get_class_is_in(self, tokenIndex):
-        for block in self.__blocks:
-            if len(block)>2 and block[2] == 'class' and block[0] < tokenIndex and block[1] > tokenIndex:
-                if len(self.__namespace) > 0:
-                    return "\\" + self.__namespace + "\\" + block[4]
-                else:
-                    return block[4]
+        block = self.__block_index.get_block_is_in(tokenIndex, ['class'])
+        if block != None:
+            if len(self.__namespace) > 0:
+                return "\\" + self.__namespace + "\\" + block.name
+            else:
+                return block.name
         return None
@@ -15,11 +15,16 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from .sqlite3 import Sqlite3Storage
+from .IndexPipeline import IndexPipeline
 from .phplexer import token_get_all
+from .phplexer import token_iterate
 from .phplexer import token_name
 from .phplexer import token_num
 from .functions import get_annotations_by_doccomment
 from .phptokenparser import parse_php_tokens
+from .phptokenparser import parse_php_declarations
+from .phptokenparser import parse_member_modifiers
+from .gitfiles import get_git_php_files
 import sys
 import os
 import os.path
@@ -29,26 +34,38 @@ import traceback
 import sqlite3
 import csv
 import hashlib
+import functools
+import multiprocessing
+import threading
 
 T_DOC_COMMENT = token_num("T_DOC_COMMENT")
 T_COMMENT     = token_num("T_COMMENT")
 
 class PhpIndex:
 
-    def __init__(self, index_path, update_callback=None, error_callback=None, finished_callback=None, indexPathManager=None):
+    def __init__(self, index_path, update_callback=None, error_callback=None, finished_callback=None, indexPathManager=None, declarationsOnly=False):
+        # declarationsOnly: only index declarations (no uses) with flat memory, e.g. for vendor-trees
         if index_path == None:
             raise Exception("Cannot open index from empty file-path!")
+        self._declarations_only = declarationsOnly
         self._parsers = {}
         self._index_path_manager = indexPathManager
         self._index_path = index_path
         self._update_callback = update_callback
         self._error_callback = error_callback
         self._finished_callback = finished_callback
+        self._pipeline = None
+        self._git_files = None
+        self._stored_blob_ids = {}
+        self._changed_blob_ids = []
+        self._changed_mtimes = []
         self._open_index()
 
     ### BUILD API
 
-    def build(self, work_dir):
+    def build(self, work_dir, workers=1, useGit=False):
+        # workers: number of processes lexing and parsing the files in parallel
+        # useGit:  store the git-blob-ids of the files, so that 'update' can tell changed files by them
 
         try:
             while work_dir[-1:] == '/':
@@ -59,12 +76,15 @@ class PhpIndex:
 
             self._all_files_count = 0
             self._done_files_count = 0
+            self._git_files = None
+            if useGit:
+                self._git_files = get_git_php_files(work_dir)
 
             self._storage.begin()
 
             self._index_internals()
-            self._collect_directory(work_dir)
-            self._index_directory(work_dir)
+            fileEntries = self._collect_directory(work_dir)
+            self._index_files(fileEntries, workers)
 
             self._storage.sync()
 
@@ -76,7 +96,9 @@ class PhpIndex:
             self._error_callback("Database error: "+str(exception))
             raise exception
 
-    def update(self, work_dir):
+    def update(self, work_dir, workers=1, useGit=False):
+        # useGit: files tracked and unmodified in git are only reindexed when their blob-id differs from the
+        #         indexed one (e.g. after a checkout), without reading them. Other files get checked by mtime.
 
         try:
             while work_dir[-1:] == '/':
@@ -86,12 +108,15 @@ class PhpIndex:
 
             self._all_files_count = 0
             self._done_files_count = 0
+            self._git_files = None
+            if useGit:
+                self._git_files = get_git_php_files(work_dir)
 
             self._storage.begin()
 
             self._remove_deleted(work_dir)
-            self._collect_directory(work_dir, True)
-            self._update_directory(work_dir)
+            fileEntries = self._collect_directory(work_dir, True)
+            self._index_files(fileEntries, workers, True)
 
             self._storage.sync()
 
@@ -162,73 +187,99 @@ class PhpIndex:
 
     def _remove_deleted(self, directory):
         allFilesToCheck = self._storage.get_all_files()
+        pathRules = self.__get_path_rules()
         currentFileCount = 0
         for filePath in allFilesToCheck:
             self._update_callback(currentFileCount, len(allFilesToCheck), filePath)
             currentFileCount += 1
-            if not self.__is_file_indexable(filePath):
+            if not self.__is_file_indexable(filePath, pathRules) or not os.path.exists(filePath):
                 self._unindex_phpfile(filePath)
 
     def _collect_directory(self, directory, only_updates=False):
-        for entry in os.listdir(directory):
-            entryPath = directory+"/"+entry
-            if os.path.isdir(entryPath):
-                self._collect_directory(entryPath, only_updates)
-            elif os.path.isfile(entryPath):
-                if self.__is_file_indexable(entryPath):
-
-                    currentMTime = int(os.path.getmtime(entryPath))
-                    indexedMTime = int(self._storage.getmtime(entryPath))
-
-                    if currentMTime > indexedMTime or not only_updates:
-                        indexedHash = self._storage.gethash(entryPath)
-                        currentHash = hashlib.sha256(open(entryPath, 'rb').read()).digest()
-
-                        if currentHash != indexedHash:
-                            self._all_files_count += 1
-
-    def _index_directory(self, directory):
-        for entry in os.listdir(directory):
-            entryPath = directory+"/"+entry
-            if os.path.isdir(entryPath):
-                self._index_directory(entryPath)
-            elif os.path.isfile(entryPath):
-                if self.__is_file_indexable(entryPath):
-                    self._done_files_count += 1
-                    if self._update_callback != None:
-                        self._update_callback(self._done_files_count, self._all_files_count, entryPath)
-                    self._index_phpfile(entryPath)
-
-    def _update_directory(self, directory):
-        for entry in os.listdir(directory):
-            entryPath = directory+"/"+entry
-            if os.path.isdir(entryPath):
-                self._update_directory(entryPath)
-            elif os.path.isfile(entryPath):
-                if self.__is_file_indexable(entryPath):
-
-                    currentMTime = int(os.path.getmtime(entryPath))
-                    indexedMTime = int(self._storage.getmtime(entryPath))
-
-                    if currentMTime > indexedMTime:
-                        indexedHash = self._storage.gethash(entryPath)
-                        currentHash = hashlib.sha256(open(entryPath, 'rb').read()).digest()
-
-                        if currentHash != indexedHash:
-                            self._done_files_count += 1
-                            if self._update_callback != None:
-                                self._update_callback(self._done_files_count, self._all_files_count, entryPath)
-                            self._unindex_phpfile(entryPath)
-                            self._index_phpfile(entryPath)
-
-    def __is_file_indexable(self, filePath):
-        shouldInclude = True
+        # [filePath, mtime, blobId] of the files to (re-)index, only stats the files (one stat per entry).
+        # The files themselves get read (and hashed) only once, by the read-stage of the pipeline.
+        # blobId is the git-blob-id of the content if known (see get_git_php_files), otherwise None.
+        fileEntries = []
+        self._stored_blob_ids = {}
+        if only_updates and self._git_files != None:
+            self._stored_blob_ids = self._storage.get_blob_ids()
+        self.__collect_files(directory, only_updates, self.__get_path_rules(), fileEntries)
+        self._all_files_count += len(fileEntries)
+        return fileEntries
+
+    def __collect_files(self, directory, only_updates, pathRules, fileEntries):
+        # directories excluded as a whole are not walked, only indexable files get stat'ed
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                entryPath = directory+"/"+entry.name
+                try:
+                    isDirectory = entry.is_dir()
+                    isFile = not isDirectory and entry.is_file()
+                except OSError:
+                    continue
+                if isDirectory:
+                    if pathRules == None or not pathRules.isExcludedDirectory(entryPath):
+                        self.__collect_files(entryPath, only_updates, pathRules, fileEntries)
+                elif isFile and self.__is_file_indexable(entryPath, pathRules):
+                    try:
+                        entryStat = entry.stat()
+                    except OSError:
+                        continue
+                    currentMTime = entryStat.st_mtime_ns
+                    blobId = self.__get_git_blob_id(entryPath)
+                    if not only_updates:
+                        fileEntries.append([entryPath, currentMTime, blobId])
+                    elif blobId != None:
+                        if blobId != self._stored_blob_ids.get(entryPath):
+                            fileEntries.append([entryPath, currentMTime, blobId])
+                    elif currentMTime != self._storage.getmtime(entryPath):
+                        # (any other mtime, a file changed within the second it got indexed in is newer too)
+                        fileEntries.append([entryPath, currentMTime, blobId])
+
+    def __get_git_blob_id(self, filePath):
+        # only for files whose content in the working tree is the one git has in its index
+        if self._git_files != None:
+            blobIds, changedPaths = self._git_files
+            if filePath not in changedPaths:
+                return blobIds.get(filePath)
+        return None
+
+    def _index_files(self, fileEntries, workers=1, only_updates=False):
+        read = lambda fileEntry: read_phpfile(fileEntry[0], fileEntry[1], fileEntry[2])
+        if only_updates:
+            read = self.__read_changed_phpfile
+        self._changed_blob_ids = []
+        self._changed_mtimes = []
+        self.__run_pipeline(lambda: fileEntries, read, workers, only_updates)
+        # (after the pipeline, its write-stage is the only one writing into the index while it runs)
+        for filePath, blobId in self._changed_blob_ids:
+            self._storage.set_blob_id(filePath, blobId)
+        for filePath, mtime in self._changed_mtimes:
+            self._storage.set_mtime(filePath, mtime)
+
+    def __read_changed_phpfile(self, fileEntry):
+        # only files with another mtime or blob-id got collected, their content may still be unchanged
+        fileItem = read_phpfile(fileEntry[0], fileEntry[1], fileEntry[2])
+        if fileItem[2] != self._storage.gethash(fileItem[0]):
+            return fileItem
+        self._changed_mtimes.append([fileItem[0], fileItem[3]]) # (so the content is not read again next time)
+        if fileItem[4] != None and fileItem[4] != self._stored_blob_ids.get(fileItem[0]):
+            self._changed_blob_ids.append([fileItem[0], fileItem[4]])
+        self._all_files_count -= 1
+        return None
+
+    def __get_path_rules(self):
+        # the include/exclude rules, loaded once per walk
         if self._index_path_manager != None:
-            shouldInclude = self._index_path_manager.shouldIncludePathInIndex(filePath)
-        if filePath[-4:] == ".php" and shouldInclude:
-            return True
-        else:
+            return self._index_path_manager.getRules()
+        return None
+
+    def __is_file_indexable(self, filePath, pathRules=None):
+        if filePath[-4:] != ".php":
             return False
+        if pathRules != None:
+            return pathRules.shouldIncludePath(filePath)
+        return True
 
     def reindex_phpfile(self, filePath):
         self._storage.begin()
@@ -237,191 +288,290 @@ class PhpIndex:
         self._storage.sync()
 
     def _index_phpfile(self, filePath):
-
-        with open(filePath, "r", encoding = "ISO-8859-1") as f:
-            code = f.read()
-
-        tokens, comments = token_get_all(code, filePath)
-
-        blocks, namespace, use_statements, use_statement_index, constants = parse_php_tokens(tokens)
-
-        # add extracted data to index
-
-        hashValue = hashlib.sha256(open(filePath, 'rb').read()).digest()
-        self._storage.add_file(filePath, namespace, int(os.path.getmtime(filePath)), hashValue)
-
-        for block in blocks:
-            if len(block) > 2:
-                if block[2] == 'class':
-                    tokenIndex     = block[3]
-                    className      = block[4]
-                    parentName     = block[5]
-                    interfaces     = block[6]
-                    isFinal        = block[7]
-                    isAbstract     = block[8]
-                    classType      = block[9]
-                    members        = block[10]
-                    classconstants = block[11]
-                    docComment     = block[12]
-                    traits         = block[13]
-                    uses           = block[14]
-                    line   = tokens[tokenIndex][2]
-                    column = tokens[tokenIndex][3]
-
-                    if parentName in use_statements:
-                        parentName = use_statements[parentName]
-
-                    if parentName != None and parentName[0] != '\\':
-                        if len(namespace) > 1:
-                            parentName = "\\" + namespace + "\\" + parentName
-                        else:
-                            parentName = "\\" + parentName
-
-                    cleanedInterfaces = []
-                    for interface in interfaces:
-                        if interface in use_statements:
-                            interface = use_statements[interface]
-                        if interface[0] != '\\':
-                            if namespace != "\\":
-                                interface = "\\" + namespace + "\\" + interface
-                            else:
-                                interface = "\\" + interface
-                        cleanedInterfaces.append(interface)
-                    interfaces = cleanedInterfaces
-
-                    cleanedTraits = []
-                    for trait in traits:
-                        if trait in use_statements:
-                            trait = use_statements[trait]
-                        if trait[0] != '\\':
-                            if namespace != "\\":
-                                trait = "\\" + namespace + "\\" + trait
-                            else:
-                                trait = "\\" + trait
-                        cleanedTraits.append(trait)
-                    traits = cleanedTraits
-
-                    self._storage.add_class(filePath, namespace, className, classType, parentName, interfaces, traits, isFinal, isAbstract, docComment, line, column)
-
-                    for constTokenIndex in classconstants:
-                        constantName   = tokens[constTokenIndex+1][1]
-                        constantValue  = tokens[constTokenIndex+3][1]
-                        constantLine   = tokens[constTokenIndex][2]
-                        constantColumn = tokens[constTokenIndex][3]
-                        constantDocComment = ""
-                        if tokens[constTokenIndex-1][0] == T_DOC_COMMENT:
-                            constantDocComment = tokens[constTokenIndex-1][1]
-                        self._storage.add_class_constant(filePath, namespace, className, constantName, constantValue, constantDocComment, constantLine, constantColumn)
-
-                    for memberTokenIndex in members:
-                        memberName   = tokens[memberTokenIndex][1]
-                        memberLine   = tokens[memberTokenIndex][2]
-                        memberColumn = tokens[memberTokenIndex][3]
-
-                        isStatic     = False
-                        visibility   = "public"
-                        memberKeywordIndex = memberTokenIndex-1
-                        while tokens[memberKeywordIndex][1] in ['public', 'protected', 'private', 'static']:
-                            if tokens[memberKeywordIndex][1] == 'static':
-                                isStatic = True
-                            if tokens[memberKeywordIndex][1] in ['public', 'protected', 'private']:
-                                visibility = tokens[memberKeywordIndex][1]
-                            memberKeywordIndex-=1
-
-                        memberDocComment = ""
-                        if tokens[memberKeywordIndex][0] in [T_DOC_COMMENT, T_COMMENT]:
-                            memberDocComment = tokens[memberKeywordIndex][1]
-
-                        # try to find declaration in comments ( // @var $foo \Bar)
-                        typeHint = None
-                        annotations = get_annotations_by_doccomment(memberDocComment)
-                        if "var" in annotations:
-                            for annotation in annotations['var']:
-                                if len(annotation) == 1:
-                                    typeHint = annotation[0]
-                                if len(annotation) == 2:
-                                    variable, varTypeId = annotation
-                                    if varTypeId[0] == '$':
-                                        tempVar   = variable
-                                        variable  = varTypeId
-                                        varTypeId = tempVar
-                                    if variable == "$" + memberName:
-                                        typeHint = varTypeId
-                        if typeHint != None and len(typeHint) > 0:
-                            if typeHint in use_statements:
-                                typeHint = use_statements[typeHint]
-                            if typeHint[0] != '\\':
-                                typeHint = "\\" + namespace + "\\" + typeHint
-
-                        self._storage.add_member(filePath, namespace, className, memberName, memberLine, memberColumn, isStatic, visibility, memberDocComment, typeHint)
-
-                    self.__index_uses(filePath, className, "", uses, namespace, use_statements)
-
-                if block[2] == 'method':
-                    tokenIndex = block[3]
-                    className  = block[4]
-                    methodName = block[5]
-                    keywords   = block[6]
-                    doccomment = block[7]
-                    arguments  = block[8]
-                    uses       = block[9]
-                    line   = tokens[tokenIndex][2]
-                    column = tokens[tokenIndex][3]
-
-                    isStatic = "static" in keywords
-                    visibility = list(set(keywords) & set(['public', 'protected', 'private']))
-                    if len(visibility) == 1:
-                        visibility = visibility[0]
-                    else:
-                        visibility = 'public'
-
-                    self._storage.add_method(filePath, namespace, className, methodName, isStatic, visibility, doccomment, line, column, arguments)
-
-                    self.__index_uses(filePath, className, methodName, uses, namespace, use_statements)
-
-                if block[2] == 'function' and block[4] != None:
-                    tokenIndex   = block[3]
-                    functionName = block[4]
-                    doccomment   = block[5]
-                    arguments    = block[6]
-                    uses         = block[7]
-                    line   = tokens[tokenIndex][2]
-                    column = tokens[tokenIndex][3]
-
-                    self._storage.add_function(filePath, namespace, functionName, doccomment, line, column, arguments)
-
-                    self.__index_uses(filePath, "", functionName, uses, namespace, use_statements)
-
-        for constantIndex in constants:
-            constantName   = tokens[constantIndex+2][1]
-            constantLine   = tokens[constantIndex][2]
-            constantColumn = tokens[constantIndex][3]
-            self._storage.add_constant(filePath, constantName, constantLine, constantColumn)
+        self.__write_records(index_phpfile_records(filePath, self._declarations_only))
+
+    def __run_pipeline(self, discover, read, workers=1, unindexFirst=False):
+        # discover => read => parse => write, see IndexPipeline. With more than one worker the files get lexed
+        # and parsed in a process-pool, the records still get written by this process (the only writer of the
+        # index) in the order the files were discovered.
+        pipeline = IndexPipeline()
+        extract = functools.partial(index_phpcode_records, declarationsOnly=self._declarations_only)
+        write = lambda batch: self.__write_batch(batch, unindexFirst)
+        if workers > 1:
+            with multiprocessing.Pool(workers) as pool:
+                pipeline.run(discover, read, lambda fileItems: self.__imap_limited(pool, extract, fileItems, workers * 32), write)
+        else:
+            pipeline.run(discover, read, lambda fileItems: map(extract, fileItems), write)
+        self._pipeline = pipeline
+
+    def __imap_limited(self, pool, function, items, limit):
+        # the pool would take all items from the (bounded) input-queue as fast as it can
+        inFlight = threading.Semaphore(limit)
+        isStopped = []
+        def take_items():
+            for item in items:
+                while not inFlight.acquire(timeout=0.1):
+                    if len(isStopped) > 0:
+                        return
+                yield item
+        try:
+            for result in pool.imap(function, take_items(), 8):
+                inFlight.release()
+                yield result
+        finally:
+            isStopped.append(True)
+
+    def __write_batch(self, batch, unindexFirst):
+        records = []
+        for filePath, fileRecords in batch:
+            self._done_files_count += 1
+            if self._update_callback != None:
+                self._update_callback(self._done_files_count, self._all_files_count, filePath)
+            if unindexFirst:
+                records.append(("removeFile", (filePath, )))
+            records += fileRecords
+        self._storage.add_records(records)
+
+    def describe_build_stats(self):
+        # files, busy time and queue depths per stage of the last build/update
+        if self._pipeline != None:
+            return self._pipeline.describe_stats()
+        return ""
+
+    def __write_records(self, records):
+        storage = self._storage
+        for methodName, arguments in records:
+            getattr(storage, methodName)(*arguments)
 
     def _unindex_phpfile(self, filePath):
         self._storage.removeFile(filePath)
 
-    def __index_uses(self, filePath, className, containingName, uses, namespace, use_statements={}):
-        if className in use_statements:
-            className = use_statements[className]
-        if len(className)>0 and className[0] != '\\':
-            className = namespace + '\\' + className
-        for line, column, usedName, useType in uses:
-            if useType == 'method':
-                self._storage.add_method_use(usedName, filePath, line, column, className, containingName)
-
-            elif useType == 'member':
-                self._storage.add_member_use(usedName, filePath, line, column, className, containingName)
-
-            elif useType == 'function':
-                self._storage.add_function_use(usedName, filePath, line, column, className, containingName)
-
-            elif useType == 'class':
-                if usedName in use_statements:
-                    usedName = use_statements[usedName]
-                if len(usedName)>0 and usedName[0] != '\\':
-                    usedName = namespace + '\\' + usedName
-                self._storage.add_class_use(usedName, filePath, line, column, className, containingName)
-
-            elif useType == 'constant':
-                self._storage.add_constant_use(usedName, filePath, line, column, className, containingName)
+### FILE INDEXING
+# Everything extracted from a php-file ends up as a list of records [storage-method-name, arguments] that
+# only needs to be written into the index. The extraction does not touch the storage and its result is
+# picklable, so it can run in the worker-processes of a parallel build.
+
+def index_phpfile_records(filePath, declarationsOnly=False):
+    filePath, records = index_phpcode_records(read_phpfile(filePath), declarationsOnly)
+    return records
+
+def read_phpfile(filePath, mtime=None, blobId=None):
+    # [filePath, content, hash, mtime, blobId], the content gets hashed and decoded from the same (only) read
+    with open(filePath, "rb") as f:
+        content = f.read()
+        if mtime == None:
+            mtime = os.fstat(f.fileno()).st_mtime_ns
+    return [filePath, content, hashlib.sha256(content).digest(), mtime, blobId]
+
+def index_phpcode_records(fileItem, declarationsOnly=False):
+    # fileItem: see read_phpfile, returns [filePath, records]
+    filePath, content, hashValue, mtime, blobId = fileItem
+    # (newlines like reading in text-mode)
+    code = content.decode("ISO-8859-1").replace("\r\n", "\n").replace("\r", "\n")
+
+    records = []
+    if declarationsOnly:
+        namespace = __records_by_declarations(records, filePath, code)
+    else:
+        namespace = __records_by_tokens(records, filePath, code)
+    records.insert(0, ("add_file", (filePath, namespace, mtime, hashValue, blobId)))
+    return [filePath, records]
+
+def __records_by_tokens(records, filePath, code):
+
+    tokens, comments = token_get_all(code, filePath, useScanner=True)
+
+    blocks, namespace, use_statements, use_statement_index, constants = parse_php_tokens(tokens, singlePass=True)
+
+    # add extracted data to index
+
+    for block in blocks:
+        line   = tokens[block.nameIndex][2]
+        column = tokens[block.nameIndex][3]
+
+        if block.blockType == 'class':
+            className = block.name
+
+            __add_class(records, filePath, namespace, use_statements, className, block.classType, block.parentName, block.interfaces, block.traits, block.isFinal, block.isAbstract, block.docComment, line, column)
+
+            for constTokenIndex in block.constants:
+                constantName   = tokens[constTokenIndex+1][1]
+                constantValue  = tokens[constTokenIndex+3][1]
+                constantLine   = tokens[constTokenIndex][2]
+                constantColumn = tokens[constTokenIndex][3]
+                constantDocComment = ""
+                if tokens[constTokenIndex-1][0] == T_DOC_COMMENT:
+                    constantDocComment = tokens[constTokenIndex-1][1]
+                records.append(("add_class_constant", (filePath, namespace, className, constantName, constantValue, constantDocComment, constantLine, constantColumn)))
+
+            for memberTokenIndex in block.members:
+                memberName   = tokens[memberTokenIndex][1]
+                memberLine   = tokens[memberTokenIndex][2]
+                memberColumn = tokens[memberTokenIndex][3]
+                keywords, memberDocComment = parse_member_modifiers(tokens, memberTokenIndex)
+
+                __add_member(records, filePath, namespace, use_statements, className, memberName, memberLine, memberColumn, keywords, memberDocComment)
+
+            __index_uses(records, filePath, className, "", block.uses, namespace, use_statements)
+
+        if block.blockType == 'method':
+            __add_method(records, filePath, namespace, block.className, block.name, block.keywords, block.docComment, line, column, block.arguments)
+
+            __index_uses(records, filePath, block.className, block.name, block.uses, namespace, use_statements)
+
+        if block.blockType == 'function' and block.name != None:
+            __add_function(records, filePath, namespace, block.name, block.docComment, line, column, block.arguments)
+
+            __index_uses(records, filePath, "", block.name, block.uses, namespace, use_statements)
+
+    for constantIndex in constants:
+        constantName   = tokens[constantIndex+2][1]
+        constantLine   = tokens[constantIndex][2]
+        constantColumn = tokens[constantIndex][3]
+        records.append(("add_constant", (filePath, constantName, constantLine, constantColumn)))
+
+    return namespace
+
+def __records_by_declarations(records, filePath, code):
+    # only indexes the declarations (no uses), streaming the tokens instead of keeping all of them
+    declarations, namespace, use_statements, constants = parse_php_declarations(token_iterate(code))
+
+    for declaration in declarations:
+        line   = declaration.line
+        column = declaration.column
+
+        if declaration.blockType == 'class':
+            className = declaration.name
+
+            __add_class(records, filePath, namespace, use_statements, className, declaration.classType, declaration.parentName, declaration.interfaces, declaration.traits, declaration.isFinal, declaration.isAbstract, declaration.docComment, line, column)
+
+            for constantName, constantValue, constantLine, constantColumn, constantDocComment in declaration.constants:
+                records.append(("add_class_constant", (filePath, namespace, className, constantName, constantValue, constantDocComment, constantLine, constantColumn)))
+
+            for memberName, memberLine, memberColumn, keywords, memberDocComment in declaration.members:
+                __add_member(records, filePath, namespace, use_statements, className, memberName, memberLine, memberColumn, keywords, memberDocComment)
+
+        if declaration.blockType == 'method':
+            __add_method(records, filePath, namespace, declaration.className, declaration.name, declaration.keywords, declaration.docComment, line, column, declaration.arguments)
+
+        if declaration.blockType == 'function' and declaration.name != None:
+            __add_function(records, filePath, namespace, declaration.name, declaration.docComment, line, column, declaration.arguments)
+
+    for constantName, constantLine, constantColumn in constants:
+        records.append(("add_constant", (filePath, constantName, constantLine, constantColumn)))
+
+    return namespace
+
+def __add_class(records, filePath, namespace, use_statements, className, classType, parentName, interfaces, traits, isFinal, isAbstract, docComment, line, column):
+    if parentName in use_statements:
+        parentName = use_statements[parentName]
+
+    if parentName != None and parentName[0] != '\\':
+        if len(namespace) > 1:
+            parentName = "\\" + namespace + "\\" + parentName
+        else:
+            parentName = "\\" + parentName
+
+    cleanedInterfaces = []
+    for interface in interfaces:
+        if interface in use_statements:
+            interface = use_statements[interface]
+        if interface[0] != '\\':
+            if namespace != "\\":
+                interface = "\\" + namespace + "\\" + interface
+            else:
+                interface = "\\" + interface
+        cleanedInterfaces.append(interface)
+    interfaces = cleanedInterfaces
+
+    cleanedTraits = []
+    for trait in traits:
+        if trait in use_statements:
+            trait = use_statements[trait]
+        if trait[0] != '\\':
+            if namespace != "\\":
+                trait = "\\" + namespace + "\\" + trait
+            else:
+                trait = "\\" + trait
+        cleanedTraits.append(trait)
+    traits = cleanedTraits
+
+    records.append(("add_class", (filePath, namespace, className, classType, parentName, interfaces, traits, isFinal, isAbstract, docComment, line, column)))
+
+def __add_member(records, filePath, namespace, use_statements, className, memberName, line, column, keywords, docComment):
+    isStatic   = False
+    visibility = "public"
+    for keyword in keywords:
+        if keyword == 'static':
+            isStatic = True
+        if keyword in ['public', 'protected', 'private']:
+            visibility = keyword
+
+    # try to find declaration in comments ( // @var $foo \Bar)
+    typeHint = None
+    annotations = get_annotations_by_doccomment(docComment)
+    if "var" in annotations:
+        for annotation in annotations['var']:
+            if len(annotation) == 1:
+                typeHint = annotation[0]
+            if len(annotation) == 2:
+                variable, varTypeId = annotation
+                if varTypeId[0] == '$':
+                    tempVar   = variable
+                    variable  = varTypeId
+                    varTypeId = tempVar
+                if variable == "$" + memberName:
+                    typeHint = varTypeId
+    if typeHint != None and len(typeHint) > 0:
+        if typeHint in use_statements:
+            typeHint = use_statements[typeHint]
+        if typeHint[0] != '\\':
+            typeHint = "\\" + namespace + "\\" + typeHint
+
+    records.append(("add_member", (filePath, namespace, className, memberName, line, column, isStatic, visibility, docComment, typeHint)))
+    if docComment != None:
+        if len(memberName)>0 and memberName[0] == "$":
+            memberName = memberName[1:]
+        records.append(("add_annotations", (filePath, 'member', namespace, className, memberName, annotations)))
+
+def __add_method(records, filePath, namespace, className, methodName, keywords, doccomment, line, column, arguments):
+    isStatic = "static" in keywords
+    visibility = list(set(keywords) & set(['public', 'protected', 'private']))
+    if len(visibility) == 1:
+        visibility = visibility[0]
+    else:
+        visibility = 'public'
+
+    records.append(("add_method", (filePath, namespace, className, methodName, isStatic, visibility, doccomment, line, column, arguments)))
+    if doccomment != None:
+        records.append(("add_annotations", (filePath, 'method', namespace, className, methodName, get_annotations_by_doccomment(doccomment))))
+
+def __add_function(records, filePath, namespace, functionName, doccomment, line, column, arguments):
+    records.append(("add_function", (filePath, namespace, functionName, doccomment, line, column, arguments)))
+    if doccomment != None:
+        records.append(("add_annotations", (filePath, 'function', namespace, "", functionName, get_annotations_by_doccomment(doccomment))))
+
+def __index_uses(records, filePath, className, containingName, uses, namespace, use_statements={}):
+    if className in use_statements:
+        className = use_statements[className]
+    if len(className)>0 and className[0] != '\\':
+        className = namespace + '\\' + className
+    for line, column, usedName, useType in uses:
+        if useType == 'method':
+            records.append(("add_method_use", (usedName, filePath, line, column, className, containingName)))
+
+        elif useType == 'member':
+            records.append(("add_member_use", (usedName, filePath, line, column, className, containingName)))
+
+        elif useType == 'function':
+            records.append(("add_function_use", (usedName, filePath, line, column, className, containingName)))
+
+        elif useType == 'class':
+            if usedName in use_statements:
+                usedName = use_statements[usedName]
+            if len(usedName)>0 and usedName[0] != '\\':
+                usedName = namespace + '\\' + usedName
+            records.append(("add_class_use", (usedName, filePath, line, column, className, containingName)))
+
+        elif useType == 'constant':
+            records.append(("add_constant_use", (usedName, filePath, line, column, className, containingName)))
@@ -0,0 +1,97 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-phpide
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from .phplexer import token_num
+from .functions import get_annotations_by_doccomment
+from .SyntaxTree import Assignment
+from .SyntaxTree import Variable
+import bisect
+
+T_STRING   = token_num('T_STRING')
+T_VARIABLE = token_num('T_VARIABLE')
+
+class SymbolTable:
+    # The variables of one scope (the body of a function/method or all of the file outside of them):
+    # the [beginIndex, endIndex] token-range of the scope gets scanned once when the table is built.
+
+    def __init__(self, tokens, comments, syntaxTree, beginIndex, endIndex, routineBlock=None):
+        self.__variables      = []  # names in order of their first appearance
+        self.__var_types      = {}  # name => type of the last '@var' annotation in a comment within the scope
+        self.__assignments    = {}  # name => last Assignment-node of the form '$name = ...'
+        self.__argument_types = {}  # name => type-hint of the routine-argument
+
+        kinds = tokens.get_kinds()
+        texts = tokens.get_texts()
+
+        seenVariables = set()
+        for tokenIndex in range(beginIndex, endIndex+1):
+            if kinds[tokenIndex] == T_VARIABLE and texts[tokenIndex] not in seenVariables:
+                seenVariables.add(texts[tokenIndex])
+                self.__variables.append(texts[tokenIndex])
+
+        # comments on the lines of the scope ( // @var $foo \Bar)
+        lineStarts = tokens.get_line_starts()
+        beginOffset = lineStarts[tokens[beginIndex][2]-1]
+        endOffset = None
+        if tokens[endIndex][2] < len(lineStarts):
+            endOffset = lineStarts[tokens[endIndex][2]]
+        commentOffsets = comments.get_offsets()
+        commentIndex = bisect.bisect_left(commentOffsets, beginOffset)
+        while commentIndex < len(commentOffsets) and (endOffset == None or commentOffsets[commentIndex] < endOffset):
+            annotations = get_annotations_by_doccomment(comments.get_texts()[commentIndex])
+            for annotation in annotations.get("var", []):
+                if len(annotation) > 1:
+                    variable, varTypeId = annotation[0:2]
+                    if varTypeId[0] == '$':
+                        variable, varTypeId = varTypeId, variable
+                    if len(varTypeId) > 0 and varTypeId[0] == "?":
+                        varTypeId = varTypeId[1:]
+                    self.__var_types[variable] = varTypeId
+            commentIndex += 1
+
+        for assignment in syntaxTree.get_nodes(Assignment, beginIndex, endIndex):
+            target = assignment.target
+            if type(target) is Variable and texts[assignment.operatorIndex] == '=':
+                self.__assignments[texts[target.begin]] = assignment
+
+        # the arguments up to the first one that is more than '[Type] $name'
+        if routineBlock != None and texts[routineBlock.nameIndex+1] == '(':
+            tokenIndex = routineBlock.nameIndex+2
+            while True:
+                argumentTypeId = None
+                if kinds[tokenIndex] == T_STRING:
+                    argumentTypeId = texts[tokenIndex]
+                    tokenIndex += 1
+                if kinds[tokenIndex] == T_VARIABLE:
+                    if texts[tokenIndex] not in self.__argument_types:
+                        self.__argument_types[texts[tokenIndex]] = argumentTypeId
+                    tokenIndex += 1
+                if texts[tokenIndex] == ',':
+                    tokenIndex += 1
+                else:
+                    break
+
+    def get_variables(self):
+        return self.__variables
+
+    def get_var_type(self, variable):
+        return self.__var_types.get(variable)
+
+    def get_assignment(self, variable):
+        return self.__assignments.get(variable)
+
+    def get_argument_type(self, variable):
+        return self.__argument_types.get(variable)
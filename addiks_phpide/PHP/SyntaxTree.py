@@ -0,0 +1,373 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-phpide
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# The nodes built by phpsyntaxparser.parse_php_syntax.
+# 'begin' and 'end' are the token-indexes of the first and last token of a node (both inclusive),
+# the slots named in 'childSlots' hold the child-nodes (a node, a list of nodes or None), those named in
+# 'indexSlots' further token-indexes.
+
+class SyntaxNode:
+    __slots__ = ('begin', 'end', 'parent')
+    childSlots = ()
+    indexSlots = ()
+
+    def __repr__(self):
+        values = [self.begin, self.end]
+        for slot in self.__slots__:
+            if slot not in ('begin', 'end', 'parent'):
+                values.append(getattr(self, slot))
+        return type(self).__name__ + repr(tuple(values))
+
+    def get_children(self):
+        children = []
+        for slot in self.childSlots:
+            child = getattr(self, slot)
+            if type(child) is list:
+                children += child
+            elif child != None:
+                children.append(child)
+        return children
+
+class Statement(SyntaxNode):
+    __slots__ = ()
+
+class Expression(SyntaxNode):
+    __slots__ = ()
+
+### STATEMENTS
+
+class BlockStatement(Statement):
+    # { ... }
+    __slots__ = ('statements', )
+    childSlots = ('statements', )
+
+    def __init__(self, begin, end, statements):
+        self.begin      = begin
+        self.end        = end
+        self.statements = statements
+
+class ExpressionStatement(Statement):
+    # expressions separated by ',' (echo $a, $b; const A = 1, B = 2; public $c;)
+    __slots__ = ('expressions', )
+    childSlots = ('expressions', )
+
+    def __init__(self, begin, end, expressions):
+        self.begin       = begin
+        self.end         = end
+        self.expressions = expressions
+
+class ReturnStatement(Statement):
+    __slots__ = ('expression', )
+    childSlots = ('expression', )
+
+    def __init__(self, begin, end, expression):
+        self.begin      = begin
+        self.end        = end
+        self.expression = expression
+
+class ControlStatement(Statement):
+    # if, while, foreach, try, catch, ...: 'begin' is the keyword, 'conditions' are the expressions in the
+    # parenthesis and 'body' is the following statement (None for the alternative syntax 'if (...): endif;')
+    __slots__ = ('conditions', 'body')
+    childSlots = ('conditions', 'body')
+
+    def __init__(self, begin, end, conditions, body):
+        self.begin      = begin
+        self.end        = end
+        self.conditions = conditions
+        self.body       = body
+
+class DeclarationStatement(Statement):
+    # class, function or namespace: the header is not parsed, 'body' is the BlockStatement (None for ';')
+    __slots__ = ('body', )
+    childSlots = ('body', )
+
+    def __init__(self, begin, end, body):
+        self.begin = begin
+        self.end   = end
+        self.body  = body
+
+### EXPRESSIONS
+
+class Variable(Expression):
+    __slots__ = ()
+
+    def __init__(self, begin, end):
+        self.begin = begin
+        self.end   = end
+
+class Name(Expression):
+    # class-, function- or constant-name
+    __slots__ = ()
+
+    def __init__(self, begin, end):
+        self.begin = begin
+        self.end   = end
+
+class Literal(Expression):
+    __slots__ = ()
+
+    def __init__(self, begin, end):
+        self.begin = begin
+        self.end   = end
+
+class Assignment(Expression):
+    __slots__ = ('target', 'operatorIndex', 'value')
+    childSlots = ('target', 'value')
+    indexSlots = ('operatorIndex', )
+
+    def __init__(self, begin, end, target, operatorIndex, value):
+        self.begin         = begin
+        self.end           = end
+        self.target        = target
+        self.operatorIndex = operatorIndex
+        self.value         = value
+
+class Call(Expression):
+    # 'callee' is a Name (function-call), a MemberAccess (method-call) or any other expression
+    __slots__ = ('callee', 'arguments')
+    childSlots = ('callee', 'arguments')
+
+    def __init__(self, begin, end, callee, arguments):
+        self.begin     = begin
+        self.end       = end
+        self.callee    = callee
+        self.arguments = arguments
+
+class MemberAccess(Expression):
+    # $object->name, Class::name or Class::$name; 'nameIndex' is None for incomplete or dynamic access
+    __slots__ = ('object', 'operatorIndex', 'nameIndex')
+    childSlots = ('object', )
+    indexSlots = ('operatorIndex', 'nameIndex')
+
+    def __init__(self, begin, end, object, operatorIndex, nameIndex):
+        self.begin         = begin
+        self.end           = end
+        self.object        = object
+        self.operatorIndex = operatorIndex
+        self.nameIndex     = nameIndex
+
+class ArrayAccess(Expression):
+    __slots__ = ('object', 'index')
+    childSlots = ('object', 'index')
+
+    def __init__(self, begin, end, object, index):
+        self.begin  = begin
+        self.end    = end
+        self.object = object
+        self.index  = index
+
+class New(Expression):
+    # 'className' is None for anonymous classes
+    __slots__ = ('className', 'arguments')
+    childSlots = ('className', 'arguments')
+
+    def __init__(self, begin, end, className, arguments):
+        self.begin     = begin
+        self.end       = end
+        self.className = className
+        self.arguments = arguments
+
+class Parenthesis(Expression):
+    __slots__ = ('expression', )
+    childSlots = ('expression', )
+
+    def __init__(self, begin, end, expression):
+        self.begin      = begin
+        self.end        = end
+        self.expression = expression
+
+class ArrayLiteral(Expression):
+    # [...], array(...) or list(...); keys and values are all in 'elements'
+    __slots__ = ('elements', )
+    childSlots = ('elements', )
+
+    def __init__(self, begin, end, elements):
+        self.begin    = begin
+        self.end      = end
+        self.elements = elements
+
+class Closure(Expression):
+    # 'body' is a BlockStatement or the expression of an arrow-function
+    __slots__ = ('body', )
+    childSlots = ('body', )
+
+    def __init__(self, begin, end, body):
+        self.begin = begin
+        self.end   = end
+        self.body  = body
+
+class Operation(Expression):
+    # any other (unary, binary or ternary) operation, the operators are the tokens between the operands
+    __slots__ = ('operands', )
+    childSlots = ('operands', )
+
+    def __init__(self, begin, end, operands):
+        self.begin    = begin
+        self.end      = end
+        self.operands = operands
+
+class SyntaxTree:
+    # The statements of a file together with an index from every token-index to the innermost node
+    # containing that token.
+    # After replace_node the nodes behind the replaced one only get their own span shifted, their descendants
+    # get shifted when they are reached through get_node_by_token_index or get_nodes.
+
+    def __init__(self, statements, tokenCount):
+        self.__statements = statements
+        self.__nodes_by_token = [None] * tokenCount
+        self.__pending_shifts = {} # node => token-delta not yet applied to the descendants of the node
+        for statement in statements:
+            statement.parent = None
+            self.__index_node(statement)
+
+    def __index_node(self, node):
+        # a node only gets the tokens between its children, the children index their own tokens
+        nodesByToken = self.__nodes_by_token
+        position = node.begin
+        for child in node.get_children():
+            child.parent = node
+            if child.begin > position:
+                nodesByToken[position:child.begin] = [node] * (child.begin - position)
+            self.__index_node(child)
+            position = max(position, child.end+1)
+        if node.end >= position:
+            nodesByToken[position:node.end+1] = [node] * (node.end + 1 - position)
+
+    def get_statements(self):
+        # (only the spans of the statements themselves, use get_nodes to get at their descendants)
+        return self.__statements
+
+    def replace_node(self, node, newNode):
+        # puts a reparsed node (beginning at the same token) in place of the old one, the surrounding nodes
+        # and the nodes behind it get shifted by the difference in tokens
+        self.__apply_ancestor_shifts(node)
+        self.__forget_pending_shifts(node)
+        delta = newNode.end - node.end
+        parent = node.parent
+        newNode.parent = parent
+        if parent == None:
+            self.__replace_child(self.__statements, node, newNode)
+        else:
+            for slot in parent.childSlots:
+                child = getattr(parent, slot)
+                if child is node:
+                    setattr(parent, slot, newNode)
+                elif type(child) is list:
+                    self.__replace_child(child, node, newNode)
+
+        if delta != 0:
+            ancestor = parent
+            while True:
+                if ancestor == None:
+                    siblings = self.__statements
+                else:
+                    siblings = ancestor.get_children()
+                for sibling in siblings:
+                    if sibling.begin > node.end:
+                        self.__shift_node(sibling, delta)
+                if ancestor == None:
+                    break
+                ancestor.end += delta
+                for slot in ancestor.indexSlots:
+                    if getattr(ancestor, slot) != None and getattr(ancestor, slot) > node.end:
+                        setattr(ancestor, slot, getattr(ancestor, slot) + delta)
+                ancestor = ancestor.parent
+
+        self.__nodes_by_token[node.begin:node.end+1] = [None] * (newNode.end - newNode.begin + 1)
+        self.__index_node(newNode)
+
+    def __shift_node(self, node, delta):
+        # a node behind the replaced one: its own span now, its descendants when they get reached
+        node.begin += delta
+        node.end   += delta
+        for slot in node.indexSlots:
+            if getattr(node, slot) != None:
+                setattr(node, slot, getattr(node, slot) + delta)
+        self.__pending_shifts[node] = self.__pending_shifts.get(node, 0) + delta
+
+    def __push_pending_shift(self, node):
+        delta = self.__pending_shifts.pop(node, 0)
+        if delta != 0:
+            for child in node.get_children():
+                self.__shift_node(child, delta)
+
+    def __apply_ancestor_shifts(self, node):
+        # the node, its ancestors and their children get their final spans
+        if len(self.__pending_shifts) > 0:
+            ancestors = []
+            ancestor = node.parent
+            while ancestor != None:
+                ancestors.append(ancestor)
+                ancestor = ancestor.parent
+            for ancestor in reversed(ancestors):
+                self.__push_pending_shift(ancestor)
+
+    def __apply_descendant_shifts(self, node):
+        if len(self.__pending_shifts) > 0:
+            pending = [node]
+            while len(pending) > 0:
+                descendant = pending.pop()
+                self.__push_pending_shift(descendant)
+                pending += descendant.get_children()
+
+    def __forget_pending_shifts(self, node):
+        # (a node that gets replaced)
+        if len(self.__pending_shifts) > 0:
+            pending = [node]
+            while len(pending) > 0:
+                descendant = pending.pop()
+                self.__pending_shifts.pop(descendant, None)
+                pending += descendant.get_children()
+
+    def __replace_child(self, children, node, newNode):
+        for index in range(len(children)):
+            if children[index] is node:
+                children[index] = newNode
+
+    def get_node_by_token_index(self, tokenIndex):
+        if tokenIndex == None or tokenIndex < 0 or tokenIndex >= len(self.__nodes_by_token):
+            return None
+        node = self.__nodes_by_token[tokenIndex]
+        if node != None and len(self.__pending_shifts) > 0:
+            if isinstance(node, Expression):
+                # (the whole expression around the node, its parents and children are what gets looked at)
+                expression = node
+                while isinstance(expression.parent, Expression):
+                    expression = expression.parent
+                self.__apply_ancestor_shifts(expression)
+                self.__apply_descendant_shifts(expression)
+            else:
+                self.__apply_ancestor_shifts(node)
+                self.__push_pending_shift(node)
+        return node
+
+    def get_nodes(self, nodeClass, beginIndex=0, endIndex=None):
+        # all nodes of the given class lying within the token-range, in source order
+        if endIndex == None:
+            endIndex = len(self.__nodes_by_token) - 1
+        nodes = []
+        pending = list(reversed(self.__statements))
+        while len(pending) > 0:
+            node = pending.pop()
+            if node.end < beginIndex or node.begin > endIndex:
+                continue
+            if isinstance(node, nodeClass) and node.begin >= beginIndex and node.end <= endIndex:
+                nodes.append(node)
+            if node in self.__pending_shifts:
+                self.__push_pending_shift(node)
+            pending += reversed(node.get_children())
+        return nodes
@@ -0,0 +1,133 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-phpide
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from .phplexer import token_num
+from array import array
+import bisect
+import sys
+
+# texts of these tokens are mostly unique, interning them would only grow the intern-table
+uninternedTokenNums = set([
+    token_num("T_COMMENT"),
+    token_num("T_DOC_COMMENT"),
+    token_num("T_INLINE_HTML"),
+    token_num("T_HEREDOC"),
+])
+
+class TokenList:
+    # Compact storage for the tokens of a file. Keeps one array per column instead of one python-list per
+    # token, shares equal identifier-texts and only stores offsets: rows and columns get computed on access
+    # from the line-start table (see phplexer.line_starts), which can be shared between TokenLists.
+    # Appending takes [tokenNum, text, offset] (as from phplexer.token_lex), indexing returns
+    # [tokenNum, text, row, col] and slicing returns a new TokenList.
+
+    def __init__(self, lineStarts, tokens=()):
+        self.__kinds       = array('H')
+        self.__texts       = []
+        self.__offsets     = array('I')
+        self.__line_starts = lineStarts
+        self.extend(tokens)
+
+    def __len__(self):
+        return len(self.__kinds)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            tokenList = TokenList(self.__line_starts)
+            tokenList.__kinds   = self.__kinds[index]
+            tokenList.__texts   = self.__texts[index]
+            tokenList.__offsets = self.__offsets[index]
+            return tokenList
+        offset = self.__offsets[index]
+        row = bisect.bisect_right(self.__line_starts, offset)
+        return [self.__kinds[index], self.__texts[index], row, offset - self.__line_starts[row-1] + 1]
+
+    def __setitem__(self, index, tokens):
+        # only slices can be assigned, from a TokenList or [tokenNum, text, offset]'s
+        if not isinstance(tokens, TokenList):
+            tokens = TokenList(self.__line_starts, tokens)
+        self.__kinds[index]   = tokens.__kinds
+        self.__texts[index]   = tokens.__texts
+        self.__offsets[index] = tokens.__offsets
+
+    def __iter__(self):
+        lineStarts = self.__line_starts
+        for tokenNum, text, offset in zip(self.__kinds, self.__texts, self.__offsets):
+            row = bisect.bisect_right(lineStarts, offset)
+            yield [tokenNum, text, row, offset - lineStarts[row-1] + 1]
+
+    def append(self, token):
+        tokenNum, text, offset = token
+        if tokenNum not in uninternedTokenNums:
+            text = sys.intern(text)
+        self.__kinds.append(tokenNum)
+        self.__texts.append(text)
+        self.__offsets.append(offset)
+
+    def extend(self, tokens):
+        for token in tokens:
+            self.append(token)
+
+    def get_kinds(self):
+        return self.__kinds
+
+    def get_texts(self):
+        return self.__texts
+
+    def get_offsets(self):
+        return self.__offsets
+
+    def get_line_starts(self):
+        return self.__line_starts
+
+    def shift_offsets(self, beginIndex, delta):
+        if delta != 0:
+            self.__offsets[beginIndex:] = array('I', [offset + delta for offset in self.__offsets[beginIndex:]])
+
+    def get_index_by_position(self, row, col):
+        # index of the last token in front of the given position, None if there is no token behind it
+        offset = self.__offset_by_position(row, col)
+        if offset == None:
+            return None
+        tokenIndex = bisect.bisect_left(self.__offsets, offset)
+        if tokenIndex >= len(self.__offsets):
+            return None
+        return tokenIndex - 1
+
+    def get_indexes_by_positions(self, positions):
+        # get_index_by_position for many [row, col]'s at once: walks through them ordered by offset, so every
+        # lookup only has to search behind the previous one
+        offsets = []
+        for row, col in positions:
+            offsets.append(self.__offset_by_position(row, col))
+
+        tokenIndexes = [None] * len(positions)
+        tokenIndex = 0
+        for position in sorted([p for p in range(len(offsets)) if offsets[p] != None], key=offsets.__getitem__):
+            tokenIndex = bisect.bisect_left(self.__offsets, offsets[position], tokenIndex)
+            if tokenIndex >= len(self.__offsets):
+                break
+            tokenIndexes[position] = tokenIndex - 1
+        return tokenIndexes
+
+    def __offset_by_position(self, row, col):
+        lineStarts = self.__line_starts
+        if row > len(lineStarts):
+            return None
+        offset = max(lineStarts[row-1], lineStarts[row-1] + col - 1)
+        if row < len(lineStarts):
+            offset = min(offset, lineStarts[row])
+        return offset
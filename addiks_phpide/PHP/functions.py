@@ -15,11 +15,17 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import re
+from functools import lru_cache
 
 docCommentRegex = re.compile("\\@([\\\\a-zA-Z_-]+)(([\$ \ta-zA-Z0-9\?\\\\_-]+)*)")
 whitespaceRegex = re.compile("\s+")
 
 def get_annotations_by_doccomment(docComment):
+    # the same doc-comments get asked for over and over, the result must not be modified by the caller
+    return __parse_annotations(docComment)
+
+@lru_cache(maxsize=4096)
+def __parse_annotations(docComment):
     annotations = {}
     for match in docCommentRegex.finditer(docComment):
         key, value = match.groups()[0:2]
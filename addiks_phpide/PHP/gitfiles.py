@@ -0,0 +1,66 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-phpide
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import subprocess
+
+def get_git_php_files(workDir):
+    # Asks git about the php-files below workDir: returns {filePath: blobId} of the files tracked by git and the
+    # set of file-paths that git reports as modified, untracked, ... in the working tree (for those the blob-id
+    # from the git-index does not describe the content). Returns None if workDir is not in a git-repository.
+    # All paths are workDir + "/" + (path relative to workDir).
+    try:
+        prefix = __git(workDir, ["rev-parse", "--show-prefix"]).strip()
+        listing = __git(workDir, ["ls-files", "--stage", "-z", "--", "*.php"])
+        status = __git(workDir, ["status", "--porcelain", "-z", "--untracked-files=all", "--", "*.php"])
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    blobIds = {}
+    changedPaths = set()
+
+    # <mode> <blob-id> <stage>\t<path relative to workDir>
+    for entry in listing.split("\0"):
+        if len(entry) > 0:
+            info, path = entry.split("\t", 1)
+            mode, blobId, stage = info.split(" ")
+            filePath = workDir + "/" + path
+            if stage != "0": # unresolved merge-conflict
+                changedPaths.add(filePath)
+            elif mode != "160000": # (not a submodule)
+                blobIds[filePath] = blobId
+
+    # XY <path relative to the repository-root>, renames and copies are followed by the original path
+    entries = status.split("\0")
+    entryIndex = 0
+    while entryIndex < len(entries):
+        entry = entries[entryIndex]
+        entryIndex += 1
+        if len(entry) > 3:
+            if entry[0] in "RC":
+                entryIndex += 1
+            path = entry[3:]
+            if path.startswith(prefix):
+                changedPaths.add(workDir + "/" + path[len(prefix):])
+
+    return (blobIds, changedPaths)
+
+def __git(workDir, arguments):
+    return subprocess.run(
+        ["git", "-C", workDir] + arguments,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=True
+    ).stdout.decode("utf-8", "surrogateescape")
@@ -15,6 +15,8 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import re
+import array
+import bisect
 import collections
 import string
 
@@ -90,56 +92,17 @@ tokens['T_XOR_EQUAL']                = "\\^=" #
 #tokens['T_STRING']                   = "[a-zA-Z_\\\\][a-zA-Z0-9_\\\\]*"
 tokens['T_STRING']                   = "[a-zA-Z_\x7f-\xff][a-zA-Z0-9_\x7f-\xff\\\\]*" #
 
-_token_name_cache = {}
-_token_num_cache = {}
-
 # get the name for given token-number
 def token_name(num):
-    result = None
-    if num in _token_name_cache:
-        result = _token_name_cache[num]
-    else:
-        tokenNum = -1
-        for keyword in keywords:
-            tokenNum += 1
-            tokenId = 'T_'+keyword.upper()
-            if tokenId == num:
-                _token_name_cache[num] = tokenId
-                result = tokenId
-        for tokenId in tokens:
-            tokenNum += 1
-            if tokenNum == num:
-                _token_name_cache[num] = tokenId
-                result = tokenId
-        if result == None:
-            raise Exception("No token-name for #"+str(num)+" found!")
-        _token_name_cache[num] = result
-        _token_num_cache[result] = num
-    return result
+    if num not in range(len(tokenNames)):
+        raise Exception("No token-name for #"+str(num)+" found!")
+    return tokenNames[num]
 
 # get the number for given token-name
 def token_num(needleTokenId):
-    result = None
-    if needleTokenId in _token_num_cache:
-        result = _token_num_cache[needleTokenId]
-    else:
-        tokenNum = -1
-        for keyword in keywords:
-            tokenNum += 1
-            tokenId = 'T_'+keyword.upper()
-            if tokenId == needleTokenId:
-                _token_num_cache[needleTokenId] = tokenNum
-                result = tokenNum
-        for tokenId in tokens:
-            tokenNum += 1
-            if tokenId == needleTokenId:
-                _token_num_cache[needleTokenId] = tokenNum
-                result = tokenNum
-        if result == None:
-            raise Exception("No token-num for '"+str(needleTokenId)+"' found!")
-        _token_name_cache[result] = needleTokenId
-        _token_num_cache[needleTokenId] = result
-    return result
+    if needleTokenId not in tokenNums:
+        raise Exception("No token-num for '"+str(needleTokenId)+"' found!")
+    return tokenNums[needleTokenId]
 
 keywords = [
     'abstract', 'array', 'as', 'break', 'case',
@@ -157,6 +120,13 @@ keywords = [
     'while'
 ]
 
+# token-numbers are the keyword-indexes followed by the indexes in 'tokens'
+tokenNames = ['T_' + keyword.upper() for keyword in keywords] + list(tokens)
+
+tokenNums = {}
+for tokenNum in range(len(tokenNames)):
+    tokenNums[tokenNames[tokenNum]] = tokenNum # later entries win (T_FUNCTION, T_ISSET)
+
 specialChars = [
     '<', '>', '+', '-', '*', '/', '%',
     '(', ')', '[', ']', '{', '}',
@@ -230,182 +200,525 @@ T_STRING                   = token_num('T_STRING')
 T_VARIABLE                 = token_num('T_VARIABLE')
 T_DNUMBER                  = token_num('T_DNUMBER')
 T_CLOSE_TAG                = token_num('T_CLOSE_TAG')
-T_CLOSE_TAG                = token_num('T_CLOSE_TAG')
 T_HEREDOC                  = token_num('T_HEREDOC')
 T_DOC_COMMENT              = token_num('T_DOC_COMMENT')
 
-def token_get_all(code, filePath=None):
-    tokens = []
-    comments = []
+whitespaceChars      = frozenset(' \t\r\n')
+specialCharSet       = frozenset(specialChars)
+identifierBeginChars = frozenset('_\\' + string.ascii_letters)
+variableChars        = '_' + string.ascii_letters + string.digits
+
+keywordTokenMap = {}
+for keyword in keywords:
+    keywordTokenMap[keyword] = token_num('T_' + keyword.upper())
+
+whitespaceRegex       = re.compile("[ \t\r\n]+")
+keywordCandidateRegex = re.compile("[a-z_]+")
+identifierRegex       = re.compile("[_\\\\a-zA-Z][_\\\\a-zA-Z0-9]*")
+variableRegex         = re.compile("\\$[_a-zA-Z0-9]*")
+numberRegex           = re.compile("[0-9][0-9.]*")
+stringRegexes         = {
+    '"': re.compile('"(?:[^"\\\\]|\\\\[\\s\\S]?)*"?'),
+    "'": re.compile("'(?:[^'\\\\]|\\\\[\\s\\S]?)*'?"),
+}
+
+# tokens recognized by scanner-mode with one dict-lookup on the matched text
+scannerTokenMap = {}
+scannerTokenMap.update(directTokenMap)
+scannerTokenMap.update(operators)
+scannerTokenMap.update(operatorsLong)
+
+identifierTokenMap = dict(keywordTokenMap) # keywords, magic constants, exit/die
+for directToken in directTokenMap:
+    if identifierRegex.fullmatch(directToken) and directToken != '\\':
+        identifierTokenMap[directToken] = directTokenMap[directToken]
+
+def __build_scanner_regex():
+    directTokens = list(scannerTokenMap)
+    directTokens.sort(key=len, reverse=True)
+    expressions = [
+        "(?P<whitespace>[ \\t\\r\\n]+)",
+        "(?P<identifier>[_\\\\a-zA-Z][_\\\\a-zA-Z0-9]*)",
+        "(?P<comment>/\\*|//|\\#|<<<)",
+        "(?P<direct>" + "|".join(re.escape(directToken) for directToken in directTokens if directToken[0] in specialCharSet) + ")",
+        "(?P<variable>\\$[_a-zA-Z0-9]+|\\$\\Z)",
+        "(?P<close>\\?>)",
+        "(?P<single>[" + re.escape("".join(specialChars)) + "])",
+        "(?P<string>" + stringRegexes['"'].pattern + "|" + stringRegexes["'"].pattern + ")",
+        "(?P<number>[0-9][0-9.]*)",
+        "(?P<unknown>[\\s\\S])",
+    ]
+    return re.compile("|".join(expressions))
+
+scannerRegex = __build_scanner_regex()
+
+def token_get_all(code, filePath=None, useScanner=False, offsets=None):
+    # if given, the list 'offsets' receives the position in the code of every token
+    if useScanner:
+        tokens, comments = __token_scan_all(code)
+    else:
+        tokens   = []
+        comments = []
+        __lex(code, 0, len(code), False, tokens, comments)
+
+    lineStarts = line_starts(code)
+    __resolve_positions(lineStarts, tokens, offsets)
+    __resolve_positions(lineStarts, comments, None)
+
+    return (tokens, comments, )
 
-    row = 1
-    col = 1
+def token_iterate(code, chunkSize=4096):
+    # yields the same tokens as token_get_all, but lexes them lazily chunk by chunk
+    lineStarts = line_starts(code)
+    tokens   = []
+    comments = []
+    position, isInPhp = (0, False, )
+    row = 1 # (the row of the last token of the previous chunk, the tokens of a chunk follow it)
+    while position < len(code):
+        position, isInPhp = __lex(code, position, position + chunkSize, isInPhp, tokens, comments)
+        row = __resolve_positions(lineStarts, tokens, None, row)
+        for token in tokens:
+            yield token
+        del tokens[:]
+        del comments[:]
+
+def token_lex(code, tokens, comments):
+    # Lexes without computing rows and columns: appends [tokenNum, text, offset] to 'tokens' and
+    # [T_COMMENT, text, endOffset] to 'comments'. Use line_starts and token_position to get row and column.
+    __lex(code, 0, len(code), False, tokens, comments)
+    return (tokens, comments, )
 
-    isInPhp = False
-    while len(code) > 0:
+def line_starts(code):
+    # offsets of the beginning of every line (the first line is line 1)
+    lineStarts = array.array('I', [0])
+    position = code.find("\n")
+    while position >= 0:
+        lineStarts.append(position + 1)
+        position = code.find("\n", position + 1)
+    return lineStarts
+
+# what code_window has to know about: strings and comments (skipped), braces and semicolons
+windowScanRegex = re.compile('\'(?:[^\'\\\\]|\\\\[\\s\\S])*\'|"(?:[^"\\\\]|\\\\[\\s\\S])*"|//[^\\n]*|\\#[^\\n]*|/\\*[\\s\\S]*?\\*/|[{};]')
+
+def code_window(code, offset, windowSize):
+    # For files too big to analyze as a whole: returns (windowCode, beginOffset, endOffset) where windowCode is
+    # the code with everything blanked out (spaces, newlines kept) except for the part in front of the first
+    # block (namespace, use-statements), the heads and closing braces of the blocks around the offset and
+    # the biggest of these blocks not larger than windowSize (at least the innermost one), which spans
+    # [beginOffset, endOffset).
+    # Only scans strings, comments and braces, a heredoc with braces in it may confuse it.
+
+    firstBlockBegin = None
+    statementBegin = 0
+    openBlocks = []   # [statementBegin, openOffset] of every open '{'
+    blocksAround = [] # [statementBegin, openOffset, closeOffset] of the blocks around the offset, innermost first
+    for match in windowScanRegex.finditer(code):
+        text = match.group()
+        if text == '{':
+            if firstBlockBegin == None:
+                firstBlockBegin = statementBegin
+            openBlocks.append([statementBegin, match.start()])
+            statementBegin = match.end()
+        elif text == '}':
+            if len(openBlocks) > 0:
+                blockBegin, openOffset = openBlocks.pop()
+                if openOffset < offset and offset <= match.start():
+                    blocksAround.append([blockBegin, openOffset, match.start()])
+            statementBegin = match.end()
+        elif text == ';':
+            statementBegin = match.end()
+
+    for blockBegin, openOffset in reversed(openBlocks): # unclosed blocks reach until the end
+        if openOffset < offset:
+            blocksAround.append([blockBegin, openOffset, len(code)-1])
+
+    if len(blocksAround) <= 0:
+        return (code, 0, len(code))
+
+    windowIndex = 0
+    while windowIndex+1 < len(blocksAround):
+        blockBegin, openOffset, closeOffset = blocksAround[windowIndex+1]
+        if closeOffset + 1 - blockBegin > windowSize:
+            break
+        windowIndex += 1
+    beginOffset = blocksAround[windowIndex][0]
+    endOffset   = blocksAround[windowIndex][2] + 1
+
+    keptRanges = [[0, firstBlockBegin], [beginOffset, endOffset]]
+    for blockBegin, openOffset, closeOffset in blocksAround[windowIndex+1:]:
+        keptRanges.append([blockBegin, openOffset+1])
+        keptRanges.append([closeOffset, closeOffset+1])
+    keptRanges.sort()
+
+    parts = []
+    position = 0
+    for rangeBegin, rangeEnd in keptRanges:
+        if rangeBegin > position:
+            parts.append("\n".join(" " * len(line) for line in code[position:rangeBegin].split("\n")))
+        if rangeEnd > position:
+            parts.append(code[max(position, rangeBegin):rangeEnd])
+            position = rangeEnd
+    parts.append("\n".join(" " * len(line) for line in code[position:].split("\n")))
+
+    return ("".join(parts), beginOffset, endOffset)
+
+def token_position(lineStarts, offset):
+    # row and column of an offset, as a token with that offset would have them
+    row = bisect.bisect_right(lineStarts, offset)
+    return (row, offset - lineStarts[row-1] + 1, )
+
+def __resolve_positions(lineStarts, tokens, offsets, row=1):
+    # replaces the offsets of sorted tokens by row and column, the first token is not before line 'row'.
+    # Returns the row of the last token.
+    rowCount = len(lineStarts)
+    for token in tokens:
+        offset = token[2]
+        while row < rowCount and lineStarts[row] <= offset:
+            row += 1
+        token[2] = row
+        token.append(offset - lineStarts[row-1] + 1)
+        if offsets != None:
+            offsets.append(offset)
+    return row
+
+def __lex(code, position, limit, isInPhp, tokens, comments):
+    # walks the (never sliced) code by offset, so lexing stays linear in the size of the file.
+    # Stops at the first token-boundary at or after 'limit', returns the state to continue from there.
+    length = len(code)
+    limit = min(limit, length)
+    while position < limit:
+        char = code[position]
         if isInPhp:
-            if code[0] in [' ', '\t', '\r']:
-                while len(code) > 0 and code[0] in [' ', '\t', '\r']:
-                    col += 1
-                    code = code[1:]
-
-            elif code[0] in specialChars:
-                if code[0:3] == '/**':
-                    endPos = code.find('*/') + 2
-                    tokenText = code[0:endPos]
-                    code, tokens, row, col = process_token(code, tokens, T_DOC_COMMENT, tokenText, row, col)
-                    comments.append([T_COMMENT, tokenText, row, col])
-
-                elif code[0:2] == '/*':
-                    endPos = code.find('*/') + 2
-                    tokenText = code[0:endPos]
-                    code, tokens, row, col = process_token(code, tokens, T_COMMENT, tokenText, row, col)
-                    comments.append([T_COMMENT, tokenText, row, col])
-
-                elif code[0:2] == '//' or code[0:1] == '#':
-                    endPos = code.find('\n')
-                    if endPos > 0:
-                        tokenText = code[0:endPos + 1]
-                        code, tokens, row, col = process_token(code, tokens, T_COMMENT, tokenText, row, col)
-                        comments.append([T_COMMENT, tokenText, row, col])
+            if char in whitespaceChars:
+                endPosition = whitespaceRegex.match(code, position).end()
+                position = endPosition
+
+            elif char in identifierBeginChars:
+                keyword = keywordCandidateRegex.match(code, position)
+                if keyword != None:
+                    keyword = keyword.group()
+                    nextCharacter = code[position+len(keyword):position+len(keyword)+1]
+                    if keyword not in keywordTokenMap or nextCharacter.isalnum() or nextCharacter == "_":
+                        keyword = None
+
+                if keyword != None:
+                    tokens.append([keywordTokenMap[keyword], keyword, position])
+                    tokenText = keyword
+                else:
+                    tokenText = identifierRegex.match(code, position).group()
+                    tokens.append([T_STRING, tokenText, position])
+                position += len(tokenText)
+
+            elif char in specialCharSet:
+                if code.startswith('/*', position):
+                    tokenNum = T_COMMENT
+                    if code.startswith('/**', position):
+                        tokenNum = T_DOC_COMMENT
+                    endPosition = code.find('*/', position)
+                    if endPosition < 0:
+                        endPosition = position + 1
+                    else:
+                        endPosition += 2
+                    tokenText = code[position:endPosition]
+                    tokens.append([tokenNum, tokenText, position])
+                    comments.append([T_COMMENT, tokenText, position + len(tokenText)])
+                    position = endPosition
+
+                elif char == '#' or code.startswith('//', position):
+                    endPosition = code.find('\n', position)
+                    if endPosition > 0:
+                        tokenText = code[position:endPosition + 1]
+                        tokens.append([T_COMMENT, tokenText, position])
+                        comments.append([T_COMMENT, tokenText, position + len(tokenText)])
+                        position = endPosition + 1
                     else:
-                        comments.append([T_COMMENT, code, row, col])
-                        code = ""
-                elif code[0:3] == '<<<':
-                    tokenText = code[0:3]
-                    heredocName = ""
-                    index = 3
-                    while code[index] != "\n":
-                        heredocName += code[index]
-                        index += 1
-                    tokenText += heredocName
-                    heredocName = heredocName.strip()
-                    if heredocName[0] in ['"', "'"]:
+                        comments.append([T_COMMENT, code[position:], length])
+                        position = length
+
+                elif code.startswith('<<<', position):
+                    endPosition = code.find("\n", position)
+                    if endPosition < 0:
+                        endPosition = length
+                    heredocName = code[position+3:endPosition].strip()
+                    if heredocName[0:1] in ['"', "'"]:
                         heredocName = heredocName[1:len(heredocName)-2]
-                    while code[index:index+len(heredocName)+1] != '\n' + heredocName:
-                        tokenText += code[index]
-                        index += 1
-                    tokenText += '\n' + heredocName
-                    code, tokens, row, col = process_token(code, tokens, T_HEREDOC, tokenText, row, col)
-
-                elif code[0:3] in operatorsLong:
-                    tokenText = code[0:3]
-                    tokenNum = operatorsLong[tokenText]
-                    code, tokens, row, col = process_token(code, tokens, tokenNum, tokenText, row, col)
-
-                elif code[0:2] in operators:
-                    tokenText = code[0:2]
-                    tokenNum = operators[tokenText]
-                    code, tokens, row, col = process_token(code, tokens, tokenNum, tokenText, row, col)
-
-                elif code[0:1] == '$' and code[1:2] in '_' + string.ascii_letters + string.digits:
-                    tokenText = code[0:2]
-                    index = 2
-                    while code[index] in '_' + string.ascii_letters + string.digits:
-                        tokenText += code[index]
-                        index += 1
-                    code, tokens, row, col = process_token(code, tokens, T_VARIABLE, tokenText, row, col)
-
-                elif code[0:2] == '?>':
-                    code, tokens, row, col = process_token(code, tokens, T_CLOSE_TAG, code[0:2], row, col)
+                    heredocEnd = code.find('\n' + heredocName, endPosition)
+                    if heredocEnd < 0:
+                        endPosition = length
+                    else:
+                        endPosition = heredocEnd + len(heredocName) + 1
+                    tokenText = code[position:endPosition]
+                    tokens.append([T_HEREDOC, tokenText, position])
+                    position = endPosition
+
+                elif code[position:position+3] in operatorsLong:
+                    tokens.append([operatorsLong[code[position:position+3]], code[position:position+3], position])
+                    position += 3
+
+                elif code[position:position+2] in operators:
+                    tokens.append([operators[code[position:position+2]], code[position:position+2], position])
+                    position += 2
+
+                elif char == '$' and code[position+1:position+2] in variableChars:
+                    tokenText = variableRegex.match(code, position).group()
+                    tokens.append([T_VARIABLE, tokenText, position])
+                    position += len(tokenText)
+
+                elif code.startswith('?>', position):
+                    tokens.append([T_CLOSE_TAG, '?>', position])
+                    position += 2
                     isInPhp = False
 
                 else:
-                    code, tokens, row, col = process_token(code, tokens, T_SINGLE_CHAR, code[0:1], row, col)
-
-            elif code[0] == '\n':
-                col = 1
-                row += 1
-                code = code[1:]
-
-            elif code[0] in '_\\' + string.ascii_letters:
-                isKeyword = False
-                keyword = None
-                for keyword in keywords:
-                    nextCharacter = code[len(keyword):len(keyword)+1]
-                    if code[0:len(keyword)] == keyword and not (nextCharacter.isalnum() or nextCharacter == "_"):
-                        isKeyword = True
-                        break
+                    tokens.append([T_SINGLE_CHAR, char, position])
+                    position += 1
 
-                if isKeyword:
-                    tokenNum = token_num('T_' + keyword.upper())
-                    code, tokens, row, col = process_token(code, tokens, tokenNum, keyword, row, col)
-                else:
-                    tokenText = code[0]
-                    index = 1
-                    while len(code) > index and code[index] in '_\\' + string.ascii_letters + string.digits:
-                        tokenText += code[index]
-                        index += 1
-                    code, tokens, row, col = process_token(code, tokens, T_STRING, tokenText, row, col)
-
-            elif code[0] in ['"', "'"]:
-                tokenText = code[0]
-                index = 1
-                while index < len(code) and code[0] != code[index]:
-                    tokenText += code[index]
-                    if code[index] == '\\':
-                        tokenText += code[index+1:index+2]
-                        index += 1
-                    index += 1
-                if index < len(code):
-                    tokenText += code[index]
-                code, tokens, row, col = process_token(code, tokens, T_CONSTANT_ENCAPSED_STRING, tokenText, row, col)
-
-            elif code[0] in string.digits:
-                tokenText = code[0]
-                index = 1
-                while len(code) > index and code[index] in string.digits + '.':
-                    tokenText += code[index]
-                    index += 1
-                code, tokens, row, col = process_token(code, tokens, T_DNUMBER, tokenText, row, col)
+            elif char in ['"', "'"]:
+                tokenText = stringRegexes[char].match(code, position).group()
+                tokens.append([T_CONSTANT_ENCAPSED_STRING, tokenText, position])
+                position += len(tokenText)
 
-            else:
-                isDirectToken = False
-                directToken = None
-                for directToken in directTokenMap:
-                    if code[0:len(directToken)] == directToken:
-                        isDirectToken = True
-                        break
+            elif char in string.digits:
+                tokenText = numberRegex.match(code, position).group()
+                tokens.append([T_DNUMBER, tokenText, position])
+                position += len(tokenText)
 
-                if isDirectToken:
-                    tokenNum = directTokenMap[directToken]
-                    code, tokens, row, col = process_token(code, tokens, tokenNum, directToken, row, col)
-                else:
-                    code = code[1:]
+            else:
+                # unknown character (not part of any token)
+                position += 1
 
         else: # not in php-code
-            beginPosition = code.find('<?')
+            beginPosition = code.find('<?', position)
             if beginPosition >= 0:
-                if beginPosition > 0:
-                    tokenText = code[0:beginPosition]
-                    code, tokens, row, col = process_token(code, tokens, T_INLINE_HTML, tokenText, row, col)
+                if beginPosition > position:
+                    tokenText = code[position:beginPosition]
+                    tokens.append([T_INLINE_HTML, tokenText, position])
 
-                tokenText = '<?'
-                if code[0:5] == '<?php':
+                if code.startswith('<?php', beginPosition):
                     tokenText = '<?php'
-                elif code[0:3] == '<?=':
+                elif code.startswith('<?=', beginPosition):
                     tokenText = '<?='
                 else:
                     tokenText = '<?'
 
-                code, tokens, row, col = process_token(code, tokens, T_PHP_START, tokenText, row, col)
+                tokens.append([T_PHP_START, tokenText, beginPosition])
+                position = beginPosition + len(tokenText)
                 isInPhp = True
 
             else:
-                tokens.append([T_INLINE_HTML, code, row, col])
-                code = ""
+                tokens.append([T_INLINE_HTML, code[position:], position])
+                position = length
+
+    return (position, isInPhp, )
+
+def token_relex(code, tokens, comments, editOffset, removedLength, insertedText):
+    # Updates the TokenLists filled by token_lex (tokens and comments, sharing one line-start table) after
+    # 'removedLength' characters at 'editOffset' got replaced by 'insertedText'; 'code' is the code after that edit.
+    # Only relexes from the nearest safe token before the edit until the token-stream matches the old
+    # one again, the rest of the old tokens just get their offsets shifted. Modifies the given TokenLists.
+    # Also returns (beginIndex, oldEndIndex, newEndIndex): the old tokens [beginIndex:oldEndIndex] got
+    # replaced by the new tokens [beginIndex:newEndIndex].
+
+    delta   = len(insertedText) - removedLength
+    editEnd = editOffset + len(insertedText)
+    offsets        = tokens.get_offsets()
+    commentOffsets = comments.get_offsets()
+
+    # lexing a token looks up to three characters ahead, restart in front of that
+    restartIndex = max(0, bisect.bisect_left(offsets, editOffset - 3) - 1)
+    if code.find('*/', max(0, editOffset - 1), editEnd + 1) >= 0:
+        # an unterminated comment before the edit may have gotten terminated
+        for tokenIndex in range(restartIndex):
+            if tokens[tokenIndex][0] in [T_COMMENT, T_DOC_COMMENT] and tokens[tokenIndex][1] == '/':
+                restartIndex = tokenIndex
+                break
+
+    newTokens   = tokens[0:0]
+    newComments = comments[0:0]
+    newOffsets  = newTokens.get_offsets()
+    if restartIndex < len(tokens):
+        position = offsets[restartIndex]
+        isInPhp  = tokens[restartIndex][0] not in [T_INLINE_HTML, T_PHP_START]
+    else:
+        position, isInPhp = (0, False, )
+    restartCommentIndex = bisect.bisect_right(commentOffsets, position) # comments carry their end-offset
+
+    syncIndex = None
+    newSyncIndex = None
+    limit = editEnd
+    length = len(code)
+    while syncIndex == None and position < length:
+        checkIndex = len(newTokens)
+        position, isInPhp = __lex(code, position, limit, isInPhp, newTokens, newComments)
+
+        for newTokenIndex in range(checkIndex, len(newTokens)):
+            oldOffset = newOffsets[newTokenIndex] - delta
+            if newOffsets[newTokenIndex] >= editEnd:
+                oldTokenIndex = bisect.bisect_left(offsets, oldOffset)
+                if oldTokenIndex < len(offsets) and offsets[oldTokenIndex] == oldOffset:
+                    if tokens[oldTokenIndex][0] == newTokens[newTokenIndex][0]:
+                        syncIndex = oldTokenIndex
+                        newSyncIndex = newTokenIndex
+                        break
 
-    return (tokens, comments, )
+        limit = position + 2 * max(64, limit - editOffset)
 
-def process_token(code, tokens, tokenNum, tokenText, row, col):
-    code = code[len(tokenText):]
-    tokens.append([tokenNum, tokenText, row, col])
+    if syncIndex == None:
+        changedTokens = (restartIndex, len(tokens), restartIndex + len(newTokens))
+        tokens[restartIndex:]          = newTokens
+        comments[restartCommentIndex:] = newComments
 
-    rowDelta = tokenText.count("\n")
-    row += rowDelta
-    if rowDelta > 0:
-        col = len(tokenText) - tokenText.rfind("\n")
     else:
-        col += len(tokenText)
+        syncCommentIndex = bisect.bisect_right(commentOffsets, offsets[syncIndex])
+        newComments = newComments[0:bisect.bisect_right(newComments.get_offsets(), newOffsets[newSyncIndex])]
 
-    return [code, tokens, row, col]
+        changedTokens = (restartIndex, syncIndex, restartIndex + newSyncIndex)
+        tokens.shift_offsets(syncIndex, delta)
+        comments.shift_offsets(syncCommentIndex, delta)
+
+        tokens[restartIndex:syncIndex]                 = newTokens[0:newSyncIndex]
+        comments[restartCommentIndex:syncCommentIndex] = newComments
+
+    __update_line_starts(tokens.get_line_starts(), editOffset, removedLength, insertedText)
+
+    return (tokens, comments, changedTokens)
+
+def __update_line_starts(lineStarts, editOffset, removedLength, insertedText):
+    beginIndex = bisect.bisect_right(lineStarts, editOffset)
+    endIndex   = bisect.bisect_right(lineStarts, editOffset + removedLength)
+
+    insertedLineStarts = array.array('I')
+    position = insertedText.find("\n")
+    while position >= 0:
+        insertedLineStarts.append(editOffset + position + 1)
+        position = insertedText.find("\n", position + 1)
+    lineStarts[beginIndex:endIndex] = insertedLineStarts
+
+    delta = len(insertedText) - removedLength
+    for lineIndex in range(beginIndex + len(insertedLineStarts), len(lineStarts)):
+        lineStarts[lineIndex] += delta
+
+def __token_scan_all(code):
+    # scanner-mode: one precompiled alternation decides every token inside php-code.
+    # Differs from the default mode only in emitting casts, magic constants and exit/die as own tokens.
+    tokens = []
+    comments = []
+
+
+    position = 0
+    length = len(code)
+    match = scannerRegex.match
+    while position < length:
+        beginPosition = code.find('<?', position)
+        if beginPosition < 0:
+            tokens.append([T_INLINE_HTML, code[position:], position])
+            break
+
+        if beginPosition > position:
+            tokenText = code[position:beginPosition]
+            tokens.append([T_INLINE_HTML, tokenText, position])
+
+        if code.startswith('<?php', beginPosition):
+            tokenText = '<?php'
+        elif code.startswith('<?=', beginPosition):
+            tokenText = '<?='
+        else:
+            tokenText = '<?'
+
+        tokens.append([T_PHP_START, tokenText, beginPosition])
+        position = beginPosition + len(tokenText)
+
+        while position < length:
+            tokenMatch = match(code, position)
+            group = tokenMatch.lastgroup
+            tokenText = tokenMatch.group()
+
+            if group == 'whitespace':
+                position += len(tokenText)
+
+            elif group == 'identifier':
+                if tokenText in identifierTokenMap:
+                    nextCharacter = code[position+len(tokenText):position+len(tokenText)+1]
+                    if not nextCharacter.isalnum():
+                        tokens.append([identifierTokenMap[tokenText], tokenText, position])
+                    else:
+                        tokens.append([T_STRING, tokenText, position])
+
+                elif '\\' in tokenText and tokenText[0:tokenText.find('\\')] in keywordTokenMap:
+                    tokenText = tokenText[0:tokenText.find('\\')]
+                    tokens.append([keywordTokenMap[tokenText], tokenText, position])
+
+                else:
+                    tokens.append([T_STRING, tokenText, position])
+                position += len(tokenText)
+
+            elif group == 'single':
+                tokens.append([T_SINGLE_CHAR, tokenText, position])
+                position += 1
+
+            elif group == 'direct' or group == 'variable':
+                if group == 'direct':
+                    tokens.append([scannerTokenMap[tokenText], tokenText, position])
+                else:
+                    tokens.append([T_VARIABLE, tokenText, position])
+                position += len(tokenText)
+
+            elif group == 'string':
+                tokens.append([T_CONSTANT_ENCAPSED_STRING, tokenText, position])
+                position += len(tokenText)
+
+            elif group == 'number':
+                tokens.append([T_DNUMBER, tokenText, position])
+                position += len(tokenText)
+
+            elif group == 'comment':
+                if tokenText == '/*':
+                    tokenNum = T_COMMENT
+                    if code.startswith('/**', position):
+                        tokenNum = T_DOC_COMMENT
+                    endPosition = code.find('*/', position)
+                    if endPosition < 0:
+                        endPosition = position + 1
+                    else:
+                        endPosition += 2
+                    tokenText = code[position:endPosition]
+                    tokens.append([tokenNum, tokenText, position])
+                    comments.append([T_COMMENT, tokenText, position + len(tokenText)])
+                    position = endPosition
+
+                elif tokenText == '<<<':
+                    endPosition = code.find("\n", position)
+                    if endPosition < 0:
+                        endPosition = length
+                    heredocName = code[position+3:endPosition].strip()
+                    if heredocName[0:1] in ['"', "'"]:
+                        heredocName = heredocName[1:len(heredocName)-2]
+                    heredocEnd = code.find('\n' + heredocName, endPosition)
+                    if heredocEnd < 0:
+                        endPosition = length
+                    else:
+                        endPosition = heredocEnd + len(heredocName) + 1
+                    tokenText = code[position:endPosition]
+                    tokens.append([T_HEREDOC, tokenText, position])
+                    position = endPosition
+
+                else:
+                    endPosition = code.find('\n', position)
+                    if endPosition > 0:
+                        tokenText = code[position:endPosition + 1]
+                        tokens.append([T_COMMENT, tokenText, position])
+                        comments.append([T_COMMENT, tokenText, position + len(tokenText)])
+                        position = endPosition + 1
+                    else:
+                        comments.append([T_COMMENT, code[position:], length])
+                        position = length
+
+            elif group == 'close':
+                tokens.append([T_CLOSE_TAG, tokenText, position])
+                position += 2
+                break
+
+            else: # unknown character (not part of any token)
+                position += 1
+
+    return (tokens, comments, )
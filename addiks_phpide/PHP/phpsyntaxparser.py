@@ -0,0 +1,482 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-phpide
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from .phplexer import token_num
+from .SyntaxTree import SyntaxTree
+from .SyntaxTree import BlockStatement
+from .SyntaxTree import ExpressionStatement
+from .SyntaxTree import ReturnStatement
+from .SyntaxTree import ControlStatement
+from .SyntaxTree import DeclarationStatement
+from .SyntaxTree import Variable
+from .SyntaxTree import Name
+from .SyntaxTree import Literal
+from .SyntaxTree import Assignment
+from .SyntaxTree import Call
+from .SyntaxTree import MemberAccess
+from .SyntaxTree import ArrayAccess
+from .SyntaxTree import New
+from .SyntaxTree import Parenthesis
+from .SyntaxTree import ArrayLiteral
+from .SyntaxTree import Closure
+from .SyntaxTree import Operation
+
+T_STRING       = token_num('T_STRING')
+T_STATIC       = token_num('T_STATIC')
+T_VARIABLE     = token_num('T_VARIABLE')
+T_NS_SEPERATOR = token_num('T_NS_SEPERATOR')
+T_CLOSE_TAG    = token_num('T_CLOSE_TAG')
+T_PHP_START    = token_num('T_PHP_START')
+T_INLINE_HTML  = token_num('T_INLINE_HTML')
+T_DOC_COMMENT  = token_num('T_DOC_COMMENT')
+T_COMMENT      = token_num('T_COMMENT')
+
+commentTokenNums = set([T_COMMENT, T_DOC_COMMENT])
+
+nameTokenNums = set([T_STRING, T_STATIC] + [token_num(name) for name in [
+    'T_EXIT', 'T_CLASS_C', 'T_DIR', 'T_FILE', 'T_FUNC_C', 'T_LINE', 'T_METHOD_C', 'T_NS_C',
+]])
+
+literalTokenNums = set([token_num(name) for name in [
+    'T_LNUMBER', 'T_DNUMBER', 'T_CONSTANT_ENCAPSED_STRING', 'T_HEREDOC', 'T_EXECUTE_STRING',
+]])
+
+castTokenNums = set([token_num(name) for name in [
+    'T_ARRAY_CAST', 'T_BOOL_CAST', 'T_DOUBLE_CAST', 'T_INT_CAST', 'T_OBJECT_CAST', 'T_STRING_CAST', 'T_UNSET_CAST',
+]])
+
+castTypes = [
+    'array', 'bool', 'boolean', 'real', 'double', 'float', 'int', 'integer', 'object', 'string', 'unset', 'binary'
+]
+
+# keywords that are called like functions
+calleeKeywords = ['isset', 'empty', 'unset', 'eval', 'exit', 'die']
+
+# operators binding to the following operand, and those binding to the whole following expression
+unaryOperators = ['!', '-', '+', '~', '@', '&', '.', '++', '--', 'clone']
+wordOperators = ['print', 'include', 'include_once', 'require', 'require_once', 'yield', 'throw']
+
+binaryOperators = set([
+    '+', '-', '*', '/', '%', '.', '&', '|', '^', '<', '>', '<<', '>>', '&&', '||', '==', '===', '!=', '!==',
+    '<>', '<=', '>=', 'and', 'or', 'xor', 'instanceof', '?',
+])
+
+assignmentOperators = set([
+    '=', '+=', '-=', '*=', '/=', '.=', '%=', '&=', '|=', '^=', '<<=', '>>=',
+])
+
+controlKeywords = ['if', 'elseif', 'while', 'for', 'foreach', 'switch', 'catch', 'declare']
+bodyKeywords    = ['else', 'try', 'finally', 'do']
+modifiers       = ['abstract', 'final', 'public', 'protected', 'private', 'var', 'static', 'readonly']
+prefixKeywords  = ['echo', 'global', 'const', 'break', 'continue', 'goto']
+classKeywords   = ['class', 'interface', 'trait']
+skippedTexts    = [';', '}', ':', 'endif', 'endwhile', 'endfor', 'endforeach', 'endswitch', 'enddeclare']
+
+def parse_php_syntax(tokens):
+    kinds = tokens.get_kinds()
+    texts = tokens.get_texts()
+
+    statements = []
+    position = 0
+    while position < len(kinds):
+        statement, position = __parse_statement(kinds, texts, position)
+        if statement != None:
+            statements.append(statement)
+
+    return SyntaxTree(statements, len(kinds))
+
+def parse_php_syntax_statement(tokens, tokenIndex):
+    # the statement beginning at the token, e.g. to reparse a block for SyntaxTree.replace_node
+    statement, position = __parse_statement(tokens.get_kinds(), tokens.get_texts(), tokenIndex)
+    return statement
+
+### STATEMENTS
+
+def __parse_statement(kinds, texts, position):
+    count = len(kinds)
+    text  = texts[position]
+    kind  = kinds[position]
+    begin = position
+
+    if text == '{':
+        statements = []
+        position += 1
+        while position < count and texts[position] != '}':
+            statement, position = __parse_statement(kinds, texts, position)
+            if statement != None:
+                statements.append(statement)
+        end, position = __close(texts, position, '}')
+        return (BlockStatement(begin, end, statements), position)
+
+    if text in skippedTexts or kind in [T_CLOSE_TAG, T_PHP_START, T_INLINE_HTML, T_DOC_COMMENT, T_COMMENT]:
+        return (None, position+1)
+
+    if text == 'return':
+        expression, position = __parse_expression(kinds, texts, position+1)
+        return __end_statement(ReturnStatement(begin, begin, expression), expression, kinds, texts, position)
+
+    if text in ['case', 'default'] and (text == 'case' or __text_at(texts, position+1) == ':'):
+        conditions = []
+        if text == 'case':
+            conditions, position = __parse_expressions(kinds, texts, position+1, ':')
+        else:
+            position += 1
+        end, position = __close(texts, position, ':')
+        return (ControlStatement(begin, end, conditions, None), position)
+
+    if text in controlKeywords or text in bodyKeywords:
+        conditions = []
+        end = begin
+        position += 1
+        if text in controlKeywords and __text_at(texts, position) == '(':
+            conditions, position = __parse_expressions(kinds, texts, position+1, ')')
+            end, position = __close(texts, position, ')')
+        body = None
+        if __text_at(texts, position) == ';':
+            end = position
+            position += 1
+        elif __text_at(texts, position) not in [':', None]: # the statements of 'if (...): endif;' are siblings
+            body, position = __parse_statement(kinds, texts, position)
+            if body != None:
+                end = body.end
+        return (ControlStatement(begin, end, conditions, body), position)
+
+    while text in modifiers and (text != 'static' or __text_at(texts, position+1) not in ['::', '(', 'function', 'fn']):
+        position += 1
+        text = __text_at(texts, position)
+
+    if text in classKeywords or text in ['namespace', 'use'] or (
+        text == 'function' and __text_at(texts, position+1) not in ['(', '&', None]
+    ) or (
+        text == 'function' and __text_at(texts, position+1) == '&' and __text_at(texts, position+2) != '('
+    ):
+        while position < count and texts[position] not in ['{', ';']:
+            position += 1
+        body = None
+        if position < count and texts[position] == '{':
+            body, position = __parse_statement(kinds, texts, position)
+            if text == 'use':
+                body = None # trait-adaptions
+        elif position < count:
+            position += 1
+        return (DeclarationStatement(begin, position-1, body), position)
+
+    if text in prefixKeywords:
+        position += 1
+
+    expressions, position = __parse_expressions(kinds, texts, position, ';')
+    if len(expressions) == 0 and position == begin:
+        return (None, position+1)
+    return __end_statement(ExpressionStatement(begin, max(begin, position-1), expressions), None, kinds, texts, position)
+
+def __end_statement(statement, expression, kinds, texts, position):
+    # the statement ends at its ';' if there is one, at its last expression otherwise
+    semicolonPosition = __skip_comments(kinds, position)
+    if __text_at(texts, semicolonPosition) == ';':
+        statement.end = semicolonPosition
+        position = semicolonPosition + 1
+    elif expression != None:
+        statement.end = expression.end
+    return (statement, position)
+
+### EXPRESSIONS
+
+def __parse_expressions(kinds, texts, position, closeText):
+    # expressions until 'closeText', 'position' will be on the closing token (or where parsing stopped)
+    count = len(kinds)
+    expressions = []
+    separators = [',', '=>', 'as', ':', ';', '...']
+    if closeText == ';':
+        separators = [',']
+    while position < count:
+        text = texts[position]
+        if text == closeText:
+            break
+        if text in separators or kinds[position] in commentTokenNums:
+            position += 1
+            continue
+        expression, position = __parse_expression(kinds, texts, position)
+        if expression != None:
+            expressions.append(expression)
+        elif text in ['{', '}', ';'] or kinds[position] == T_CLOSE_TAG:
+            break # unbalanced, leave the rest to the statements
+        else:
+            position += 1
+    return (expressions, position)
+
+def __parse_expression(kinds, texts, position):
+    operand, position = __parse_assignable(kinds, texts, position)
+    if operand == None:
+        return (None, position)
+
+    operands = [operand]
+    end = operand.end
+    openTernaries = 0
+    while position < len(kinds):
+        operatorPosition = __skip_comments(kinds, position)
+        text = __text_at(texts, operatorPosition)
+        if text == ':' and openTernaries > 0:
+            openTernaries -= 1
+        elif text not in binaryOperators:
+            break
+        position = operatorPosition
+        if text == '?':
+            if __text_at(texts, position+1) in ['?', ':']: # ?? and ?:
+                position += 1
+            else:
+                openTernaries += 1
+        while __text_at(texts, position+1) in binaryOperators and texts[position+1] not in unaryOperators + ['?']:
+            position += 1 # operators lexed as multiple tokens (<=>, **)
+        end = position
+        operand, position = __parse_assignable(kinds, texts, position+1)
+        if operand == None:
+            break
+        operands.append(operand)
+        end = operand.end
+
+    if len(operands) == 1 and end == operands[0].end:
+        return (operands[0], position)
+    return (Operation(operands[0].begin, end, operands), position)
+
+def __parse_assignable(kinds, texts, position):
+    operand, position = __parse_operand(kinds, texts, position)
+    operatorIndex = __skip_comments(kinds, position)
+    if operand != None and __text_at(texts, operatorIndex) in assignmentOperators:
+        value, position = __parse_expression(kinds, texts, operatorIndex+1)
+        end = operatorIndex
+        if value != None:
+            end = value.end
+        operand = Assignment(operand.begin, end, operand, operatorIndex, value)
+    return (operand, position)
+
+def __parse_operand(kinds, texts, position):
+    count = len(kinds)
+    unparsedPosition = position
+    position = __skip_comments(kinds, position)
+    if position >= count:
+        return (None, unparsedPosition)
+    text  = texts[position]
+    kind  = kinds[position]
+    begin = position
+    node  = None
+
+    if kind == T_VARIABLE:
+        node = Variable(begin, begin)
+        position += 1
+
+    elif text == 'function' or (text == 'fn' and __text_at(texts, position+1) == '(') or (
+        kind == T_STATIC and __text_at(texts, position+1) in ['function', 'fn']
+    ):
+        node, position = __parse_closure(kinds, texts, position)
+
+    elif text == 'new':
+        node, position = __parse_new(kinds, texts, position)
+
+    elif text in ['array', 'list'] and __text_at(texts, position+1) == '(':
+        elements, position = __parse_expressions(kinds, texts, position+2, ')')
+        end, position = __close(texts, position, ')')
+        node = ArrayLiteral(begin, end, elements)
+
+    elif text == '[':
+        elements, position = __parse_expressions(kinds, texts, position+1, ']')
+        end, position = __close(texts, position, ']')
+        node = ArrayLiteral(begin, end, elements)
+
+    elif kind in nameTokenNums or (text in calleeKeywords and __text_at(texts, position+1) == '('):
+        node = Name(begin, begin)
+        position += 1
+
+    elif kind == T_NS_SEPERATOR and position+1 < count and kinds[position+1] == T_STRING:
+        node = Name(begin, begin+1)
+        position += 2
+
+    elif kind in literalTokenNums:
+        node = Literal(begin, begin)
+        position += 1
+
+    elif kind in castTokenNums or text in unaryOperators or (
+        text == '(' and __text_at(texts, position+1) in castTypes and __text_at(texts, position+2) == ')'
+    ):
+        if text == '(':
+            position += 2
+        operand, position = __parse_operand(kinds, texts, position+1)
+        if operand == None:
+            node = Operation(begin, position-1, [])
+        else:
+            node = Operation(begin, operand.end, [operand])
+
+    elif text in wordOperators:
+        operand, position = __parse_expression(kinds, texts, position+1)
+        if operand == None:
+            node = Operation(begin, begin, [])
+        else:
+            node = Operation(begin, operand.end, [operand])
+
+    elif text == '(':
+        expression, position = __parse_expression(kinds, texts, position+1)
+        position = __skip_comments(kinds, position)
+        if __text_at(texts, position) == ')':
+            node = Parenthesis(begin, position, expression)
+            position += 1
+        elif expression != None:
+            node = Parenthesis(begin, expression.end, expression)
+        else:
+            node = Parenthesis(begin, begin, None)
+
+    elif text == '$' and __text_at(texts, position+1) != None: # variable variables ($$foo, ${'foo'})
+        operand, position = __parse_operand(kinds, texts, position+1)
+        if operand != None:
+            node = Operation(begin, operand.end, [operand])
+
+    if node == None:
+        return (None, unparsedPosition)
+
+    return __parse_postfix(kinds, texts, node, position)
+
+def __parse_postfix(kinds, texts, node, position):
+    # (comments in front of an operator belong to it, e.g. "$foo // comment\n->bar()")
+    count = len(kinds)
+    while position < count:
+        operatorPosition = __skip_comments(kinds, position)
+        text = __text_at(texts, operatorPosition)
+        if text not in ['(', '[', '->', '::', '?', '++', '--'] or (text == '?' and __text_at(texts, operatorPosition+1) != '->'):
+            break
+        position = operatorPosition
+
+        if text == '(':
+            arguments, position = __parse_expressions(kinds, texts, position+1, ')')
+            end, position = __close(texts, position, ')')
+            node = Call(node.begin, end, node, arguments)
+
+        elif text == '[':
+            index, position = __parse_expression(kinds, texts, position+1)
+            while position < count and texts[position] not in [']', ';', '{', '}']:
+                position += 1
+            end, position = __close(texts, position, ']')
+            node = ArrayAccess(node.begin, end, node, index)
+
+        elif text in ['->', '::'] or (text == '?' and __text_at(texts, position+1) == '->'):
+            if text == '?':
+                position += 1
+            operatorIndex = position
+            nameIndex = None
+            namePosition = __skip_comments(kinds, position+1)
+            nameText = __text_at(texts, namePosition)
+            if nameText != None and (nameText[0].isalpha() or nameText[0] == '_' or kinds[namePosition] == T_VARIABLE):
+                nameIndex = namePosition
+            end = operatorIndex
+            if nameIndex != None:
+                end = nameIndex
+            node = MemberAccess(node.begin, end, node, operatorIndex, nameIndex)
+            position = end+1
+
+        elif text in ['++', '--']:
+            node = Operation(node.begin, position, [node])
+            position += 1
+
+        else:
+            break
+
+    return (node, position)
+
+def __parse_closure(kinds, texts, position):
+    count = len(kinds)
+    begin = position
+    while position < count and texts[position] not in ['{', '=>', ';']:
+        if texts[position] == '(':
+            position = __skip_parenthesis(texts, position)
+        else:
+            position += 1
+    body = None
+    if __text_at(texts, position) == '{':
+        body, position = __parse_statement(kinds, texts, position)
+    elif __text_at(texts, position) == '=>':
+        body, position = __parse_expression(kinds, texts, position+1)
+        if body == None:
+            return (Closure(begin, position-1, None), position)
+    else:
+        return (Closure(begin, position-1, None), position)
+    return (Closure(begin, body.end, body), position)
+
+def __parse_new(kinds, texts, position):
+    count = len(kinds)
+    begin = position
+    position += 1
+    className = None
+    arguments = []
+
+    if __text_at(texts, position) == 'class': # anonymous class
+        position += 1
+        if __text_at(texts, position) == '(':
+            arguments, position = __parse_expressions(kinds, texts, position+1, ')')
+        while position < count and texts[position] not in ['{', ';']:
+            position += 1
+        if __text_at(texts, position) == '{':
+            body, position = __parse_statement(kinds, texts, position)
+        return (New(begin, position-1, None, arguments), position)
+
+    if position < count and kinds[position] in nameTokenNums:
+        className = Name(position, position)
+        position += 1
+    elif position+1 < count and kinds[position] == T_NS_SEPERATOR and kinds[position+1] == T_STRING:
+        className = Name(position, position+1)
+        position += 2
+    elif position < count and kinds[position] == T_VARIABLE:
+        className = Variable(position, position)
+        position += 1
+    elif __text_at(texts, position) == '(': # new (expression)
+        className, position = __parse_operand(kinds, texts, position)
+
+    end = position-1
+    if __text_at(texts, position) == '(':
+        arguments, position = __parse_expressions(kinds, texts, position+1, ')')
+        end, position = __close(texts, position, ')')
+
+    return (New(begin, end, className, arguments), position)
+
+### HELPER
+
+def __close(texts, position, closeText):
+    # (index of the closing token, position behind it); unclosed nodes end at the token in front of 'position'
+    if __text_at(texts, position) == closeText:
+        return (position, position+1)
+    return (position-1, position)
+
+def __skip_parenthesis(texts, position):
+    # position after the parenthesis opened at 'position'
+    level = 0
+    while position < len(texts):
+        if texts[position] == '(':
+            level += 1
+        elif texts[position] == ')':
+            level -= 1
+            if level <= 0:
+                return position+1
+        elif texts[position] in ['{', '}', ';']:
+            return position # unbalanced
+        position += 1
+    return position
+
+def __skip_comments(kinds, position):
+    # the position of the next token that is no comment
+    while position < len(kinds) and kinds[position] in commentTokenNums:
+        position += 1
+    return position
+
+def __text_at(texts, position):
+    if position < len(texts):
+        return texts[position]
+    return None
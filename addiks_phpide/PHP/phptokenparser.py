@@ -18,7 +18,14 @@ from .phplexer import token_get_all
 from .phplexer import token_name
 from .phplexer import token_num
 from .phplexer import keywords
+from .Declarations import ClassDecl
+from .Declarations import MethodDecl
+from .Declarations import FunctionDecl
+from .Declarations import PositionedClassDecl
+from .Declarations import PositionedMethodDecl
+from .Declarations import PositionedFunctionDecl
 import operator
+import itertools
 
 T_PHP_START   = token_num('T_PHP_START')
 T_STRING      = token_num('T_STRING')
@@ -28,7 +35,26 @@ T_COMMENT     = token_num('T_COMMENT')
 T_FINAL       = token_num('T_FINAL')
 T_ABSTRACT    = token_num('T_ABSTRACT')
 
-def parse_php_tokens(tokens):
+# names that are no uses of a class, constant or function in certain positions, whichever way the lexer
+# tokenized them (e.g. "( int )", "(INT)", "__class__" or scalar type-hints), see __is_non_use
+castNames = frozenset([
+    'int', 'integer', 'float', 'double', 'real', 'bool', 'boolean', 'string', 'binary', 'unset', 'array', 'object',
+])
+magicConstantNames = frozenset([
+    '__class__', '__dir__', '__file__', '__function__', '__line__', '__method__', '__namespace__', '__trait__',
+])
+scalarTypeHintNames = frozenset([
+    'int', 'float', 'bool', 'string', 'void', 'iterable', 'object', 'mixed', 'callable', 'array', 'null', 'false',
+])
+
+def parse_php_tokens(tokens, singlePass=False):
+    # singlePass: build the blocks while walking the tokens once instead of matching all blocks against
+    # all classes/functions/variables/uses (same result, but linear instead of quadratic)
+
+    if singlePass:
+        result = __parse_blocks_single_pass(tokens) # (None for unbalanced braces)
+        if result != None:
+            return result
 
     blocks, classes, classconstants, variables, constants, functions, namespace, use_statements, use_statement_index, uses, traitUses = __find_blocks_classes_functions(tokens)
 
@@ -49,7 +75,147 @@ def parse_php_tokens(tokens):
     blocks  = __enrich_methods(blocks, tokens)
     blocks  = __assign_uses_to_blocks(blocks, uses)
 
-    return (blocks, namespace, use_statements, use_statement_index, constants)
+    return (__declarations_by_blocks(blocks), namespace, use_statements, use_statement_index, constants)
+
+
+def __declarations_by_blocks(blocks):
+    declarations = []
+    for block in blocks:
+        if block[2] == 'class':
+            declaration = ClassDecl(*(block[0:2] + block[3:10] + block[12:13]))
+            declaration.members   = block[10]
+            declaration.constants = block[11]
+            declaration.traits    = block[13]
+            declaration.uses      = block[14]
+        elif block[2] == 'method':
+            declaration = MethodDecl(*(block[0:2] + block[3:]))
+        else:
+            declaration = FunctionDecl(*(block[0:2] + block[3:]))
+        declarations.append(declaration)
+    return declarations
+
+
+def parse_php_declarations(tokens):
+    # Extracts only the declarations (namespace, use-statements, classes with their members, constants
+    # and traits, methods, functions and defines) from any iterable of tokens (e.g. token_iterate).
+    # Only a small window of recent tokens is kept in memory, so positions are returned as
+    # line/column instead of token-indices.
+
+    declarations = []
+    namespace = '\\'
+    use_statements = {}
+    constants = []
+
+    lookahead   = 3
+    window      = [] # the most recent tokens, window[0] is the token #windowBegin
+    windowBegin = 0
+    blockStack  = [] # the declaration (or None for other blocks) of every open '{'
+    pending     = [] # [blockType, keyword-token-index] of classes/functions still waiting for their block
+    hasDeclarations = False
+
+    endOfTokens = [[None, None, 0, 0]] * lookahead
+    for token in itertools.chain(tokens, endOfTokens):
+        window.append(token)
+        tokenIndex = len(window) - 1 - lookahead
+        if tokenIndex < 0:
+            continue
+        token = window[tokenIndex]
+
+        if token[1] == 'namespace':
+            if window[tokenIndex+1][0] == T_STRING:
+                namespace = window[tokenIndex+1][1]
+
+        if token[1] == 'use':
+            if len(blockStack) <= 0: # use-statement
+                if window[tokenIndex+1][0] == T_STRING:
+                    use_statement = window[tokenIndex+1][1]
+                    if use_statement[-1] != '\\':
+                        use_statement = '\\' + use_statement
+                    use_parts = use_statement.split("\\")
+                    if window[tokenIndex+2][1] == 'as' and window[tokenIndex+3][0] == T_STRING:
+                        use_alias = window[tokenIndex+3][1]
+                    else:
+                        use_alias = use_parts[-1]
+                    use_statements[use_alias] = use_statement
+
+            elif window[tokenIndex+1][0] == T_STRING: # trait-usage
+                for declaration in blockStack:
+                    if declaration != None and declaration.blockType == 'class':
+                        declaration.traits.append(window[tokenIndex+1][1])
+
+        if token[1] in ['class', 'interface', 'trait']:
+            if window[tokenIndex-1][0] in [T_PHP_START, T_COMMENT, T_DOC_COMMENT, T_FINAL, T_ABSTRACT] or window[tokenIndex-1][1] in [';']:
+                pending.append(['class', windowBegin + tokenIndex])
+                hasDeclarations = True
+
+        if token[1] == 'function':
+            pending.append(['function', windowBegin + tokenIndex])
+            hasDeclarations = True
+
+        if token[1] == 'const':
+            constantDocComment = ""
+            if window[tokenIndex-1][0] == T_DOC_COMMENT:
+                constantDocComment = window[tokenIndex-1][1]
+            for declaration in blockStack:
+                if declaration != None and declaration.blockType == 'class':
+                    declaration.constants.append([
+                        window[tokenIndex+1][1], # name
+                        window[tokenIndex+3][1], # value
+                        token[2],
+                        token[3],
+                        constantDocComment
+                    ])
+
+        if token[0] == T_VARIABLE and window[tokenIndex-1][1] in ['var', 'protected', 'public', 'private', 'static', 'abstract']:
+            blockTypes = [declaration.blockType for declaration in blockStack if declaration != None]
+            isInMethodHead = len(pending) > 0 and pending[-1][0] == 'function'
+            if 'class' in blockTypes and 'method' not in blockTypes and not isInMethodHead:
+                keywords, docComment = parse_member_modifiers(window, tokenIndex)
+                for declaration in blockStack:
+                    if declaration != None and declaration.blockType == 'class':
+                        declaration.members.append([token[1], token[2], token[3], keywords, docComment])
+
+        if token[1] == 'define':
+            constants.append([window[tokenIndex+2][1], token[2], token[3]])
+
+        if (token[1] == ";" and hasDeclarations) or token[1] == "{":
+            declaration = None
+            if len(pending) > 0:
+                blockType, keywordIndex = pending.pop(0)
+                declaration = __declaration_from_window(window, keywordIndex - windowBegin, blockType, blockStack)
+                declarations.append(declaration)
+            if token[1] == "{":
+                blockStack.append(declaration)
+
+        if token[1] == '}':
+            if len(blockStack) == 0:
+                raise Exception("Invalid '}' (in '"+str(token[2])+'|'+str(token[3])+"'#"+str(windowBegin + tokenIndex)+")")
+            blockStack.pop()
+
+        if len(window) > 256:
+            # forget tokens that no declaration can look back to anymore
+            keepIndex = tokenIndex
+            if len(pending) > 0:
+                keepIndex = min(keepIndex, pending[0][1] - windowBegin)
+            keepIndex = max(0, keepIndex - 8)
+            del window[0:keepIndex]
+            windowBegin += keepIndex
+
+    return (declarations, namespace, use_statements, constants)
+
+
+def __declaration_from_window(window, tokenIndex, blockType, blockStack):
+    if blockType == 'class':
+        tokenIndex, className, parentClass, interfaces, isAbstract, isFinal, classType, docComment = __enrich_class(window, tokenIndex)
+        return PositionedClassDecl(window[tokenIndex][2], window[tokenIndex][3], className, parentClass, interfaces, isAbstract, isFinal, classType, docComment)
+
+    elif len(blockStack) > 0 and blockStack[-1] != None and blockStack[-1].blockType == 'class':
+        tokenIndex, methodName, keywords, docComment, arguments = __enrich_method(window, tokenIndex)
+        return PositionedMethodDecl(window[tokenIndex][2], window[tokenIndex][3], blockStack[-1].name, methodName, keywords, docComment, arguments)
+
+    else:
+        tokenIndex, functionName, docComment, arguments = __enrich_function(window, tokenIndex)
+        return PositionedFunctionDecl(window[tokenIndex][2], window[tokenIndex][3], functionName, docComment, arguments)
 
 
 def __find_blocks_classes_functions(tokens):
@@ -79,16 +245,7 @@ def __find_blocks_classes_functions(tokens):
 
         if token[1] == 'use':
             if len(blockStack) <= 0: # use-statement
-                if tokens[tokenIndex+1][0] == T_STRING:
-                    use_statement = tokens[tokenIndex+1][1]
-                    if use_statement[-1] != '\\':
-                        use_statement = '\\' + use_statement
-                    use_parts = use_statement.split("\\")
-                    if tokens[tokenIndex+2][1] == 'as' and tokens[tokenIndex+3][0] == T_STRING:
-                        use_alias = tokens[tokenIndex+3][1]
-                    else:
-                        use_alias = use_parts[-1]
-                    use_statements[use_alias] = use_statement
+                if __parse_use_statement(tokens, tokenIndex, use_statements):
                     use_statement_index = tokenIndex+2;
 
             else: # trait-usage
@@ -98,9 +255,8 @@ def __find_blocks_classes_functions(tokens):
                         tokens[tokenIndex+1][1]
                     ])
 
-        if token[1] in ['class', 'interface', 'trait']:
-            if tokens[tokenIndex-1][0] in [T_PHP_START, T_COMMENT, T_DOC_COMMENT, T_FINAL, T_ABSTRACT] or tokens[tokenIndex-1][1] in [';']:
-                classes.append(tokenIndex)
+        if __is_class_keyword(tokens, tokenIndex):
+            classes.append(tokenIndex)
 
         if token[1] == 'function':
             functions.append(tokenIndex)
@@ -125,35 +281,332 @@ def __find_blocks_classes_functions(tokens):
             beginIndex = blockStack.pop()
             blocks.append([beginIndex, tokenIndex])
 
-        if token[0] == T_STRING and token[1] not in keywords and token[1] != "namespace" and tokens[tokenIndex-1][1] != "namespace":
-            isOnClass = (tokens[tokenIndex-1][1] in ['->', '::'])
-            isRoutine = (tokens[tokenIndex+1][1] == '(')
-            isType = (tokens[tokenIndex+1][0] == T_VARIABLE) or tokens[tokenIndex-1][1] in ['use', 'extends', 'implements', 'new', 'instanceof']
+        use = __use_by_token(tokens, tokenIndex, use_statements)
+        if use != None:
+            uses.append(use)
+        tokenIndex += 1
 
-            typeRef = "unknown"
-            if isOnClass:
-                if isRoutine:
-                    typeRef = "method"
-                else:
-                    typeRef = "member"
+    return blocks, classes, classconstants, variables, constants, functions, namespace, use_statements, use_statement_index, uses, traitUses
+
+
+def __parse_use_statement(tokens, tokenIndex, use_statements):
+    # tokenIndex points to the use-keyword (outside of any block), returns True if a use-statement was found
+    if tokens[tokenIndex+1][0] != T_STRING:
+        return False
+    use_statement = tokens[tokenIndex+1][1]
+    if use_statement[-1] != '\\':
+        use_statement = '\\' + use_statement
+    use_parts = use_statement.split("\\")
+    if tokens[tokenIndex+2][1] == 'as' and tokens[tokenIndex+3][0] == T_STRING:
+        use_alias = tokens[tokenIndex+3][1]
+    else:
+        use_alias = use_parts[-1]
+    use_statements[use_alias] = use_statement
+    return True
+
+
+def __is_class_keyword(tokens, tokenIndex):
+    # class, interface or trait declaration (not "Foo::class" or "new class")
+    if tokens[tokenIndex][1] in ['class', 'interface', 'trait']:
+        if tokens[tokenIndex-1][0] in [T_PHP_START, T_COMMENT, T_DOC_COMMENT, T_FINAL, T_ABSTRACT] or tokens[tokenIndex-1][1] in [';']:
+            return True
+    return False
+
+
+def __is_non_use(tokens, tokenIndex, use_statements):
+    # a cast, magic constant or scalar type-hint tokenized as a name, never one reached through 'new',
+    # 'instanceof', '::' or a call and no type-hint that is the alias of a use-statement
+    name = tokens[tokenIndex][1].lower()
+    if tokens[tokenIndex-1][1] in ['new', 'instanceof', 'use'] or tokens[tokenIndex+1][1] in ['(', '::']:
+        return False
+
+    if name in castNames and tokens[tokenIndex-1][1] == '(' and tokens[tokenIndex+1][1] == ')':
+        # "( int )", not the argument of a call "foo(INT)"
+        return tokens[tokenIndex-2][0] not in [T_STRING, T_VARIABLE] and tokens[tokenIndex-2][1] not in [')', ']']
+
+    if name in magicConstantNames:
+        return True
+
+    if name in scalarTypeHintNames:
+        isArgumentHint = tokens[tokenIndex+1][0] == T_VARIABLE or tokens[tokenIndex+1][1] in ['&', '...']
+        isReturnHint = tokens[tokenIndex-1][1] == ':' and tokens[tokenIndex-2][1] == ')'
+        isNullableHint = tokens[tokenIndex-1][1] == '?' and tokens[tokenIndex-2][1] in ['(', ',', ':']
+        if isArgumentHint or isReturnHint or isNullableHint:
+            return name not in [alias.lower() for alias in use_statements]
+
+    return False
+
+
+def __use_by_token(tokens, tokenIndex, use_statements):
+    # [tokenIndex, line, column, name, typeRef] if the token uses a class, function, constant, method or member
+    token = tokens[tokenIndex]
+    if token[0] == T_STRING and token[1] not in keywords and token[1] != "namespace" and tokens[tokenIndex-1][1] != "namespace":
+        isOnClass = (tokens[tokenIndex-1][1] in ['->', '::'])
+        isRoutine = (tokens[tokenIndex+1][1] == '(')
+        isType = (tokens[tokenIndex+1][0] == T_VARIABLE) or tokens[tokenIndex-1][1] in ['use', 'extends', 'implements', 'new', 'instanceof']
+
+        typeRef = "unknown"
+        if isOnClass:
+            if isRoutine:
+                typeRef = "method"
+            else:
+                typeRef = "member"
+        else:
+            if isRoutine:
+                typeRef = "function"
+            elif isType:
+                typeRef = "class"
             else:
-                if isRoutine:
-                    typeRef = "function"
-                elif isType:
-                    typeRef = "class"
+                typeRef = "constant"
+
+        tokenText = token[1]
+        if typeRef == "class" and '\\' in tokenText:
+            tokenText = tokenText.split('\\')
+            tokenText = tokenText[-1]
+
+        if not isOnClass and __is_non_use(tokens, tokenIndex, use_statements):
+            return None
+
+        if tokens[-2][1] not in ['$this', 'self'] and tokenText not in ['true', 'false', 'null']:
+            return [tokenIndex, token[2], token[3], tokenText, typeRef]
+    return None
+
+
+def __parse_blocks_single_pass(tokens, beginIndex=0, endIndex=None, outerBlock=None, outerUseStatements=None):
+    # Builds the same blocks as the multi-pass parser while walking the tokens once: a block ('{', or ';' for
+    # abstract methods) belongs to the oldest class-keyword still waiting for one, otherwise to the oldest
+    # waiting function-keyword. Returns None for unbalanced braces, that is left to the multi-pass parser.
+    # With an 'outerBlock' only the tokens [beginIndex:endIndex] of its body get parsed (see reparse_php_block),
+    # 'outerUseStatements' are the use-statements of the file in front of it.
+
+    if endIndex == None:
+        endIndex = len(tokens)
+
+    blocks = []
+    blockStack = []       # the declaration (or None for other blocks) of every open '{'
+    if outerBlock != None:
+        blockStack.append(outerBlock)
+    pendingClasses = []   # class-keyword-indexes still waiting for their block
+    pendingFunctions = [] # [function-keyword-index, uses] still waiting for their block
+    constants = []
+    namespace = '\\'
+    use_statements = {}
+    if outerUseStatements != None:
+        use_statements.update(outerUseStatements)
+    use_statement_index = None
+
+    for tokenIndex in range(beginIndex, endIndex):
+        token = tokens[tokenIndex]
+
+        if token[1] == 'namespace':
+            if tokens[tokenIndex+1][0] == T_STRING:
+                namespace = tokens[tokenIndex+1][1]
+                if use_statement_index == None:
+                    use_statement_index = tokenIndex+2;
+
+        if token[1] == 'use':
+            if len(blockStack) <= 0: # use-statement
+                if __parse_use_statement(tokens, tokenIndex, use_statements):
+                    use_statement_index = tokenIndex+2;
+
+            elif tokens[tokenIndex+1][0] == T_STRING: # trait-usage
+                for block in blockStack:
+                    if block != None and block.blockType == 'class':
+                        block.traits.append(tokens[tokenIndex+1][1])
+
+        if __is_class_keyword(tokens, tokenIndex):
+            pendingClasses.append(tokenIndex)
+
+        if token[1] == 'function':
+            pendingFunctions.append([tokenIndex, []])
+
+        if token[1] == 'const':
+            for block in blockStack:
+                if block != None and block.blockType == 'class':
+                    block.constants.append(tokenIndex)
+
+        if token[0] == T_VARIABLE and tokens[tokenIndex-1][1] in ['var', 'protected', 'public', 'private', 'static', 'abstract']:
+            isInClass  = False
+            isInMethod = False
+            for block in blockStack:
+                if block != None and block.blockType == 'class':
+                    isInClass  = True
+                    isInMethod = False
+                if block != None and block.blockType == 'method' and isInClass:
+                    isInMethod = True
+            if len(pendingFunctions) > 0 and len(blockStack) > 0 and blockStack[-1] != None and blockStack[-1].blockType == 'class':
+                isInMethod = True # in the head of a method
+            if isInClass and not isInMethod:
+                for block in blockStack:
+                    if block != None and block.blockType == 'class':
+                        block.members.append(tokenIndex)
+
+        if token[1] == 'define':
+            constants.append(tokenIndex)
+
+        if (token[1] == ";" and len(blocks) + len(pendingClasses) + len(pendingFunctions) > 0) or token[1] == "{":
+            block = None
+            if len(pendingClasses) > 0:
+                block = ClassDecl(tokenIndex, tokenIndex, *__enrich_class(tokens, pendingClasses.pop(0)))
+                blocks.append(block)
+
+            elif len(pendingFunctions) > 0:
+                functionIndex, uses = pendingFunctions.pop(0)
+                parentBlock = None
+                if len(blockStack) > 0:
+                    parentBlock = blockStack[-1]
+                if parentBlock != None and parentBlock.blockType == 'class':
+                    nameIndex, methodName, keywords, docComment, arguments = __enrich_method(tokens, functionIndex)
+                    block = MethodDecl(tokenIndex, tokenIndex, nameIndex, parentBlock.name, methodName, keywords, docComment, arguments, uses)
                 else:
-                    typeRef = "constant"
+                    nameIndex, functionName, docComment, arguments = __enrich_function(tokens, functionIndex)
+                    block = FunctionDecl(tokenIndex, tokenIndex, nameIndex, functionName, docComment, arguments, uses)
+                blocks.append(block)
 
-            tokenText = token[1]
-            if typeRef == "class" and '\\' in tokenText:
-                tokenText = tokenText.split('\\')
-                tokenText = tokenText[-1]
+            if token[1] == "{":
+                blockStack.append(block)
 
-            if tokens[-2][1] not in ['$this', 'self'] and tokenText not in ['true', 'false', 'null']:
-                uses.append([tokenIndex, token[2], token[3], tokenText, typeRef])
-        tokenIndex += 1
+        if token[1] == '}':
+            if len(blockStack) == 0:
+                raise Exception("Invalid '}' (in '"+str(token[2])+'|'+str(token[3])+"'#"+str(tokenIndex)+")")
+            block = blockStack.pop()
+            if block != None:
+                block.end = tokenIndex
+
+        use = __use_by_token(tokens, tokenIndex, use_statements)
+        if use != None:
+            use = use[1:]
+            for block in blockStack:
+                if block != None:
+                    block.uses.append(use)
+            for functionIndex, uses in pendingFunctions:
+                if tokenIndex > functionIndex + 1:
+                    uses.append(use)
+
+    if outerBlock != None:
+        if blockStack != [outerBlock] or len(pendingClasses) + len(pendingFunctions) > 0:
+            return None
+
+    elif len(blockStack) > 0:
+        return None
+
+    return (blocks, namespace, use_statements, use_statement_index, constants)
 
-    return blocks, classes, classconstants, variables, constants, functions, namespace, use_statements, use_statement_index, uses, traitUses
+
+def is_reparsable_block(tokens, block):
+    # True if the body of the function/method-block only contributes to the block itself (and to the uses of
+    # the surrounding blocks), so that reparse_php_block can handle changes in it
+    return block.blockType in ['function', 'method'] and block.begin < block.end and __is_self_contained(tokens, block.begin+1, block.end)
+
+
+def reparse_php_block(tokens, parsed, block, tokenDelta, oldEndPosition):
+    # Updates the result of parse_php_tokens after an edit that only changed tokens within the body of the
+    # given function/method-block: only that body gets parsed again, everything behind it gets shifted by
+    # 'tokenDelta' tokens. 'oldEndPosition' is the [line, column] of the '}' of the block before the edit.
+    # Returns None if the edited body does not qualify, the whole file has to be parsed again then.
+
+    blocks, namespace, use_statements, use_statement_index, constants = parsed
+    oldEnd = block.end
+    newEnd = oldEnd + tokenDelta
+
+    if newEnd <= block.begin or tokens[newEnd][1] != '}' or not __is_self_contained(tokens, block.begin+1, newEnd):
+        return None
+
+    # the head of another declaration reaching into the body (a closure as default-value, a broken head
+    # whose declaration only gets closed by a ';' within the body) would depend on the body too
+    for other in blocks:
+        if other.nameIndex != None and other.nameIndex < block.begin and other.begin > block.begin:
+            return None
+
+    beginPosition = tokens[block.begin][2:4]
+    oldUses = block.uses
+    block.uses = [use for use in oldUses if use[0:2] < beginPosition] # the uses in the head of the routine
+    headUseCount = len(block.uses)
+    block.end = newEnd
+
+    result = __parse_blocks_single_pass(tokens, block.begin+1, newEnd, block, use_statements)
+    if result == None:
+        block.uses = oldUses
+        block.end  = oldEnd
+        return None
+    nestedBlocks, nestedNamespace, nestedUseStatements, nestedUseStatementIndex, nestedConstants = result
+    bodyUses = block.uses[headUseCount:]
+
+    # an unclosed argument-list reads on into the following tokens, possibly into the body. An argument-list
+    # stops at the latest at a ')' (only the token right after a '(' in a default-value gets skipped), so only
+    # the heads behind the last such ')' in front of the body can reach into it.
+    stopIndex = block.begin
+    while stopIndex > 0 and not (tokens[stopIndex][1] == ')' and tokens[stopIndex-1][1] != '('):
+        stopIndex -= 1
+    for other in blocks:
+        if other.blockType != 'class' and other.nameIndex < block.begin and other.nameIndex+1 >= stopIndex:
+            other.arguments = __parse_arguments(tokens, other.nameIndex)
+
+    blockIndex = 0
+    while blocks[blockIndex] is not block:
+        blockIndex += 1
+    nestedEndIndex = blockIndex + 1
+    while nestedEndIndex < len(blocks) and blocks[nestedEndIndex].begin < oldEnd:
+        nestedEndIndex += 1
+    blocks[blockIndex+1:nestedEndIndex] = nestedBlocks
+
+    def shift(tokenIndex):
+        if tokenIndex != None and tokenIndex >= oldEnd:
+            tokenIndex += tokenDelta
+        return tokenIndex
+
+    otherBlocks = blocks[0:blockIndex] + blocks[blockIndex+1+len(nestedBlocks):]
+    for otherBlock in otherBlocks:
+        if otherBlock.begin < block.begin and otherBlock.end >= oldEnd: # surrounding block
+            useIndex = 0
+            while useIndex < len(otherBlock.uses) and otherBlock.uses[useIndex][0:2] < beginPosition:
+                useIndex += 1
+            useEndIndex = useIndex
+            while useEndIndex < len(otherBlock.uses) and otherBlock.uses[useEndIndex][0:2] < oldEndPosition:
+                useEndIndex += 1
+            otherBlock.uses[useIndex:useEndIndex] = bodyUses
+
+    newEndPosition = tokens[newEnd][2:4]
+    shiftedUses = set([id(use) for use in bodyUses])
+    for otherBlock in otherBlocks:
+        otherBlock.begin     = shift(otherBlock.begin)
+        otherBlock.end       = shift(otherBlock.end)
+        otherBlock.nameIndex = shift(otherBlock.nameIndex)
+        if otherBlock.blockType == 'class':
+            otherBlock.members   = [shift(tokenIndex) for tokenIndex in otherBlock.members]
+            otherBlock.constants = [shift(tokenIndex) for tokenIndex in otherBlock.constants]
+
+        for use in otherBlock.uses: # the uses are shared between the blocks, shift each of them once
+            if use[0:2] > oldEndPosition and id(use) not in shiftedUses:
+                shiftedUses.add(id(use))
+                if use[0] == oldEndPosition[0]:
+                    use[1] += newEndPosition[1] - oldEndPosition[1]
+                use[0] += newEndPosition[0] - oldEndPosition[0]
+
+    constants = [tokenIndex for tokenIndex in constants if tokenIndex < block.begin] + nestedConstants + [
+        tokenIndex + tokenDelta for tokenIndex in constants if tokenIndex > oldEnd
+    ]
+
+    return (blocks, namespace, use_statements, shift(use_statement_index), constants)
+
+
+def __is_self_contained(tokens, beginIndex, endIndex):
+    # balanced braces and nothing that would change the surrounding blocks (class-constants, traits, nested
+    # classes) or the namespace and use-statements
+    level = 0
+    for tokenIndex in range(beginIndex, endIndex):
+        text = tokens[tokenIndex][1]
+        if text == '{':
+            level += 1
+        elif text == '}':
+            level -= 1
+            if level < 0:
+                return False
+        elif text in ['namespace', 'const'] or __is_class_keyword(tokens, tokenIndex):
+            return False
+        elif text == 'use' and tokens[tokenIndex+1][0] == T_STRING:
+            return False
+    return level == 0
 
 
 def __assign_classes_to_codeblocks(blocks, classes):
@@ -216,41 +669,9 @@ def __enrich_classes_functions(blocks, tokens, members, classconstants, traitUse
         if len(block) > 2:
 
             if block[2] in ['class', 'trait']:
-                tokenIndex  = block[3]
-                classType   = tokens[tokenIndex][1]
-                tokenIndex -= 1
-                keywords = []
-                while tokens[tokenIndex][1] in ['abstract', 'final']:
-                    keywords.append(tokens[tokenIndex][0])
-                    tokenIndex -= 1
-                isAbstract = 'abstract' in keywords
-                isFinal    = 'final'    in keywords
-
-                docComment = ""
-                if tokens[tokenIndex][0] in [T_DOC_COMMENT, T_COMMENT]:
-                    docComment = tokens[tokenIndex][1]
-
-                tokenIndex  = block[3]
-                tokenIndex += 1
-                className = tokens[tokenIndex][1]
+                tokenIndex, className, parentClass, interfaces, isAbstract, isFinal, classType, docComment = __enrich_class(tokens, block[3])
                 block[3] = tokenIndex
 
-                parentClass = None
-                if tokens[tokenIndex+1][1] == 'extends':
-                    tokenIndex += 2
-                    parentClass = tokens[tokenIndex][1]
-
-                interfaces = []
-                if tokens[tokenIndex+1][1] == 'implements':
-                    tokenIndex += 2
-                    doEnd = False
-                    while not doEnd:
-                        interfaces.append(tokens[tokenIndex][1])
-                        if tokens[tokenIndex+1][1] == ',':
-                            tokenIndex += 2
-                        else:
-                            doEnd = True
-
                 thisclassMembers = []
                 for memberIndex in members:
                     if memberIndex > block[0] and memberIndex < block[1]:
@@ -278,21 +699,9 @@ def __enrich_classes_functions(blocks, tokens, members, classconstants, traitUse
                 block.append(thisclassTraits)       # 13
 
             if block[2] == 'function':
-                tokenIndex  = block[3]
-                tokenIndex += 1
-
-                functionName = None
-                if tokens[tokenIndex][0] == T_STRING:
-                    functionName = tokens[tokenIndex][1]
-
+                tokenIndex, functionName, docComment, arguments = __enrich_function(tokens, block[3])
                 block[3] = tokenIndex
 
-                docComment = ""
-                if tokens[tokenIndex-1][0] in [T_DOC_COMMENT, T_COMMENT]:
-                    docComment = tokens[tokenIndex-1][1]
-
-                arguments = __parse_arguments(tokens, tokenIndex)
-
                 block.append(functionName)  # 4
                 block.append(docComment)    # 5
                 block.append(arguments)     # 6
@@ -305,25 +714,9 @@ def __enrich_methods(blocks, tokens):
         if len(block) > 2:
 
             if block[2] == 'method':
-                tokenIndex = block[3]
-
-                keywords = []
-                tokenIndex -= 1
-                while tokens[tokenIndex][1] in ['static', 'abstract', 'final', 'public', 'protected', 'private']:
-                    keywords.append(tokens[tokenIndex][1])
-                    tokenIndex -= 1
-
-                docComment = ""
-                if tokens[tokenIndex][0] in [T_DOC_COMMENT, T_COMMENT]:
-                    docComment = tokens[tokenIndex][1]
-
-                tokenIndex = block[3]
-                tokenIndex += 1
-                methodName = tokens[tokenIndex][1]
+                tokenIndex, methodName, keywords, docComment, arguments = __enrich_method(tokens, block[3])
                 block[3] = tokenIndex
 
-                arguments = __parse_arguments(tokens, tokenIndex)
-
                 className = ""
                 for parentBlock in reversed(blocks):
                     if parentBlock[0] < block[0] and parentBlock[1] > block[1]:
@@ -338,6 +731,101 @@ def __enrich_methods(blocks, tokens):
     return blocks
 
 
+def __enrich_class(tokens, tokenIndex):
+    # tokenIndex points to the class-keyword
+    classTokenIndex = tokenIndex
+    classType   = tokens[tokenIndex][1]
+    tokenIndex -= 1
+    keywords = []
+    while tokens[tokenIndex][1] in ['abstract', 'final']:
+        keywords.append(tokens[tokenIndex][1])
+        tokenIndex -= 1
+    isAbstract = 'abstract' in keywords
+    isFinal    = 'final'    in keywords
+
+    docComment = ""
+    if tokens[tokenIndex][0] in [T_DOC_COMMENT, T_COMMENT]:
+        docComment = tokens[tokenIndex][1]
+
+    tokenIndex  = classTokenIndex
+    tokenIndex += 1
+    className = tokens[tokenIndex][1]
+    nameTokenIndex = tokenIndex
+
+    parentClass = None
+    if tokens[tokenIndex+1][1] == 'extends':
+        tokenIndex += 2
+        parentClass = tokens[tokenIndex][1]
+
+    interfaces = []
+    if tokens[tokenIndex+1][1] == 'implements':
+        tokenIndex += 2
+        doEnd = False
+        while not doEnd:
+            interfaces.append(tokens[tokenIndex][1])
+            if tokens[tokenIndex+1][1] == ',':
+                tokenIndex += 2
+            else:
+                doEnd = True
+
+    return (nameTokenIndex, className, parentClass, interfaces, isAbstract, isFinal, classType, docComment)
+
+
+def __enrich_function(tokens, tokenIndex):
+    # tokenIndex points to the function-keyword
+    tokenIndex += 1
+
+    functionName = None
+    if tokens[tokenIndex][0] == T_STRING:
+        functionName = tokens[tokenIndex][1]
+
+    docComment = ""
+    if tokens[tokenIndex-2][0] in [T_DOC_COMMENT, T_COMMENT]:
+        docComment = tokens[tokenIndex-2][1]
+
+    arguments = __parse_arguments(tokens, tokenIndex)
+
+    return (tokenIndex, functionName, docComment, arguments)
+
+
+def __enrich_method(tokens, tokenIndex):
+    # tokenIndex points to the function-keyword
+    methodTokenIndex = tokenIndex
+
+    keywords = []
+    tokenIndex -= 1
+    while tokens[tokenIndex][1] in ['static', 'abstract', 'final', 'public', 'protected', 'private']:
+        keywords.append(tokens[tokenIndex][1])
+        tokenIndex -= 1
+
+    docComment = ""
+    if tokens[tokenIndex][0] in [T_DOC_COMMENT, T_COMMENT]:
+        docComment = tokens[tokenIndex][1]
+
+    tokenIndex = methodTokenIndex
+    tokenIndex += 1
+    methodName = tokens[tokenIndex][1]
+
+    arguments = __parse_arguments(tokens, tokenIndex)
+
+    return (tokenIndex, methodName, keywords, docComment, arguments)
+
+
+def parse_member_modifiers(tokens, tokenIndex):
+    # returns the modifier-keywords and doc-comment in front of the member-variable at tokenIndex
+    keywords = []
+    tokenIndex -= 1
+    while tokens[tokenIndex][1] in ['public', 'protected', 'private', 'static']:
+        keywords.append(tokens[tokenIndex][1])
+        tokenIndex -= 1
+
+    docComment = ""
+    if tokens[tokenIndex][0] in [T_DOC_COMMENT, T_COMMENT]:
+        docComment = tokens[tokenIndex][1]
+
+    return (keywords, docComment)
+
+
 def __assign_uses_to_blocks(blocks, uses):
     # assign uses to blocks
     blockIndex = 0
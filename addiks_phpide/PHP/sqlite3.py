@@ -24,10 +24,12 @@ class Sqlite3Storage:
     def __init__(self, index_path, useWorkerThread=False):
         self._index_path = index_path
         self._insert_counter = 0
+        self._write_counter = 0
         self._is_transaction_active = False
         self._queue = queue.Queue()
         self._useWorkerThread = useWorkerThread
         self._lock = threading.Lock()
+        self._deferred_inserts = None # statement => [parameters], see add_records
 
         if useWorkerThread:
             start_new_thread(self.__initWorker, (index_path, ))
@@ -64,8 +66,16 @@ class Sqlite3Storage:
                 resultContainer.append([resultCopy, self._cursor.lastrowid])
                 self._queue.task_done()
 
-    def __query(self, statement, parameters=None):
+    def __query(self, statement, parameters=None, deferrable=True):
         result = None
+        if self._deferred_inserts != None:
+            if deferrable and statement.startswith("INSERT "):
+                if statement not in self._deferred_inserts:
+                    self._deferred_inserts[statement] = []
+                self._deferred_inserts[statement].append(parameters)
+                return [[], None]
+            elif not statement.startswith("SELECT ") and not statement.startswith("INSERT "):
+                self.__flush_deferred_inserts()
         if self._useWorkerThread:
             query = self._queue
             resultContainer = []
@@ -96,9 +106,13 @@ class Sqlite3Storage:
                 "file_path VARCHAR(512) PRIMARY KEY, "
                 "namespace VARCHAR(256) NOT NULL DEFAULT '\\', "
                 "mtime     INTEGER, "
-                "hash      VARCHAR(128) "
+                "hash      VARCHAR(128), "
+                "blob_id   VARCHAR(64) "
             ")"
         );
+        fileColumns = [row[1] for row in cursor.execute("PRAGMA table_info(files)").fetchall()]
+        if "blob_id" not in fileColumns: # (index built before the git-blob-ids were stored)
+            cursor.execute("ALTER TABLE files ADD COLUMN blob_id VARCHAR(64)")
         cursor.execute(
             "CREATE TABLE IF NOT EXISTS classes("
                 "id          INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, "
@@ -289,20 +303,54 @@ class Sqlite3Storage:
         cursor.execute(
             "CREATE INDEX IF NOT EXISTS constant_uses_file_path ON constant_uses (file_path)"
         );
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS annotations("
+                "id           INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, "
+                "file_path    VARCHAR(512) NOT NULL, "
+                "type         VARCHAR(32), "
+                "namespace    VARCHAR(256) NOT NULL DEFAULT '\\', "
+                "class_name   VARCHAR(128), "
+                "name         VARCHAR(128), "
+                "tag          VARCHAR(32), "
+                "value        SMALLTEXT"
+            ")"
+        );
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS annotations_declaration ON annotations (type, namespace, class_name, name)"
+        );
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS annotations_file_path   ON annotations (file_path)"
+        );
         #self._connection.commit()
 
     ### FILES
 
-    def add_file(self, filePath, namespace, mtime, hashValue):
+    def add_file(self, filePath, namespace, mtime, hashValue, blobId=None):
         while len(namespace)>0 and namespace[0] == '\\':
             namespace = namespace[1:]
         self.__query(
-            "INSERT INTO files (file_path, namespace, mtime, hash) "
-            "VALUES (?, ?, ?, ?)",
-            (filePath, namespace, int(mtime), hashValue, )
+            "INSERT INTO files (file_path, namespace, mtime, hash, blob_id) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (filePath, namespace, int(mtime), hashValue, blobId, )
         )
         self.__commitAfterXInserts()
 
+    def get_blob_ids(self):
+        # filePath => git-blob-id of the indexed content (None if it was not known when indexing)
+        blobIds = {}
+        result, lastrowid = self.__query("SELECT file_path, blob_id FROM files", ())
+        for filePath, blobId in result:
+            blobIds[filePath] = blobId
+        return blobIds
+
+    def set_blob_id(self, filePath, blobId):
+        self.__query("UPDATE files SET blob_id = ? WHERE file_path = ?", (blobId, filePath, ))
+        self.__commitAfterXInserts()
+
+    def set_mtime(self, filePath, mtime):
+        self.__query("UPDATE files SET mtime = ? WHERE file_path = ?", (int(mtime), filePath, ))
+        self.__commitAfterXInserts()
+
     def gethash(self, filePath):
         hashResult = None
         result, lastrowid = self.__query("SELECT hash FROM files WHERE file_path = ?", (filePath, ))
@@ -314,7 +362,7 @@ class Sqlite3Storage:
         mtimeResult = 0
         result, lastrowid = self.__query("SELECT mtime FROM files WHERE file_path = ?", (filePath, ))
         for mtime, in result:
-            break
+            mtimeResult = mtime
         return mtimeResult
 
     def get_all_files(self):
@@ -332,7 +380,8 @@ class Sqlite3Storage:
         result, lastrowid = self.__query(
             "INSERT INTO classes (file_path, namespace, name, type, parent_name, is_final, is_abstract, doccomment, line, column) "
             "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (filePath, namespace, className, classType, parentName, isFinal, isAbstract, docComment, line, column, )
+            (filePath, namespace, className, classType, parentName, isFinal, isAbstract, docComment, line, column, ),
+            False # the rows of the members, methods, ... of the class need its id
         )
         classId = lastrowid
         for interface in interfaces:
@@ -856,7 +905,7 @@ class Sqlite3Storage:
         while len(namespace)>0 and namespace[0] == '\\':
             namespace = namespace[1:]
         file_path, line, column, doccomment = (None, None, None, None, )
-        self.__query(
+        result, lastrowid = self.__query(
             "SELECT file_path, line, column, doccomment "
             "FROM functions "
             "WHERE namespace=? and name=?",
@@ -1059,9 +1108,70 @@ class Sqlite3Storage:
 
         return searchResults
 
+    ### ANNOTATIONS ###
+
+    def add_annotations(self, filePath, declarationType, namespace, className, name, annotations):
+        # the already parsed annotations (see get_annotations_by_doccomment) of a 'member', 'method' or 'function'
+        while len(namespace)>0 and namespace[0] == '\\':
+            namespace = namespace[1:]
+        for tag in ['return', 'var', 'param']:
+            for tags in annotations.get(tag, []):
+                self.__query(
+                    "INSERT INTO annotations (file_path, type, namespace, class_name, name, tag, value) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (filePath, declarationType, namespace, className, name, tag, " ".join(tags))
+                )
+                self.__commitAfterXInserts()
+
+    def get_annotations(self, declarationType, namespace, className, name):
+        while len(namespace)>0 and namespace[0] == '\\':
+            namespace = namespace[1:]
+        result, lastrowid = self.__query(
+            "SELECT tag, value "
+            "FROM annotations "
+            "WHERE type=? AND namespace=? AND class_name=? AND name=? "
+            "ORDER BY id",
+            (declarationType, namespace, className, name, )
+        )
+        annotations = {}
+        for tag, value in result:
+            if tag not in annotations:
+                annotations[tag] = []
+            annotations[tag].append(value.split(" "))
+        return annotations
+
+    ### BATCHES ###
+
+    def add_records(self, records):
+        # Writes many [storage-method-name, arguments] records (see PhpIndex) at once: the inserted rows are
+        # collected per statement and written with executemany when the batch is done (or something other than
+        # an insert or select has to happen in between). Rows keep their order, so do their ids.
+        if self._useWorkerThread:
+            for methodName, arguments in records:
+                getattr(self, methodName)(*arguments)
+            return
+        self._deferred_inserts = {}
+        try:
+            for methodName, arguments in records:
+                getattr(self, methodName)(*arguments)
+        finally:
+            self.__flush_deferred_inserts()
+            self._deferred_inserts = None
+
+    def __flush_deferred_inserts(self):
+        deferredInserts = self._deferred_inserts
+        self._deferred_inserts = {}
+        try:
+            self._lock.acquire(True)
+            for statement, parametersList in deferredInserts.items():
+                self._cursor.executemany(statement, parametersList)
+        finally:
+            self._lock.release()
+
     ### HELPERS ###
 
     def __commitAfterXInserts(self):
+        self._write_counter+=1
         self._insert_counter+=1
         if self._insert_counter >= 3000:
             self._insert_counter = 0
@@ -1071,8 +1181,14 @@ class Sqlite3Storage:
         pass
 
     def sync(self):
+        self._write_counter+=1
         self._connection.commit()
 
+    def get_generation(self):
+        # changes whenever the index got changed, 'data_version' covers the commits of other connections
+        result, lastrowid = self.__query("PRAGMA data_version")
+        return (result[0][0], self._write_counter)
+
     def removeFile(self, filePath):
         result, lastrowid = self.__query("SELECT id FROM classes WHERE file_path = ?", (filePath, ))
         for classId, in result:
@@ -1088,6 +1204,7 @@ class Sqlite3Storage:
         self.__query("DELETE FROM classes_method_uses     WHERE file_path = ?", (filePath, ))
         self.__query("DELETE FROM classes_uses            WHERE file_path = ?", (filePath, ))
         self.__query("DELETE FROM function_uses           WHERE file_path = ?", (filePath, ))
+        self.__query("DELETE FROM annotations             WHERE file_path = ?", (filePath, ))
         #self.__query("VACUUM")
         self.__commitAfterXInserts()
 
@@ -1106,6 +1223,8 @@ class Sqlite3Storage:
         self.__query("DROP TABLE IF EXISTS functions")
         self.__query("DROP TABLE IF EXISTS function_uses")
         self.__query("DROP TABLE IF EXISTS files")
+        self.__query("DROP TABLE IF EXISTS annotations")
         self.__query("VACUUM")
         self.__create_tables()
+        self._write_counter+=1
         self._connection.commit()
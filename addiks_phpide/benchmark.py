@@ -0,0 +1,388 @@
+#!/usr/bin/python
+
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-phpide
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import os
+import time
+import string
+
+from .PHP.phplexer import token_get_all, token_num
+from .PHP.phplexer import keywords, specialChars, operators, operatorsLong, directTokenMap
+from .PHP.phplexer import T_INLINE_HTML, T_SINGLE_CHAR, T_CONSTANT_ENCAPSED_STRING, T_COMMENT, T_PHP_START
+from .PHP.phplexer import T_STRING, T_VARIABLE, T_DNUMBER, T_CLOSE_TAG, T_HEREDOC, T_DOC_COMMENT
+from .PHP.phptokenparser import parse_php_tokens
+
+# small codes with the constructs the parser has to tell apart, checked in addition to the given files
+regressionCodes = [
+    ["(regression: classes)", """<?php
+namespace Acme\\Shop;
+
+use Acme\\Base\\Entity as BaseEntity;
+use Acme\\Shop\\ProductInterface;
+
+/**
+ * @Entity
+ */
+abstract class Product extends BaseEntity implements ProductInterface, \\Countable
+{
+    use PriceTrait;
+
+    const TYPE_SIMPLE = 'simple';
+
+    /** @var string */
+    protected $name;
+    private static $count = 0;
+    var $legacy;
+
+    public function __construct($name, Category $category = null, $tags = array())
+    {
+        $this->name = $name;
+        $filter = function ($tag) use ($name) {
+            return strlen($tag) > 0;
+        };
+        self::$count++;
+    }
+
+    abstract protected function doStuff($a, $b = 5);
+
+    final public static function create(): Product
+    {
+        return new static(Product::TYPE_SIMPLE);
+    }
+}
+final class Category { public $title; }
+"""],
+    ["(regression: interfaces, traits and functions)", """<?php
+interface Countable
+{
+    public function count();
+    public static function create($value = null);
+}
+trait PriceTrait
+{
+    protected $price;
+    public function getPrice() { return $this->price; }
+}
+define('ACME_VERSION', '1.0');
+function acme_helper(array $items, $separator = ', ')
+{
+    function acme_nested() { return true; }
+    if (count($items) > 0) {
+        return implode($separator, $items);
+    }
+    $x = 1; class LateClass { public $late; }
+    return acme_nested();
+}
+"""],
+    ["(regression: truncated)", """<?php
+class Broken extends Base
+{
+    public function open($a)
+    {
+        if ($a) {
+"""],
+]
+
+def generate_entity_code(propertyCount):
+    lines = [
+        "<?php",
+        "",
+        "namespace Acme\\Generated\\Entity;",
+        "",
+        "use Doctrine\\ORM\\Mapping as ORM;",
+        "",
+        "/**",
+        " * @ORM\\Entity",
+        " */",
+        "class GeneratedEntity extends BaseEntity",
+        "{",
+    ]
+    for index in range(propertyCount):
+        lines += [
+            "    /**",
+            "     * @var string",
+            "     * @ORM\\Column(name=\"field_" + str(index) + "\", type=\"string\", length=255)",
+            "     */",
+            "    private $field" + str(index) + " = 'default';",
+            "",
+            "    /**",
+            "     * @return string",
+            "     */",
+            "    public function getField" + str(index) + "()",
+            "    {",
+            "        return $this->field" + str(index) + ";",
+            "    }",
+            "",
+            "    public function setField" + str(index) + "($value)",
+            "    {",
+            "        $this->field" + str(index) + " = (string)$value; // " + str(index * 3) + " >= 1",
+            "        return $this;",
+            "    }",
+            "",
+        ]
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+def collect_codes(paths):
+    codes = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, subDirectories, fileNames in os.walk(path):
+                for fileName in sorted(fileNames):
+                    if fileName[-4:] == ".php":
+                        codes += collect_codes([directory + "/" + fileName])
+        else:
+            with open(path, "r", encoding = "ISO-8859-1") as f:
+                codes.append([path, f.read()])
+    if len(codes) <= 0:
+        # ~20k lines of generated code, like a big generated entity
+        codes.append(["(generated entity)", generate_entity_code(1000)])
+    return codes
+
+def measure(callback, codes):
+    beginTime = time.perf_counter()
+    results = []
+    for filePath, code in codes:
+        results.append(callback(code, filePath))
+    return (time.perf_counter() - beginTime, results)
+
+def benchmark_lexer(paths):
+    codes = collect_codes(paths)
+    byteCount = 0
+    for filePath, code in codes:
+        byteCount += len(code)
+    megaBytes = byteCount / (1024.0 * 1024.0)
+
+    legacyTime, legacyResults = measure(legacy_token_get_all, codes)
+    currentTime, currentResults = measure(token_get_all, codes)
+    scannerTime, scannerResults = measure(lambda code, filePath: token_get_all(code, filePath, True), codes)
+
+    for index in range(len(codes)):
+        if legacyResults[index] != currentResults[index]:
+            print(" MISMATCH: token-streams differ for " + codes[index][0])
+
+    print(" files:   " + str(len(codes)) + " (" + str(round(megaBytes, 3)) + " MB)")
+    print(" legacy:  " + str(round(legacyTime, 3)) + "s (" + str(round(megaBytes / legacyTime, 3)) + " MB/s)")
+    print(" current: " + str(round(currentTime, 3)) + "s (" + str(round(megaBytes / currentTime, 3)) + " MB/s)")
+    print(" scanner: " + str(round(scannerTime, 3)) + "s (" + str(round(megaBytes / scannerTime, 3)) + " MB/s)")
+
+def legacy_token_get_all(code, filePath=None):
+    # the original string-slicing lexer, kept as reference for speed and output comparison
+    tokens = []
+    comments = []
+
+    row = 1
+    col = 1
+
+    isInPhp = False
+    while len(code) > 0:
+        if isInPhp:
+            if code[0] in [' ', '\t', '\r']:
+                while len(code) > 0 and code[0] in [' ', '\t', '\r']:
+                    col += 1
+                    code = code[1:]
+
+            elif code[0] in specialChars:
+                if code[0:3] == '/**':
+                    endPos = code.find('*/') + 2
+                    tokenText = code[0:endPos]
+                    code, tokens, row, col = legacy_process_token(code, tokens, T_DOC_COMMENT, tokenText, row, col)
+                    comments.append([T_COMMENT, tokenText, row, col])
+
+                elif code[0:2] == '/*':
+                    endPos = code.find('*/') + 2
+                    tokenText = code[0:endPos]
+                    code, tokens, row, col = legacy_process_token(code, tokens, T_COMMENT, tokenText, row, col)
+                    comments.append([T_COMMENT, tokenText, row, col])
+
+                elif code[0:2] == '//' or code[0:1] == '#':
+                    endPos = code.find('\n')
+                    if endPos > 0:
+                        tokenText = code[0:endPos + 1]
+                        code, tokens, row, col = legacy_process_token(code, tokens, T_COMMENT, tokenText, row, col)
+                        comments.append([T_COMMENT, tokenText, row, col])
+                    else:
+                        comments.append([T_COMMENT, code, row, col])
+                        code = ""
+                elif code[0:3] == '<<<':
+                    tokenText = code[0:3]
+                    heredocName = ""
+                    index = 3
+                    while code[index] != "\n":
+                        heredocName += code[index]
+                        index += 1
+                    tokenText += heredocName
+                    heredocName = heredocName.strip()
+                    if heredocName[0] in ['"', "'"]:
+                        heredocName = heredocName[1:len(heredocName)-2]
+                    while code[index:index+len(heredocName)+1] != '\n' + heredocName:
+                        tokenText += code[index]
+                        index += 1
+                    tokenText += '\n' + heredocName
+                    code, tokens, row, col = legacy_process_token(code, tokens, T_HEREDOC, tokenText, row, col)
+
+                elif code[0:3] in operatorsLong:
+                    tokenText = code[0:3]
+                    tokenNum = operatorsLong[tokenText]
+                    code, tokens, row, col = legacy_process_token(code, tokens, tokenNum, tokenText, row, col)
+
+                elif code[0:2] in operators:
+                    tokenText = code[0:2]
+                    tokenNum = operators[tokenText]
+                    code, tokens, row, col = legacy_process_token(code, tokens, tokenNum, tokenText, row, col)
+
+                elif code[0:1] == '$' and code[1:2] in '_' + string.ascii_letters + string.digits:
+                    tokenText = code[0:2]
+                    index = 2
+                    while code[index] in '_' + string.ascii_letters + string.digits:
+                        tokenText += code[index]
+                        index += 1
+                    code, tokens, row, col = legacy_process_token(code, tokens, T_VARIABLE, tokenText, row, col)
+
+                elif code[0:2] == '?>':
+                    code, tokens, row, col = legacy_process_token(code, tokens, T_CLOSE_TAG, code[0:2], row, col)
+                    isInPhp = False
+
+                else:
+                    code, tokens, row, col = legacy_process_token(code, tokens, T_SINGLE_CHAR, code[0:1], row, col)
+
+            elif code[0] == '\n':
+                col = 1
+                row += 1
+                code = code[1:]
+
+            elif code[0] in '_\\' + string.ascii_letters:
+                isKeyword = False
+                keyword = None
+                for keyword in keywords:
+                    nextCharacter = code[len(keyword):len(keyword)+1]
+                    if code[0:len(keyword)] == keyword and not (nextCharacter.isalnum() or nextCharacter == "_"):
+                        isKeyword = True
+                        break
+
+                if isKeyword:
+                    tokenNum = token_num('T_' + keyword.upper())
+                    code, tokens, row, col = legacy_process_token(code, tokens, tokenNum, keyword, row, col)
+                else:
+                    tokenText = code[0]
+                    index = 1
+                    while len(code) > index and code[index] in '_\\' + string.ascii_letters + string.digits:
+                        tokenText += code[index]
+                        index += 1
+                    code, tokens, row, col = legacy_process_token(code, tokens, T_STRING, tokenText, row, col)
+
+            elif code[0] in ['"', "'"]:
+                tokenText = code[0]
+                index = 1
+                while index < len(code) and code[0] != code[index]:
+                    tokenText += code[index]
+                    if code[index] == '\\':
+                        tokenText += code[index+1:index+2]
+                        index += 1
+                    index += 1
+                if index < len(code):
+                    tokenText += code[index]
+                code, tokens, row, col = legacy_process_token(code, tokens, T_CONSTANT_ENCAPSED_STRING, tokenText, row, col)
+
+            elif code[0] in string.digits:
+                tokenText = code[0]
+                index = 1
+                while len(code) > index and code[index] in string.digits + '.':
+                    tokenText += code[index]
+                    index += 1
+                code, tokens, row, col = legacy_process_token(code, tokens, T_DNUMBER, tokenText, row, col)
+
+            else:
+                isDirectToken = False
+                directToken = None
+                for directToken in directTokenMap:
+                    if code[0:len(directToken)] == directToken:
+                        isDirectToken = True
+                        break
+
+                if isDirectToken:
+                    tokenNum = directTokenMap[directToken]
+                    code, tokens, row, col = legacy_process_token(code, tokens, tokenNum, directToken, row, col)
+                else:
+                    code = code[1:]
+
+        else: # not in php-code
+            beginPosition = code.find('<?')
+            if beginPosition >= 0:
+                if beginPosition > 0:
+                    tokenText = code[0:beginPosition]
+                    code, tokens, row, col = legacy_process_token(code, tokens, T_INLINE_HTML, tokenText, row, col)
+
+                tokenText = '<?'
+                if code[0:5] == '<?php':
+                    tokenText = '<?php'
+                elif code[0:3] == '<?=':
+                    tokenText = '<?='
+                else:
+                    tokenText = '<?'
+
+                code, tokens, row, col = legacy_process_token(code, tokens, T_PHP_START, tokenText, row, col)
+                isInPhp = True
+
+            else:
+                tokens.append([T_INLINE_HTML, code, row, col])
+                code = ""
+
+    return (tokens, comments, )
+
+def legacy_process_token(code, tokens, tokenNum, tokenText, row, col):
+    code = code[len(tokenText):]
+    tokens.append([tokenNum, tokenText, row, col])
+
+    rowDelta = tokenText.count("\n")
+    row += rowDelta
+    if rowDelta > 0:
+        col = len(tokenText) - tokenText.rfind("\n")
+    else:
+        col += len(tokenText)
+
+    return [code, tokens, row, col]
+
+def benchmark_parser(paths):
+    codes = collect_codes(paths) + regressionCodes
+    tokenLists = []
+    for filePath, code in codes:
+        tokens, comments = token_get_all(code, filePath)
+        tokenLists.append([filePath, tokens])
+
+    multiPassTime, multiPassResults = measure(lambda tokens, filePath: parse_php_tokens(tokens), tokenLists)
+    singlePassTime, singlePassResults = measure(lambda tokens, filePath: parse_php_tokens(tokens, singlePass=True), tokenLists)
+
+    mismatches = 0
+    for index in range(len(codes)):
+        if multiPassResults[index] != singlePassResults[index]:
+            print(" MISMATCH: parser-results differ for " + codes[index][0])
+            mismatches += 1
+
+    print(" files:       " + str(len(codes)) + " (" + str(mismatches) + " mismatches)")
+    print(" multi-pass:  " + str(round(multiPassTime, 3)) + "s")
+    print(" single-pass: " + str(round(singlePassTime, 3)) + "s")
+
+if len(sys.argv)<2:
+    print(" USAGE: "+sys.argv[0]+" [lexer|parser] [FILE-OR-FOLDER-PATH]...")
+
+elif sys.argv[1] == 'lexer':
+    benchmark_lexer(sys.argv[2:])
+
+elif sys.argv[1] == 'parser':
+    benchmark_parser(sys.argv[2:])
@@ -27,20 +27,36 @@ def update_callback(done_count, all_count, file_path):
 def error_callback(message):
     sys.stderr.write(message)
 
-if len(sys.argv)<4:
-    print(" USAGE: "+sys.argv[0]+" [build|update|update-gtk] [INDEX-FILEPATH] [FOLDER-PATH]")
-
-elif sys.argv[1] == 'build':
-    index = PhpIndex(sys.argv[2], update_callback, error_callback)
-    index.build(sys.argv[3])
-
-elif sys.argv[1] == 'update':
-    index = PhpIndex(sys.argv[2], update_callback, error_callback)
-    index.update(sys.argv[3])
-
-elif sys.argv[1] == 'update-gtk':
-    from gi.repository import Gtk
-    index_filepath = sys.argv[1]
-    folder_path    = sys.argv[2]
-    update_gtk(index_filepath, folder_path)
-    Gtk.main()
+if __name__ == "__main__":
+    # --declarations-only: only index the declarations (no uses) with flat memory, e.g. for vendor-trees
+    declarationsOnly = "--declarations-only" in sys.argv
+    if declarationsOnly:
+        sys.argv.remove("--declarations-only")
+
+    # number of processes parsing the files in parallel (the index itself is always written by this process)
+    workers = 1
+    if len(sys.argv)>4:
+        workers = int(sys.argv[4])
+
+    # build-git / update-git: detect changed files by their git-blob-ids
+    useGit = len(sys.argv)>1 and sys.argv[1][-4:] == "-git"
+
+    if len(sys.argv)<4:
+        print(" USAGE: "+sys.argv[0]+" [build|update|build-git|update-git|update-gtk] [INDEX-FILEPATH] [FOLDER-PATH] [WORKERS] [--declarations-only]")
+
+    elif sys.argv[1] in ['build', 'build-git']:
+        index = PhpIndex(sys.argv[2], update_callback, error_callback, declarationsOnly=declarationsOnly)
+        index.build(sys.argv[3], workers, useGit)
+        sys.stderr.write(index.describe_build_stats() + "\n")
+
+    elif sys.argv[1] in ['update', 'update-git']:
+        index = PhpIndex(sys.argv[2], update_callback, error_callback, declarationsOnly=declarationsOnly)
+        index.update(sys.argv[3], workers, useGit)
+        sys.stderr.write(index.describe_build_stats() + "\n")
+
+    elif sys.argv[1] == 'update-gtk':
+        from gi.repository import Gtk
+        index_filepath = sys.argv[1]
+        folder_path    = sys.argv[2]
+        update_gtk(index_filepath, folder_path)
+        Gtk.main()
@@ -79,8 +79,8 @@ def __prepare_gtk_process_window(index_filepath, folder_path, windowTitle, index
 
 def update_gtk(index_filepath, folder_path, indexPathManager=None):
     index = __prepare_gtk_process_window(index_filepath, folder_path, "Updating PHP-Index...", indexPathManager)
-    start_new_thread(index.update, (folder_path, ))
+    start_new_thread(index.update, (folder_path, 1, True))
 
 def build_gtk(index_filepath, folder_path, indexPathManager=None):
     index = __prepare_gtk_process_window(index_filepath, folder_path, "Rebuilding PHP-Index...", indexPathManager)
-    start_new_thread(index.build, (folder_path, ))
+    start_new_thread(index.build, (folder_path, 1, True))
@@ -0,0 +1,161 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-phpide
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from addiks_phpide.PHP.PhpFileAnalyzer import PhpFileAnalyzer
+from addiks_phpide.PHP.SyntaxTree import SyntaxNode
+from addiks_phpide.PHP.SyntaxTree import Expression
+import random
+import unittest
+
+code = "<?php\nnamespace Foo;\nuse Bar\\Baz;\n\nclass A extends Baz {\n    /** @var Baz */\n    private $baz;\n\n"
+code += "".join(
+    "    public function m%d($a, $b = array()) {\n" % i +
+    "        $c = $this->baz->get($a) + %d;\n" % i +
+    "        if ($c) { return $this->m%d($c); }\n" % ((i + 1) % 6) +
+    "        return $b;\n" +
+    "    }\n\n"
+    for i in range(6)
+)
+code += "}\n\nfunction g($x) {\n    return new A($x);\n}\n"
+
+def edit(analyzer, code, needle, removedLength, insertedText, occurrence=0):
+    # replaces 'removedLength' characters at the given occurrence of 'needle' and updates the analyzer
+    offset = -1
+    for index in range(occurrence + 1):
+        offset = code.index(needle, offset + 1)
+    code = code[:offset] + insertedText + code[offset+removedLength:]
+    analyzer.update_edited(code, offset, removedLength, insertedText)
+    return code
+
+def describe_node(node):
+    if node == None:
+        return None
+    description = [type(node).__name__, node.begin, node.end]
+    if isinstance(node, Expression):
+        description.append(repr(node))
+    parent = node.parent
+    while parent != None:
+        description.append((type(parent).__name__, parent.begin, parent.end, [(child.begin, child.end) for child in parent.get_children()]))
+        parent = parent.parent
+    return description
+
+class IncrementalUpdateTest(unittest.TestCase):
+
+    def assertSameAsFresh(self, analyzer, code, lookups=[]):
+        fresh = PhpFileAnalyzer(code, None, None)
+
+        # single lookups first, before everything got reached by the full comparison below
+        for tokenIndex in lookups:
+            self.assertEqual(
+                describe_node(fresh.get_syntax_tree().get_node_by_token_index(tokenIndex)),
+                describe_node(analyzer.get_syntax_tree().get_node_by_token_index(tokenIndex))
+            )
+
+        self.assertEqual(list(fresh.get_tokens()), list(analyzer.get_tokens()))
+        self.assertEqual(list(fresh.get_comments()), list(analyzer.get_comments()))
+        self.assertEqual(fresh.get_blocks(), analyzer.get_blocks())
+        self.assertEqual([block.uses for block in fresh.get_blocks()], [block.uses for block in analyzer.get_blocks()])
+        self.assertEqual(
+            [repr(node) for node in fresh.get_syntax_tree().get_nodes(SyntaxNode)],
+            [repr(node) for node in analyzer.get_syntax_tree().get_nodes(SyntaxNode)]
+        )
+        for tokenIndex in range(len(fresh.get_tokens())):
+            self.assertEqual(
+                describe_node(fresh.get_syntax_tree().get_node_by_token_index(tokenIndex)),
+                describe_node(analyzer.get_syntax_tree().get_node_by_token_index(tokenIndex))
+            )
+
+    def lookups_behind(self, analyzer):
+        # some token-indexes in the methods behind the edit, whose nodes got shifted
+        texts = analyzer.get_tokens().get_texts()
+        return [index for index in range(len(texts)) if texts[index] in ['$c', 'get', '+', 'return', '$b']][-12:]
+
+    def test_edits_within_a_method_body(self):
+        analyzer = PhpFileAnalyzer(code, None, None)
+        tree = analyzer.get_syntax_tree()
+        edited = edit(analyzer, code, "return $b;", 0, "$d = $a->foo($b);\n        ")
+        self.assertIs(tree, analyzer.get_syntax_tree()) # (only the body got reparsed)
+        self.assertSameAsFresh(analyzer, edited, self.lookups_behind(analyzer))
+
+        edited = edit(analyzer, edited, "+ 2", 3, "* (2 - $a)")
+        self.assertSameAsFresh(analyzer, edited, self.lookups_behind(analyzer))
+
+    def test_brace_changing_edits_within_a_method_body(self):
+        analyzer = PhpFileAnalyzer(code, None, None)
+        edited = edit(analyzer, code, "return $b;", 0, "if ($a) { foreach ($b as $e) { $e->x(); } }\n        ", 1)
+        self.assertSameAsFresh(analyzer, edited, self.lookups_behind(analyzer))
+
+        edited = edit(analyzer, edited, "} }", 1, "", 0) # an unclosed block from here on
+        self.assertSameAsFresh(analyzer, edited, self.lookups_behind(analyzer))
+
+        edited = edit(analyzer, edited, "); }", 0, "}", 3) # closed again
+        self.assertSameAsFresh(analyzer, edited, self.lookups_behind(analyzer))
+
+    def test_string_and_comment_opening_edits(self):
+        analyzer = PhpFileAnalyzer(code, None, None)
+        edited = edit(analyzer, code, "$c = $this", 0, "$s = 'abc", 1)
+        self.assertSameAsFresh(analyzer, edited, self.lookups_behind(analyzer))
+
+        edited = edit(analyzer, edited, "abc", 3, "abc';\n        ")
+        self.assertSameAsFresh(analyzer, edited, self.lookups_behind(analyzer))
+
+        edited = edit(analyzer, edited, "return $b;", 0, "/* ", 3)
+        self.assertSameAsFresh(analyzer, edited, self.lookups_behind(analyzer))
+
+        edited = edit(analyzer, edited, "return $b;", 0, " */", 4)
+        self.assertSameAsFresh(analyzer, edited, self.lookups_behind(analyzer))
+
+        edited = edit(analyzer, edited, "$c = $this", 0, "// ", 5)
+        self.assertSameAsFresh(analyzer, edited, self.lookups_behind(analyzer))
+
+    def test_edits_outside_of_method_bodies(self):
+        analyzer = PhpFileAnalyzer(code, None, None)
+        edited = edit(analyzer, code, "$b = array()", 12, "Baz $b = null", 2) # argument-list of a method
+        self.assertSameAsFresh(analyzer, edited, self.lookups_behind(analyzer))
+
+        edited = edit(analyzer, edited, "    private $baz;", 0, "    protected $qux = 1;\n")
+        self.assertSameAsFresh(analyzer, edited, self.lookups_behind(analyzer))
+
+        edited = edit(analyzer, edited, "function g", 0, "function h() { }\n\n")
+        self.assertSameAsFresh(analyzer, edited)
+
+        edited = edit(analyzer, edited, "use Bar", 0, "use Qux;\n")
+        self.assertSameAsFresh(analyzer, edited)
+
+    def test_random_edits(self):
+        snippets = ["$x", " = ", "foo(", ")", "->bar()", "; ", "\n", "{", "}", "(", "'", "\"", "/*", "*/", "// ", "return $y;"]
+        randomizer = random.Random(11)
+        for trial in range(20):
+            analyzer = PhpFileAnalyzer(code, None, None)
+            edited = code
+            for step in range(4):
+                offset = randomizer.randint(len("<?php\n"), len(edited))
+                removedLength = min(randomizer.choice([0, 0, 1, 3]), len(edited) - offset)
+                insertedText = randomizer.choice(snippets)
+                edited = edited[:offset] + insertedText + edited[offset+removedLength:]
+                try:
+                    PhpFileAnalyzer(edited, None, None)
+                except Exception:
+                    # a '}' without a block to close, the incremental update has to reject that as well
+                    with self.assertRaises(Exception):
+                        analyzer.update_edited(edited, offset, removedLength, insertedText)
+                    break
+                analyzer.update_edited(edited, offset, removedLength, insertedText)
+                lookups = [randomizer.randint(0, len(analyzer.get_tokens()) - 1) for index in range(5)]
+                self.assertSameAsFresh(analyzer, edited, lookups)
+
+if __name__ == "__main__":
+    unittest.main()
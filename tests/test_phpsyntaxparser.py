@@ -0,0 +1,58 @@
+# Copyright (C) 2015 Gerrit Addiks <gerrit@addiks.net>
+# https://github.com/addiks/gedit-phpide
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from addiks_phpide.PHP.phplexer import token_lex
+from addiks_phpide.PHP.phplexer import line_starts
+from addiks_phpide.PHP.TokenList import TokenList
+from addiks_phpide.PHP.phpsyntaxparser import parse_php_syntax
+from addiks_phpide.PHP.SyntaxTree import ExpressionStatement
+from addiks_phpide.PHP.SyntaxTree import Assignment
+from addiks_phpide.PHP.SyntaxTree import Call
+from addiks_phpide.PHP.SyntaxTree import MemberAccess
+import unittest
+
+def parse(code):
+    lineStarts = line_starts(code)
+    tokens, comments = token_lex(code, TokenList(lineStarts), TokenList(lineStarts))
+    return (parse_php_syntax(tokens), tokens)
+
+class CommentsInExpressionsTest(unittest.TestCase):
+
+    def test_method_chain_split_by_line_comment(self):
+        tree, tokens = parse("<?php\n$a = $b // c\n->foo();\n")
+        statements = tree.get_statements()
+        self.assertEqual(1, len(statements))
+        self.assertIs(ExpressionStatement, type(statements[0]))
+
+        assignment = statements[0].expressions[0]
+        self.assertIs(Assignment, type(assignment))
+        self.assertIs(Call, type(assignment.value))
+        self.assertIs(MemberAccess, type(assignment.value.callee))
+        self.assertEqual("foo", tokens.get_texts()[assignment.value.callee.nameIndex])
+
+    def test_block_comments_between_operands_and_operators(self):
+        tree, tokens = parse("<?php\n$a /* x */ = /* y */ $b /* z */ -> /* w */ foo();\n")
+        statements = tree.get_statements()
+        self.assertEqual(1, len(statements))
+
+        assignment = statements[0].expressions[0]
+        self.assertIs(Assignment, type(assignment))
+        self.assertEqual("=", tokens.get_texts()[assignment.operatorIndex])
+        self.assertIs(Call, type(assignment.value))
+        self.assertEqual("foo", tokens.get_texts()[assignment.value.callee.nameIndex])
+
+if __name__ == "__main__":
+    unittest.main()